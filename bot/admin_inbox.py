@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import asyncpg
+
+from bot import infrastructure
+from bot.economy_store import list_pending_by_ids, list_pending_requests
+from bot.leader import RedisLock
+from bot.metrics import ADMIN_INBOX_REQUESTS, ADMIN_INBOX_SENDS
+from bot.paging import decode_cursor
+from bot.rbac_store import list_users_with_role
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_admin_inbox")
+
+# Push-based admin inbox: an AFTER INSERT trigger on payment_requests NOTIFYs CHANNEL with the new
+# id; one elected worker LISTENs on a dedicated connection, batches ids for window_s and DMs one
+# digest per window to the owner and every admin.
+CHANNEL = "payment_requests_new"
+CURSOR_KEY = "guardian:admin_inbox:last"  # newest delivered (created_at, id): catch-up after a failover
+LOCK_NAME = "admin-inbox"
+
+
+class DigestBatcher:
+    """Collects notified ids and hands them to flush() at most once per window.
+
+    At most max_ids are kept per window; the rest are only counted (the digest points at /pending).
+    """
+
+    def __init__(self, flush: Callable[[List[int], int], Awaitable[None]], window_s: float = 5.0, max_ids: int = 1000):
+        self._flush = flush
+        self.window_s = window_s
+        self.max_ids = max_ids
+        self._ids: Dict[int, None] = {}
+        self._dropped = 0
+        self._wake = asyncio.Event()
+
+    def add(self, id_: int) -> None:
+        if id_ in self._ids:
+            return
+        if len(self._ids) >= self.max_ids:
+            self._dropped += 1
+        else:
+            self._ids[id_] = None
+        self._wake.set()
+
+    async def run(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.window_s)
+            ids, dropped = list(self._ids), self._dropped
+            self._ids, self._dropped = {}, 0
+            self._wake.clear()
+            try:
+                await self._flush(ids, dropped)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_json(logging.WARNING, "admin_inbox_flush_error", ids=len(ids), error=f"{type(e).__name__}: {e}")
+
+
+def format_digest(rows: List[Dict[str, Any]], more: int = 0, max_lines: int = 20) -> str:
+    lines = [f"NEW REQUESTS ({len(rows) + more})"]
+    for r in rows[:max_lines]:
+        lines.append(f"- #{r['id']} user={r['user_id']} {r['kind']} {r['amount']} {r['currency']} tx={r['tx_ref'] or '-'}")
+    rest = more + max(0, len(rows) - max_lines)
+    if rest:
+        lines.append(f"... and {rest} more")
+    lines += ["", "/pending to review, /approve <ids> or /reject <ids>"]
+    return "\n".join(lines)
+
+
+async def send_bounded(send: Callable[[int], Awaitable[Any]], chat_ids: Iterable[int], concurrency: int = 4, timeout_s: float = 10.0) -> int:
+    # at most `concurrency` Bot API calls in flight, each capped at timeout_s; -> number delivered
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(chat_id: int) -> bool:
+        async with sem:
+            try:
+                await asyncio.wait_for(send(chat_id), timeout=timeout_s)
+                ADMIN_INBOX_SENDS.labels(result="ok").inc()
+                return True
+            except Exception as e:
+                ADMIN_INBOX_SENDS.labels(result="error").inc()
+                log_json(logging.WARNING, "admin_inbox_send_error", chat_id=chat_id, error=f"{type(e).__name__}: {e}")
+                return False
+
+    return sum(await asyncio.gather(*(one(c) for c in dict.fromkeys(chat_ids))))
+
+
+async def _recipients() -> List[int]:
+    owner = os.getenv("ADMIN_CHAT_ID")
+    out = [int(owner)] if owner else []
+    return out + [a["user_id"] for a in await list_users_with_role("admin")]
+
+
+async def _advance_cursor(cursor: str) -> None:
+    # only moves forward: a late commit with an older created_at must not rewind catch-up
+    r = infrastructure.redis_client
+    if r is None:
+        return
+    old = await r.get(CURSOR_KEY)
+    prev = decode_cursor(old.decode()) if old else None
+    if prev is None or decode_cursor(cursor) > prev:
+        await r.set(CURSOR_KEY, cursor)
+
+
+class AdminInbox:
+    def __init__(self, bot, window_s: float, max_lines: int, concurrency: int, timeout_s: float):
+        self.bot = bot
+        self.max_lines = max_lines
+        self.concurrency = concurrency
+        self.timeout_s = timeout_s
+        self.batcher = DigestBatcher(self.flush, window_s=window_s)
+
+    async def flush(self, ids: List[int], dropped: int) -> None:
+        # one query for the whole window; rows decided in the meantime drop out
+        rows = await list_pending_by_ids(ids)
+        ADMIN_INBOX_REQUESTS.inc(len(rows) + dropped)
+        if not rows and not dropped:
+            return
+        text_ = format_digest(rows, more=dropped, max_lines=self.max_lines)
+        sent = await send_bounded(
+            lambda chat_id: self.bot.send_message(chat_id=chat_id, text=text_),
+            await _recipients(), self.concurrency, self.timeout_s,
+        )
+        log_json(logging.INFO, "admin_inbox_digest", requests=len(rows) + dropped, recipients_ok=sent)
+        if rows:
+            await _advance_cursor(rows[-1]["cursor"])
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str) -> None:
+        try:
+            self.batcher.add(int(payload))
+        except ValueError:
+            pass
+
+    async def _catch_up(self) -> None:
+        # requests created while no worker was listening (deploy, failover, lost connection)
+        r = infrastructure.redis_client
+        cursor = await r.get(CURSOR_KEY) if r is not None else None
+        if cursor is None:
+            return
+        for row in await list_pending_requests(limit=self.batcher.max_ids, after=cursor.decode()):
+            self.batcher.add(row["id"])
+
+    async def _listen(self, lock: RedisLock, ttl_s: float) -> None:
+        # LISTEN needs its own connection for as long as we hold the lock, outside the pool
+        conn = await asyncpg.connect(os.getenv("DATABASE_URL", "").replace("postgresql+asyncpg://", "postgresql://", 1))
+        try:
+            await conn.add_listener(CHANNEL, self._on_notify)
+            log_json(logging.INFO, "admin_inbox_listening", channel=CHANNEL)
+            await self._catch_up()
+            while True:
+                await asyncio.sleep(ttl_s / 3)
+                # keepalive: a dead connection would otherwise miss notifications silently
+                await conn.execute("SELECT 1")
+                if not await lock.renew():
+                    log_json(logging.WARNING, "admin_inbox_lock_lost")
+                    return
+        finally:
+            try:
+                await asyncio.wait_for(conn.close(), timeout=5)
+            except Exception:
+                conn.terminate()
+
+    async def run(self, ttl_s: float = 30.0) -> None:
+        flusher = asyncio.create_task(self.batcher.run(), name="admin-inbox-flush")
+        try:
+            while True:
+                lock = RedisLock(LOCK_NAME, ttl_s=ttl_s)
+                try:
+                    if await lock.acquire():
+                        await self._listen(lock, ttl_s)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log_json(logging.WARNING, "admin_inbox_listener_error", error=f"{type(e).__name__}: {e}")
+                finally:
+                    await lock.release()
+                await asyncio.sleep(ttl_s / 3)
+        finally:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+
+
+_task: Optional[asyncio.Task] = None
+
+
+def start(bot) -> None:
+    # ADMIN_INBOX=0 -> off (admins poll /pending)
+    global _task
+    if os.getenv("ADMIN_INBOX", "1").lower() in ("0", "false", "no", "off"):
+        return
+    inbox = AdminInbox(
+        bot,
+        window_s=float(os.getenv("ADMIN_INBOX_WINDOW_S", "5")),
+        max_lines=int(os.getenv("ADMIN_INBOX_MAX_LINES", "20")),
+        concurrency=int(os.getenv("ADMIN_INBOX_SEND_CONCURRENCY", "4")),
+        timeout_s=float(os.getenv("ADMIN_INBOX_SEND_TIMEOUT_S", "10")),
+    )
+    if _task is None or _task.done():
+        _task = asyncio.create_task(inbox.run(), name="admin-inbox")
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from bot.metrics import ADMISSION_DECISIONS, ADMISSION_INFLIGHT, ADMISSION_LATENCY_EWMA
+from bot.rbac_store import list_users_with_role
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_admission")
+
+# Updates sent by the owner or an admin ride the priority lane and are never shed. The lane is
+# picked from the sender, not the command: anyone can type /status.
+_PRIORITY_ROLES = ("owner", "admin")
+
+
+def sender_of(payload: Dict[str, Any]) -> Optional[int]:
+    # `from.id` of the message / callback query / ... carried by the update
+    for obj in payload.values():
+        if isinstance(obj, dict):
+            sender = obj.get("from")
+            if isinstance(sender, dict) and sender.get("id") is not None:
+                return int(sender["id"])
+    return None
+
+
+def _owner_ids() -> FrozenSet[int]:
+    owner = os.getenv("ADMIN_CHAT_ID")
+    return frozenset([int(owner)]) if owner else frozenset()
+
+
+class Admission:
+    """Sheds user commands when too many updates are in flight or handling is slow."""
+
+    def __init__(
+        self,
+        max_inflight: int = 200,
+        max_latency_ms: float = 2000.0,
+        alpha: float = 0.2,
+        privileged: Iterable[int] = (),
+    ):
+        self.max_inflight = max(1, int(max_inflight))
+        self.max_latency_ms = float(max_latency_ms)
+        # latency only sheds while we are busy; below this floor fresh samples pull the average back down
+        self.latency_floor = max(1, self.max_inflight // 4)
+        self.alpha = float(alpha)
+        self.inflight = 0
+        self.latency_ms = 0.0
+        # owner + admins (refreshed from RBAC by start()); membership decides the lane
+        self.privileged: FrozenSet[int] = frozenset(privileged)
+
+    def admit(self, command: Optional[str], sender_id: Optional[int] = None) -> Tuple[bool, str]:
+        lane = "priority" if sender_id is not None and sender_id in self.privileged else "user"
+        reason = ""
+        if lane == "user":
+            if self.inflight >= self.max_inflight:
+                reason = "inflight"
+            elif self.latency_ms >= self.max_latency_ms and self.inflight >= self.latency_floor:
+                reason = "latency"
+        ok = not reason
+        ADMISSION_DECISIONS.labels(lane=lane, decision=("admit" if ok else "shed"), reason=reason or "-").inc()
+        if ok:
+            self.inflight += 1
+            ADMISSION_INFLIGHT.set(self.inflight)
+        else:
+            log_json(
+                logging.WARNING,
+                "update_shed",
+                command=command,
+                sender_id=sender_id,
+                reason=reason,
+                inflight=self.inflight,
+                latency_ms=int(self.latency_ms),
+            )
+        return ok, lane
+
+    def finished(self, elapsed_s: Optional[float] = None) -> None:
+        self.inflight = max(0, self.inflight - 1)
+        ADMISSION_INFLIGHT.set(self.inflight)
+        if elapsed_s is not None:
+            ms = elapsed_s * 1000.0
+            self.latency_ms = ms if not self.latency_ms else (1 - self.alpha) * self.latency_ms + self.alpha * ms
+            ADMISSION_LATENCY_EWMA.set(self.latency_ms)
+
+
+def busy_reply(payload: dict) -> Optional[dict]:
+    # tell the user, via the webhook response body (no extra Bot API call), to retry later
+    if os.getenv("SHED_NOTICE", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    msg = payload.get("message")
+    chat = msg.get("chat") if isinstance(msg, dict) else None
+    if not isinstance(chat, dict) or chat.get("id") is None:
+        return None
+    return {"method": "sendMessage", "chat_id": chat["id"], "text": "Busy right now, please try again in a minute."}
+
+
+def from_env() -> Admission:
+    return Admission(
+        max_inflight=int(os.getenv("SHED_MAX_INFLIGHT", "200")),
+        max_latency_ms=float(os.getenv("SHED_MAX_LATENCY_MS", "2000")),
+        privileged=_owner_ids(),
+    )
+
+
+# --- Privileged sender cache (RBAC) ---
+_task: Optional[asyncio.Task] = None
+
+
+async def load_privileged() -> FrozenSet[int]:
+    ids = set(_owner_ids())
+    for role in _PRIORITY_ROLES:
+        ids.update(u["user_id"] for u in await list_users_with_role(role))
+    return frozenset(ids)
+
+
+async def _refresh_loop(admission: Admission, interval_s: float) -> None:
+    while True:
+        try:
+            admission.privileged = await load_privileged()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # keep the last known set; ADMIN_CHAT_ID is always in it
+            log_json(logging.WARNING, "admission_privileged_refresh_error", error=f"{type(e).__name__}: {e}")
+        await asyncio.sleep(interval_s)
+
+
+def start(admission: Admission) -> None:
+    # role grants/revokes reach the lane choice within ADMISSION_ROLES_REFRESH_S
+    global _task
+    if _task is None or _task.done():
+        interval_s = float(os.getenv("ADMISSION_ROLES_REFRESH_S", "60"))
+        _task = asyncio.create_task(_refresh_loop(admission, interval_s), name="admission-roles")
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
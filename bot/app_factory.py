@@ -4,20 +4,29 @@ import time
 from typing import Callable, Awaitable
 
 from telegram import Update
-from telegram import BotCommand
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
+from telegram import BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler, ContextTypes
 from telegram.error import Conflict
+from telegram.request import HTTPXRequest
 
 from bot.config import BOT_TOKEN, ENV, ADMIN_CHAT_ID, WEBHOOK_URL, MODE
-from bot.infrastructure import init_infrastructure, runtime_report
+from bot.infrastructure import acting_as, commit_unit_of_work, init_infrastructure, runtime_report, savepoint, unit_of_work
 from bot.telemetry import log_json, exc_to_str, update_brief, log_event, log_event
 from bot.rbac_store import has_role, grant_role, revoke_role, list_users_with_role
-from bot.config import DONATE_URL
+from bot.config import DONATE_URL, TELEGRAM_API_BASE_URL
+from bot import health_prober, leaderboard, webhook_reply
+from bot.health_prober import PROBERS
+from bot.paging import split_page
+from bot.id_list import parse_id_list
+from bot.points_csv import parse_points_csv
 from bot.economy_store import (
     add_account, list_accounts, set_plan_price, list_plans,
-    create_payment_request, list_pending_requests, get_request, set_request_status,
-    add_points, get_points_balance, list_user_requests,
-    upsert_referral, get_referrer,
+    create_payment_request, list_pending_requests,
+    list_user_requests, get_my_dashboard,
+    upsert_referral, approve_request, reject_request,
+    approve_requests, reject_requests, BULK_DECIDE_MAX,
+    get_referral_stats, top_referrers,
+    add_points_many,
 
 )
 
@@ -46,7 +55,8 @@ async def is_admin_rbac(update: Update) -> bool:
     if is_owner(update):
         return True
     try:
-        return await has_role(int(update.effective_user.id), "admin")
+        async with savepoint():
+            return await has_role(int(update.effective_user.id), "admin")
     except Exception:
         # if DB not ready, fall back to legacy owner-only
         return False
@@ -67,11 +77,27 @@ def _parse_amount(x: str) -> int:
     return int(str(x).strip())
 
 
+def _client_key(update: Update):
+    # Telegram message identity: a retried/replayed update maps to the same request
+    msg = update.effective_message
+    return f"tg:{msg.chat_id}:{msg.message_id}" if msg else None
+
+
+# One DB session per update for every store call a handler makes, committed before each outbound
+# Bot API call (_CommitFirstRequest) and when the handler returns (DB_UNIT_OF_WORK=0 -> off)
+DB_UNIT_OF_WORK = os.getenv("DB_UNIT_OF_WORK", "1").lower() not in ("0", "false", "no", "off")
+
 def with_latency(name: str, fn: Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]):
     async def _wrap(update: Update, context: ContextTypes.DEFAULT_TYPE):
         t0 = time.perf_counter()
+        user = update.effective_user if update else None
         try:
-            await fn(update, context)
+            with acting_as(user.id if user else None):
+                if DB_UNIT_OF_WORK:
+                    async with unit_of_work():
+                        await fn(update, context)
+                else:
+                    await fn(update, context)
             ok = True
             err = None
         except Exception as e:
@@ -92,7 +118,8 @@ async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ref_id = int(str(context.args[0]).split("_", 1)[1])
             u = update.effective_user
             if u:
-                ok_link = await upsert_referral(ref_id, int(u.id))
+                async with savepoint():
+                    ok_link = await upsert_referral(ref_id, int(u.id))
                 if ok_link:
                     log_event(logging.INFO, "referral_linked", referrer_id=ref_id, referred_id=int(u.id))
     except Exception:
@@ -126,13 +153,13 @@ async def whoami_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"chat_type: {c.type if c else None}",
         f"is_admin_chat: {is_admin(update)}",
     ]
-    await update.message.reply_text("\n".join(lines))
+    await webhook_reply.reply_text(update, "\n".join(lines))
 
 async def menu_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lines = ["Commands:", "/start", "/status", "/menu", "/whoami", "/health", "/donate", "/admins", "/ref", "/my", "/buy", "/claim", "/grant_admin", "/revoke_admin", "/dm", "/broadcast_admins"]
     if is_admin(update):
         lines += ["", "Admin:", "/admin", "/vars", "/webhook", "/diag", "/pingdb", "/pingredis"]
-    await update.message.reply_text("\n".join(lines))
+    await webhook_reply.reply_text(update, "\n".join(lines))
 
 async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(await runtime_report(full=is_admin(update)))
@@ -144,7 +171,7 @@ async def health_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         lines.append(f"git_sha: {sha[:12]}")
     if is_admin(update):
         lines.append(f"webhook_url: {WEBHOOK_URL or 'MISSING'}")
-    await update.message.reply_text("\n".join(lines))
+    await webhook_reply.reply_text(update, "\n".join(lines))
 
 
 
@@ -156,28 +183,81 @@ async def ref_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     bot_user = await context.bot.get_me()
     link = f"https://t.me/{bot_user.username}?start=ref_{u.id}"
     log_event(logging.INFO, "referral_link_issued", user_id=int(u.id), username=(u.username or None))
-    await update.message.reply_text("REFERRAL LINK\n" + link)
-
-async def my_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    u = update.effective_user
-    if not u:
-        await update.message.reply_text("No user.")
-        return
-    bal = await get_points_balance(int(u.id))
-    reqs = await list_user_requests(int(u.id), limit=5)
+    stats = await get_referral_stats(int(u.id))
     lines = [
-        "MY",
-        f"user_id: {u.id}",
-        f"points: {bal}",
+        "REFERRAL LINK",
+        link,
         "",
-        "Recent requests:",
+        f"You brought: {stats['direct']} directly, {stats['total']} in total",
     ]
+    top = await top_referrers(limit=5)
+    if top:
+        lines += ["", "Top referrers:"] + [f"{i}. {t['user_id']}: {t['total']}" for i, t in enumerate(top, 1)]
+    await update.message.reply_text("\n".join(lines))
+
+TOP_N = 10
+
+
+async def top_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    u = update.effective_user
+    rows = await leaderboard.top(TOP_N)
+    lines = ["TOP POINTS"]
+    if not rows:
+        lines.append("(none)")
+    for r in rows:
+        lines.append(f"{r['rank']}. {r['user_id']}: {r['points']}")
+    if u and not any(r["user_id"] == int(u.id) for r in rows):
+        pos = await leaderboard.rank(int(u.id))
+        if pos:
+            lines += ["", f"You: #{pos['rank']} with {pos['points']}"]
+    await update.message.reply_text("\n".join(lines))
+
+MY_PAGE = 5
+PENDING_PAGE = 10
+ACCOUNTS_PAGE = 10
+
+
+def _page_markup(kind: str, next_cursor, first: bool):
+    # "pg:<kind>:<cursor>" -> page_cb; an empty cursor is the first page
+    buttons = []
+    if not first:
+        buttons.append(InlineKeyboardButton("⏮ First", callback_data=f"pg:{kind}:"))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton("Next ▶", callback_data=f"pg:{kind}:{next_cursor}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def _my_page(user_id: int, after=None):
+    if after:
+        reqs, nxt = split_page(await list_user_requests(user_id, limit=MY_PAGE + 1, after=after), MY_PAGE)
+        lines = ["MY REQUESTS (older)"]
+    else:
+        # first page: one store call / one DB round trip
+        dash = await get_my_dashboard(user_id, limit=MY_PAGE + 1)
+        reqs, nxt = split_page(dash["requests"], MY_PAGE)
+        lines = [
+            "MY",
+            f"user_id: {user_id}",
+            f"points: {dash['balance']}",
+            f"referrals: {dash['invited']} invited" + (f" (invited by {dash['referrer_id']})" if dash["referrer_id"] else ""),
+            "",
+            "Recent requests:",
+        ]
     if not reqs:
         lines.append("(none)")
     else:
         for r in reqs:
             lines.append(f"- #{r['id']} {r['kind']} {r['amount']} {r['currency']} [{r['status']}]")
-    await update.message.reply_text("\n".join(lines))
+    return "\n".join(lines), _page_markup("my", nxt, first=not after)
+
+
+async def my_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    u = update.effective_user
+    if not u:
+        await update.message.reply_text("No user.")
+        return
+    text_, markup = await _my_page(int(u.id))
+    await update.message.reply_text(text_, reply_markup=markup)
 
 async def buy_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     u = update.effective_user
@@ -189,9 +269,10 @@ async def buy_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     amt = _parse_amount(context.args[0])
     note = " ".join(context.args[1:]) if len(context.args) > 1 else None
-    req_id = await create_payment_request(int(u.id), "buy_token", amt, "SELHA", note=note)
-    log_event(logging.INFO, "economy_request_created", kind="buy_token", request_id=req_id, amount=amt, user_id=int(u.id), username=(u.username or None))
-    await update.message.reply_text(f"OK: buy request created #{req_id} (pending)")
+    req_id, created = await create_payment_request(int(u.id), "buy_token", amt, "SELHA", note=note, client_key=_client_key(update))
+    if created:
+        log_event(logging.INFO, "economy_request_created", kind="buy_token", request_id=req_id, amount=amt, user_id=int(u.id), username=(u.username or None))
+    await update.message.reply_text(f"OK: buy request {'created' if created else 'already created'} #{req_id} (pending)")
 
 async def claim_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     u = update.effective_user
@@ -204,66 +285,127 @@ async def claim_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     amt = _parse_amount(context.args[0])
     tx = context.args[1]
     note = " ".join(context.args[2:]) if len(context.args) > 2 else None
-    req_id = await create_payment_request(int(u.id), "donate", amt, "SELHA", tx_ref=tx, note=note)
-    log_event(logging.INFO, "economy_request_created", kind="donate", request_id=req_id, amount=amt, user_id=int(u.id), username=(u.username or None), tx_ref=tx)
-    log_event(logging.INFO, "economy_request_created", kind="donate", request_id=req_id, amount=amt, user_id=int(u.id), username=(u.username or None), tx_ref=tx)
-    await update.message.reply_text(f"OK: donation claim created #{req_id} (pending)")
+    req_id, created = await create_payment_request(int(u.id), "donate", amt, "SELHA", tx_ref=tx, note=note, client_key=_client_key(update))
+    if created:
+        log_event(logging.INFO, "economy_request_created", kind="donate", request_id=req_id, amount=amt, user_id=int(u.id), username=(u.username or None), tx_ref=tx)
+    await update.message.reply_text(f"OK: donation claim {'created' if created else 'already created'} #{req_id} (pending)")
+
+async def _pending_page(after=None):
+    items, nxt = split_page(await list_pending_requests(limit=PENDING_PAGE + 1, after=after), PENDING_PAGE)
+    lines = ["PENDING REQUESTS:" if not after else "PENDING REQUESTS (next):"]
+    if not items:
+        lines.append("(none)")
+    else:
+        for it in items:
+            lines.append(f"- #{it['id']} user={it['user_id']} {it['kind']} {it['amount']} {it['currency']} tx={it['tx_ref'] or '-'}")
+    markup = _page_markup("pending", nxt, first=not after)
+    if items:
+        approve_all = InlineKeyboardButton(f"✅ Approve all {len(items)}", callback_data=f"dec:a:{after or ''}:{items[-1]['cursor']}")
+        markup = InlineKeyboardMarkup([[approve_all]] + (list(markup.inline_keyboard) if markup else []))
+    return "\n".join(lines), markup
 
 async def pending_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await is_admin_rbac(update):
         await update.message.reply_text("Access denied.")
         return
-    items = await list_pending_requests(limit=10)
-    lines = ["PENDING REQUESTS:"]
-    if not items:
-        lines.append("(none)")
+    text_, markup = await _pending_page()
+    await update.message.reply_text(text_, reply_markup=markup)
+
+def _log_approved(rid: int, res: dict, decided_by: int) -> None:
+    log_event(logging.INFO, "economy_request_decided", action="approve", request_id=rid, user_id=res["user_id"], decided_by=decided_by, amount=res["amount"], kind=res["kind"])
+    log_event(logging.INFO, "points_awarded", user_id=res["user_id"], delta=res["amount"], reason=res["kind"], ref=str(rid))
+    for b in res["bonuses"]:
+        log_event(logging.INFO, "points_awarded", user_id=b["user_id"], delta=b["delta"], reason="ref_bonus", level=b["level"], ref=str(rid))
+
+
+def _decision_summary(action: str, results: list) -> str:
+    done = [r for r in results if r["outcome"] == action]
+    skipped = [r for r in results if r["outcome"] != action]
+    lines = [f"OK: {action} {len(done)} request(s)"]
+    if action == "approved" and done:
+        lines[0] += f", awarded {sum(r['amount'] for r in done)} points"
+    if skipped:
+        why = {"not_found": "not found", "over_limit": "over limit"}
+        shown = ", ".join(f"#{r['id']} ({why.get(r['outcome'], r['status'])})" for r in skipped[:10])
+        lines.append(f"Skipped {len(skipped)}: {shown}" + (" ..." if len(skipped) > 10 else ""))
+    if len(done) >= BULK_DECIDE_MAX or any(r["outcome"] == "over_limit" for r in skipped):
+        lines.append(f"Stopped at {BULK_DECIDE_MAX} requests; run the command again for the rest.")
+    return "\n".join(lines)
+
+
+async def _decide_many(action: str, decided_by: int, **selection) -> list:
+    if action == "approved":
+        results = await approve_requests(decided_by, **selection)
+        for r in results:
+            if r["outcome"] == "approved":
+                _log_approved(r["id"], r, decided_by)
     else:
-        for it in items:
-            lines.append(f"- #{it['id']} user={it['user_id']} {it['kind']} {it['amount']} {it['currency']} tx={it['tx_ref'] or '-'}")
-    await update.message.reply_text("\n".join(lines))
+        results = await reject_requests(decided_by, **selection)
+        for r in results:
+            if r["outcome"] == "rejected":
+                log_event(logging.INFO, "economy_request_decided", action="reject", request_id=r["id"], decided_by=decided_by)
+    return results
 
-async def approve_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+
+async def _decide_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
     if not await is_admin_rbac(update):
         await update.message.reply_text("Access denied.")
         return
-    if not context.args:
-        await update.message.reply_text("Usage: /approve <request_id>")
+    usage = f"Usage: /{'approve' if action == 'approved' else 'reject'} <id>[,<id>...] [<from>-<to>]"
+    try:
+        ids, ranges = parse_id_list(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(f"{e}\n{usage}")
+        return
+    if not ids and not ranges:
+        await update.message.reply_text(usage)
+        return
+    decided_by = int(update.effective_user.id)
+    if len(ids) == 1 and not ranges:
+        rid = ids[0]
+        if action == "approved":
+            res = await approve_request(rid, decided_by=decided_by)
+            if res["outcome"] != "approved":
+                await update.message.reply_text("Not found or not pending.")
+                return
+            _log_approved(rid, res, decided_by)
+            await update.message.reply_text(f"OK: approved #{rid} and awarded {res['amount']} points")
+        else:
+            if not await reject_request(rid, decided_by=decided_by):
+                await update.message.reply_text("Not found or not pending.")
+                return
+            log_event(logging.INFO, "economy_request_decided", action="reject", request_id=rid, decided_by=decided_by)
+            await update.message.reply_text(f"OK: rejected #{rid}")
         return
-    rid = int(context.args[0])
-    req = await get_request(rid)
-    if not req or req["status"] != "pending":
-        await update.message.reply_text("Not found or not pending.")
+    # one transaction, at most BULK_DECIDE_MAX rows; ranges match pending ids only
+    try:
+        results = await _decide_many(action, decided_by, ids=ids, ranges=ranges)
+    except ValueError as e:
+        await update.message.reply_text(f"{e}\n{usage}")
         return
+    await update.message.reply_text(_decision_summary(action, results))
 
-    await set_request_status(rid, "approved", decided_by=int(update.effective_user.id))
-    await add_points(int(req["user_id"]), int(req["amount"]), reason=req["kind"], ref=str(rid))
 
-    referrer = await get_referrer(int(req["user_id"]))
-    if referrer:
-        bonus = max(1, int(int(req["amount"]) * 0.05))
-        await add_points(int(referrer), bonus, reason="ref_bonus", ref=str(rid))
+async def approve_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _decide_cmd(update, context, "approved")
 
-    log_event(logging.INFO, "economy_request_decided", action="approve", request_id=rid, user_id=int(req["user_id"]), decided_by=int(update.effective_user.id), amount=int(req["amount"]), kind=req["kind"])
-    log_event(logging.INFO, "points_awarded", user_id=int(req["user_id"]), delta=int(req["amount"]), reason=req["kind"], ref=str(rid))
-    await update.message.reply_text(f"OK: approved #{rid} and awarded {req['amount']} points")
 
 async def reject_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _decide_cmd(update, context, "rejected")
+
+
+async def decide_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # "Approve all" on a /pending page: "dec:a:<page after-cursor>:<last row cursor>" selects the
+    # rows shown on that page (if still pending) without putting their ids in callback_data
+    q = update.callback_query
     if not await is_admin_rbac(update):
-        await update.message.reply_text("Access denied.")
-        return
-    if not context.args:
-        await update.message.reply_text("Usage: /reject <request_id>")
-        return
-    rid = int(context.args[0])
-    req = await get_request(rid)
-    if not req or req["status"] != "pending":
-        await update.message.reply_text("Not found or not pending.")
+        await q.answer("Access denied.")
         return
-    await set_request_status(rid, "rejected", decided_by=int(update.effective_user.id))
-    log_event(logging.INFO, "economy_request_decided", action="reject", request_id=rid, decided_by=int(update.effective_user.id))
-    log_event(logging.INFO, "economy_request_decided", action="reject", request_id=rid, decided_by=int(update.effective_user.id))
-    await update.message.reply_text(f"OK: rejected #{rid}")
-
+    _, _, after, upto = q.data.split(":", 3)
+    results = await _decide_many("approved", int(q.from_user.id), window=(after or None, upto))
+    await q.answer(_decision_summary("approved", results)[:200])
+    text_, markup = await _pending_page(after or None)
+    await q.edit_message_text(text_, reply_markup=markup)
 
 
 async def add_account_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -299,6 +441,44 @@ async def add_account_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     acc_id = await add_account(int(u.id), acc_type, label, details)
     await update.message.reply_text(f"OK: account saved #{acc_id}")
 
+async def _accounts_page(user_id: int, after=None):
+    items, nxt = split_page(await list_accounts(user_id, limit=ACCOUNTS_PAGE + 1, after=after), ACCOUNTS_PAGE)
+    lines = ["MY ACCOUNTS:"]
+    if not items:
+        lines.append("(none)")
+    else:
+        for a in items:
+            lines.append(f"- #{a['id']} {a['type']} {a['label']}")
+    return "\n".join(lines), _page_markup("acc", nxt, first=not after)
+
+async def accounts_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    u = update.effective_user
+    if not u:
+        await update.message.reply_text("No user.")
+        return
+    text_, markup = await _accounts_page(int(u.id))
+    await update.message.reply_text(text_, reply_markup=markup)
+
+async def page_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # inline "Next" / "First" buttons of /pending, /my and /accounts; user pages always use the presser's id
+    q = update.callback_query
+    _, kind, cursor = q.data.split(":", 2)
+    uid = int(q.from_user.id)
+    if kind == "pending":
+        if not await is_admin_rbac(update):
+            await q.answer("Access denied.")
+            return
+        text_, markup = await _pending_page(cursor)
+    elif kind == "my":
+        text_, markup = await _my_page(uid, cursor)
+    elif kind == "acc":
+        text_, markup = await _accounts_page(uid, cursor)
+    else:
+        await q.answer()
+        return
+    await q.answer()
+    await q.edit_message_text(text_, reply_markup=markup)
+
 async def prices_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     plans = await list_plans()
     lines = ["PRICES:"]
@@ -321,6 +501,35 @@ async def set_price_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await set_plan_price(code, amt, "SELHA")
     await update.message.reply_text(f"OK: price set {code} = {amt} SELHA")
 
+BULK_POINTS_MAX_BYTES = int(os.getenv("BULK_POINTS_MAX_BYTES", str(20 * 1024 * 1024)))
+
+async def bulk_points_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # owner replies /bulk_points to a CSV document: user_id,delta,ref[,reason]
+    if not is_owner(update):
+        await update.message.reply_text("Access denied.")
+        return
+    src = update.message.reply_to_message
+    doc = src.document if src else None
+    if doc is None:
+        await update.message.reply_text("Usage: reply /bulk_points to a CSV file (user_id,delta,ref[,reason])")
+        return
+    if doc.file_size and doc.file_size > BULK_POINTS_MAX_BYTES:
+        await update.message.reply_text(f"File too large ({doc.file_size} bytes, max {BULK_POINTS_MAX_BYTES}).")
+        return
+    data = await (await doc.get_file()).download_as_bytearray()
+    entries, errors = parse_points_csv(bytes(data).decode("utf-8-sig", errors="replace"))
+    if errors:
+        await update.message.reply_text("Rejected, nothing credited:\n" + "\n".join(errors))
+        return
+    t0 = time.perf_counter()
+    res = await add_points_many(entries)
+    dt_ms = int((time.perf_counter() - t0) * 1000)
+    log_event(logging.INFO, "points_bulk", file=doc.file_name, by=int(update.effective_user.id), dt_ms=dt_ms, **res)
+    await update.message.reply_text(
+        f"OK: {res['inserted']} credited, {res['skipped']} skipped (already applied), "
+        f"{res['users']} users, total {res['total_delta']} points ({dt_ms} ms)"
+    )
+
 async def trade_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # manual trading wizard (request -> approve)
     u = update.effective_user
@@ -337,15 +546,15 @@ async def trade_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     amt = _parse_amount(context.args[1])
     note = " ".join(context.args[2:]) if len(context.args) > 2 else None
     kind = "buy_token" if side == "buy" else "sell_token"
-    req_id = await create_payment_request(int(u.id), kind, amt, "SELHA", note=note)
-    await update.message.reply_text(f"OK: trade request created #{req_id} ({kind}) [pending]")
+    req_id, created = await create_payment_request(int(u.id), kind, amt, "SELHA", note=note, client_key=_client_key(update))
+    await update.message.reply_text(f"OK: trade request {'created' if created else 'already created'} #{req_id} ({kind}) [pending]")
 
 
 async def donate_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not DONATE_URL:
-        await update.message.reply_text("Donations are not configured yet.")
+        await webhook_reply.reply_text(update, "Donations are not configured yet.")
         return
-    await update.message.reply_text(f"DONATE / SUPPORT\n{DONATE_URL}")
+    await webhook_reply.reply_text(update, f"DONATE / SUPPORT\n{DONATE_URL}")
 
 async def vars_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update):
@@ -398,35 +607,28 @@ async def diag_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"webhook_url: {WEBHOOK_URL or 'MISSING'}",
     ]))
 
+async def _ping_reply(update: Update, label: str, component: str):
+    # cached active probe (bot/health_prober.py); a stale result triggers one shared probe
+    p = PROBERS[component]
+    r = await p.get(max_age_s=float(os.getenv("PING_MAX_AGE_S", "2")))
+    st = p.stats()
+    line = f"{label} ping: {'OK' if r.ok else 'FAIL'} ({int(r.latency_ms)} ms)"
+    line += f" p50={st['p50_ms']}ms p99={st['p99_ms']}ms n={st['samples']} age={st['age_s']}s"
+    if r.error:
+        line += " | " + r.error
+    await update.message.reply_text(line)
+
 async def pingdb_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update):
         await update.message.reply_text("? Access denied.")
         return
-    t0 = time.perf_counter()
-    ok = True
-    err = None
-    try:
-        _ = await runtime_report(full=False)
-    except Exception as e:
-        ok = False
-        err = f"{type(e).__name__}: {e}"
-    dt = int((time.perf_counter() - t0) * 1000)
-    await update.message.reply_text(f"DB ping: {'OK' if ok else 'FAIL'} ({dt} ms){'' if not err else ' | ' + err}")
+    await _ping_reply(update, "DB", "postgres")
 
 async def pingredis_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update):
         await update.message.reply_text("? Access denied.")
         return
-    t0 = time.perf_counter()
-    ok = True
-    err = None
-    try:
-        _ = await runtime_report(full=False)
-    except Exception as e:
-        ok = False
-        err = f"{type(e).__name__}: {e}"
-    dt = int((time.perf_counter() - t0) * 1000)
-    await update.message.reply_text(f"Redis ping: {'OK' if ok else 'FAIL'} ({dt} ms){'' if not err else ' | ' + err}")
+    await _ping_reply(update, "Redis", "redis")
 
 
 
@@ -541,6 +743,10 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
 
 async def post_init(app):
     await init_infrastructure()
+    await boot_tasks(app)
+
+async def boot_tasks(app):
+    # one-time per deploy; the FastAPI server runs this on the elected worker only
     if ADMIN_CHAT_ID:
         await app.bot.send_message(chat_id=int(ADMIN_CHAT_ID), text="BOOT/ADMIN REPORT\n\n" + await runtime_report(full=True))
 
@@ -563,10 +769,22 @@ async def post_init(app):
     except Exception:
         pass
 
+class _CommitFirstRequest(HTTPXRequest):
+    # Bot API calls made by a handler first commit its unit of work (see with_latency)
+    async def do_request(self, *args, **kwargs):
+        await commit_unit_of_work()
+        return await super().do_request(*args, **kwargs)
+
+
 def build_application():
     if not BOT_TOKEN:
         raise ValueError("BOT_TOKEN not set")
-    app = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).build()
+    # pool size as PTB's default request
+    builder = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).request(_CommitFirstRequest(connection_pool_size=256))
+    if TELEGRAM_API_BASE_URL:
+        # stub Bot API for local load tests (tools/stub_telegram.py)
+        builder = builder.base_url(TELEGRAM_API_BASE_URL)
+    app = builder.build()
     app.add_error_handler(error_handler)
     app.add_handler(CommandHandler("start", with_latency("start", start_cmd)))
     app.add_handler(CommandHandler("menu", with_latency("menu", menu_cmd)))
@@ -592,15 +810,20 @@ def build_application():
     # === Economy commands (Commit A) ===
     app.add_handler(CommandHandler("ref", with_latency("ref", ref_cmd)))
     app.add_handler(CommandHandler("my", with_latency("my", my_cmd)))
+    app.add_handler(CommandHandler("top", with_latency("top", top_cmd)))
     app.add_handler(CommandHandler("buy", with_latency("buy", buy_cmd)))
     app.add_handler(CommandHandler("claim", with_latency("claim", claim_cmd)))
     app.add_handler(CommandHandler("pending", with_latency("pending", pending_cmd)))
     app.add_handler(CommandHandler("approve", with_latency("approve", approve_cmd)))
     app.add_handler(CommandHandler("reject", with_latency("reject", reject_cmd)))
     app.add_handler(CommandHandler("add_account", with_latency("add_account", add_account_cmd)))
+    app.add_handler(CommandHandler("accounts", with_latency("accounts", accounts_cmd)))
     app.add_handler(CommandHandler("prices", with_latency("prices", prices_cmd)))
     app.add_handler(CommandHandler("set_price", with_latency("set_price", set_price_cmd)))
+    app.add_handler(CommandHandler("bulk_points", with_latency("bulk_points", bulk_points_cmd)))
     app.add_handler(CommandHandler("trade", with_latency("trade", trade_cmd)))
+    app.add_handler(CallbackQueryHandler(with_latency("page", page_cb), pattern=r"^pg:"))
+    app.add_handler(CallbackQueryHandler(with_latency("decide", decide_cb), pattern=r"^dec:"))
 
     return app
 
@@ -616,18 +839,13 @@ async def healthz_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         payload = {"ok": True, "uptime_s": _uptime_s(), "git_sha": (git_sha() if callable(globals().get("git_sha")) else None)}
     except Exception as e:
         payload = {"ok": False, "error": str(e)}
-    await update.effective_message.reply_text(json.dumps(payload, ensure_ascii=False))
+    await webhook_reply.reply_text(update, json.dumps(payload, ensure_ascii=False))
 
 async def readyz_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # same verdict as HTTP /readyz (startup state + cached probes)
     t0 = time.perf_counter()
-    try:
-        # lightweight readiness: if runtime_report exists use it; else just ok
-        rr = globals().get("runtime_report")
-        if rr:
-            _ = await rr(full=False)
-        payload = {"ok": True, "elapsed_ms": int((time.perf_counter() - t0) * 1000)}
-    except Exception as e:
-        payload = {"ok": False, "error": str(e), "elapsed_ms": int((time.perf_counter() - t0) * 1000)}
+    payload = health_prober.readiness_report()
+    payload["elapsed_ms"] = int((time.perf_counter() - t0) * 1000)
     await update.effective_message.reply_text(json.dumps(payload, ensure_ascii=False))
 
 
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+from bot import infrastructure
+from bot.metrics import CACHE_REQUESTS
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_cache")
+
+T = TypeVar("T")
+
+
+class VersionedCache(Generic[T]):
+    """In-process read-through cache invalidated across replicas by a Redis version counter.
+
+    A value is served from memory while it is younger than ttl_s; the Redis version key is read at
+    most every check_s, so a bump from any replica is picked up within check_s. Without Redis
+    (or when it errors) staleness is bounded by ttl_s alone.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Awaitable[T]], ttl_s: float = 300.0, check_s: float = 1.0):
+        self.name = name
+        self.key = f"guardian:cache:{name}:v"
+        self._loader = loader
+        self.ttl_s = ttl_s
+        self.check_s = check_s
+        self._value: Optional[T] = None
+        self._version: Optional[int] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._generation = 0  # bumped by invalidate(): a load started before it is not kept
+
+    async def _remote_version(self) -> Optional[int]:
+        r = infrastructure.redis_client
+        if r is None:
+            return None
+        try:
+            v = await r.get(self.key)
+        except Exception as e:
+            log_json(logging.WARNING, "cache_version_error", cache=self.name, error=f"{type(e).__name__}: {e}")
+            return None
+        return int(v or 0)
+
+    async def _load(self, version: Optional[int], generation: int) -> T:
+        value = await self._loader()
+        if generation != self._generation:
+            # invalidated here while loading (with or without Redis): the value may predate the
+            # write, so hand it to this load's waiters but do not cache it
+            return value
+        now = time.monotonic()
+        # the version was read before loading: a bump racing the load forces another reload next time
+        self._value, self._version, self._loaded_at, self._checked_at = value, version, now, now
+        return value
+
+    async def get(self) -> T:
+        now = time.monotonic()
+        fresh = self._loaded_at and now - self._loaded_at < self.ttl_s
+        if fresh and now - self._checked_at < self.check_s:
+            CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+            return self._value
+        version = await self._remote_version()
+        if fresh and (version is None or version == self._version):
+            self._checked_at = now
+            CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+            return self._value
+        CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+        # single-flight: concurrent misses share one loader call
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._load(version, self._generation))
+        return await asyncio.shield(self._inflight)
+
+    async def invalidate(self) -> None:
+        # call after the write is committed (infrastructure.after_commit)
+        self._loaded_at = 0.0
+        self._generation += 1
+        self._inflight = None  # a load already on the wire may predate the write
+        r = infrastructure.redis_client
+        if r is not None:
+            try:
+                await r.incr(self.key)
+            except Exception as e:
+                log_json(logging.WARNING, "cache_invalidate_error", cache=self.name, error=f"{type(e).__name__}: {e}")
+
+
+def ttl_from_env(name: str, default: float = 300.0) -> float:
+    return float(os.getenv(f"{name.upper()}_CACHE_TTL_S", str(default)))
@@ -5,6 +5,7 @@ ENV = os.getenv("ENV", "production").lower()
 MODE = os.getenv("MODE", "polling").lower()  # polling | webhook
 BOT_TOKEN = os.getenv("TELEGRAM_TOKEN")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # for webhook mode (optional)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")  # optional: Bot API stub for load tests
 
 # Admin
 ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")  # numeric chat_id of admin
@@ -1,15 +1,20 @@
 ﻿from __future__ import annotations
 
-import time
+import logging
+import os
+from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from sqlalchemy import text
-from bot.infrastructure import get_db_session
-
-
-def _now_ms() -> int:
-    return int(time.time() * 1000)
+from bot import leaderboard
+from bot.cache import VersionedCache, ttl_from_env
+from bot.ids import next_id, next_ids
+from bot.infrastructure import after_commit, get_db_session, get_read_session
+from bot.metrics import BALANCE_RECONCILE
+from bot.paging import decode_cursor, encode_cursor
+from bot.telemetry import log_json
 
 
 async def create_payment_request(
@@ -19,36 +24,89 @@ async def create_payment_request(
     currency: str = "SELHA",
     tx_ref: Optional[str] = None,
     note: Optional[str] = None,
-) -> int:
-    req_id = _now_ms()
+    client_key: Optional[str] = None,
+) -> Tuple[int, bool]:
+    # -> (request id, created). A repeated client_key for the same user (webhook retry, replayed
+    # update) returns the existing request instead of a second pending row.
+    req_id = next_id()
     async for s in get_db_session():
-        await s.execute(
+        r = await s.execute(
             text("""
-                INSERT INTO payment_requests(id,user_id,kind,amount,currency,tx_ref,note,status)
-                VALUES (:id,:uid,:kind,:amt,:cur,:tx,:note,'pending')
+                WITH ins AS (
+                    INSERT INTO payment_requests(id,user_id,kind,amount,currency,tx_ref,note,status,client_key)
+                    VALUES (:id,:uid,:kind,:amt,:cur,:tx,:note,'pending',:ck)
+                    ON CONFLICT (user_id, client_key) WHERE client_key IS NOT NULL DO NOTHING
+                    RETURNING id
+                )
+                SELECT id, true FROM ins
+                UNION ALL
+                SELECT id, false FROM payment_requests WHERE user_id=:uid AND client_key=:ck
+                LIMIT 1
             """),
-            {"id": req_id, "uid": int(user_id), "kind": kind, "amt": int(amount), "cur": currency, "tx": tx_ref, "note": note},
+            {"id": req_id, "uid": int(user_id), "kind": kind, "amt": int(amount), "cur": currency, "tx": tx_ref, "note": note, "ck": client_key},
         )
+        row = r.first()
+        if row is None:
+            # lost a race with an insert that committed after this statement's snapshot was taken
+            r = await s.execute(
+                text("SELECT id, false FROM payment_requests WHERE user_id=:uid AND client_key=:ck"),
+                {"uid": int(user_id), "ck": client_key},
+            )
+            row = r.first()
         await s.commit()
-    return req_id
+        if not row[1]:
+            log_json(logging.INFO, "payment_request_replayed", request_id=int(row[0]), user_id=int(user_id), client_key=client_key)
+        return int(row[0]), bool(row[1])
 
 
-async def list_pending_requests(limit: int = 10) -> List[Dict[str, Any]]:
+def _keyset(after: Optional[str], op: str) -> Tuple[str, Dict[str, Any]]:
+    # keyset condition on (created_at, id); op is ">" for ascending pages, "<" for descending ones
+    key = decode_cursor(after)
+    if key is None:
+        return "", {}
+    return f"AND (created_at, id) {op} (:after_ts, :after_id)", {"after_ts": key[0], "after_id": key[1]}
+
+
+async def list_pending_requests(limit: int = 10, after: Optional[str] = None) -> List[Dict[str, Any]]:
+    # oldest first; `after` is the cursor of the last row of the previous page (bot.paging)
+    cond, params = _keyset(after, ">")
+    async for s in get_read_session():
+        r = await s.execute(
+            text(f"""
+                SELECT id,user_id,kind,amount,currency,tx_ref,note,created_at
+                FROM payment_requests
+                WHERE status='pending' {cond}
+                ORDER BY created_at ASC, id ASC
+                LIMIT :lim
+            """),
+            {"lim": int(limit), **params},
+        )
+        return [
+            {"id": int(x[0]), "user_id": int(x[1]), "kind": x[2], "amount": int(x[3]), "currency": x[4], "tx_ref": x[5], "note": x[6], "created_at": str(x[7]), "cursor": encode_cursor(x[7], x[0])}
+            for x in r.fetchall()
+        ]
+
+
+async def list_pending_by_ids(ids: Sequence[int]) -> List[Dict[str, Any]]:
+    # the still-pending subset of ids, in /pending order (admin inbox digests); on the primary:
+    # NOTIFY fires at commit, before a replica has replayed the row
+    if not ids:
+        return []
     async for s in get_db_session():
         r = await s.execute(
             text("""
                 SELECT id,user_id,kind,amount,currency,tx_ref,note,created_at
                 FROM payment_requests
-                WHERE status='pending'
-                ORDER BY created_at ASC
-                LIMIT :lim
+                WHERE id = ANY(CAST(:ids AS BIGINT[])) AND status='pending'
+                ORDER BY created_at ASC, id ASC
             """),
-            {"lim": int(limit)},
+            {"ids": [int(i) for i in ids]},
         )
         return [
-            {"id": int(x[0]), "user_id": int(x[1]), "kind": x[2], "amount": int(x[3]), "currency": x[4], "tx_ref": x[5], "note": x[6], "created_at": str(x[7])}
+            {"id": int(x[0]), "user_id": int(x[1]), "kind": x[2], "amount": int(x[3]), "currency": x[4], "tx_ref": x[5], "note": x[6], "created_at": str(x[7]), "cursor": encode_cursor(x[7], x[0])}
             for x in r.fetchall()
         ]
+    return []
 
 
 async def get_request(req_id: int) -> Optional[Dict[str, Any]]:
@@ -92,8 +150,284 @@ async def set_request_status(req_id: int, status: str, decided_by: int) -> None:
         await s.commit()
 
 
+# Referral bonus percent per level of the referral tree: "5" = 5% to the direct referrer only,
+# "5,2,1" = 5% / 2% / 1% up three levels. referral_paths holds REFERRAL_MAX_DEPTH levels, so
+# bonuses and referral counts stop there (the tree itself may be deeper).
+REFERRAL_MAX_DEPTH = 10
+REFERRAL_LOCK = 7_246_010_226  # same key as the referral_paths trigger
+REF_BONUS_LEVELS = [int(x) for x in os.getenv("REF_BONUS_LEVELS", "5").split(",") if x.strip()]
+if len(REF_BONUS_LEVELS) > REFERRAL_MAX_DEPTH:
+    log_json(logging.WARNING, "ref_bonus_levels_capped", configured=len(REF_BONUS_LEVELS), used=REFERRAL_MAX_DEPTH)
+    del REF_BONUS_LEVELS[REFERRAL_MAX_DEPTH:]
+
+
+async def approve_request(req_id: int, decided_by: int) -> Dict[str, Any]:
+    # One statement: conditional status flip, user award and the referral bonuses.
+    # Two admins racing on the same id: the row lock makes the loser's UPDATE match nothing.
+    # Bonuses walk up the referral_paths closure: one index range of at most len(REF_BONUS_LEVELS) rows.
+    entry_id, *bonus_ids = next_ids(1 + len(REF_BONUS_LEVELS))
+    async for s in get_db_session():
+        r = await s.execute(
+            text("""
+                WITH upd AS (
+                    UPDATE payment_requests
+                    SET status='approved', decided_by=:db, decided_at=now()
+                    WHERE id=:id AND status='pending'
+                    RETURNING id, user_id, kind, amount
+                ),
+                award AS (
+                    INSERT INTO points_ledger(id,user_id,delta,reason,ref)
+                    SELECT :eid, user_id, amount, kind, CAST(id AS TEXT) FROM upd
+                    RETURNING id
+                ),
+                bonus AS (
+                    INSERT INTO points_ledger(id,user_id,delta,reason,ref)
+                    SELECT (CAST(:bids AS BIGINT[]))[rp.depth], rp.ancestor_id,
+                           GREATEST(1, (upd.amount * lv.pct) / 100),
+                           CASE WHEN rp.depth = 1 THEN 'ref_bonus' ELSE 'ref_bonus_l' || rp.depth END,
+                           CAST(upd.id AS TEXT)
+                    FROM upd
+                    JOIN referral_paths rp ON rp.descendant_id = upd.user_id AND rp.depth <= :levels
+                    JOIN unnest(CAST(:pcts AS INT[])) WITH ORDINALITY AS lv(pct, lvl) ON lv.lvl = rp.depth
+                    WHERE lv.pct > 0
+                    RETURNING user_id, delta, id
+                )
+                SELECT
+                    (SELECT status FROM payment_requests WHERE id=:id) AS prev_status,
+                    upd.user_id, upd.kind, upd.amount,
+                    (SELECT array_agg(ARRAY[id, user_id, delta] ORDER BY id) FROM bonus) AS bonuses
+                FROM (SELECT 1) one
+                LEFT JOIN upd ON true
+            """),
+            {
+                "id": int(req_id), "db": int(decided_by), "eid": entry_id, "bids": bonus_ids,
+                "levels": len(REF_BONUS_LEVELS), "pcts": REF_BONUS_LEVELS,
+            },
+        )
+        row = r.first()
+        await s.commit()
+        # the outer SELECT sees the pre-statement snapshot, so prev_status is the status we raced against
+        if row[1] is None:
+            return {"outcome": ("not_found" if row[0] is None else "not_pending"), "status": row[0]}
+        # bonus ids were handed out by level, so the id tells the level (and ORDER BY id goes upwards)
+        level_of = {bid: i + 1 for i, bid in enumerate(bonus_ids)}
+        bonuses = [{"user_id": int(u), "delta": int(d), "level": level_of[int(bid)]} for bid, u, d in (row[4] or [])]
+        await _rank_after_commit([(row[1], row[3])] + [(b["user_id"], b["delta"]) for b in bonuses])
+        return {
+            "outcome": "approved",
+            "user_id": int(row[1]),
+            "kind": row[2],
+            "amount": int(row[3]),
+            "referrer_id": (bonuses[0]["user_id"] if bonuses else None),
+            "bonus": (bonuses[0]["delta"] if bonuses else 0),
+            "bonuses": bonuses,
+        }
+
+
+async def reject_request(req_id: int, decided_by: int) -> bool:
+    async for s in get_db_session():
+        r = await s.execute(
+            text("""
+                UPDATE payment_requests
+                SET status='rejected', decided_by=:db, decided_at=now()
+                WHERE id=:id AND status='pending'
+                RETURNING id
+            """),
+            {"db": int(decided_by), "id": int(req_id)},
+        )
+        ok = r.first() is not None
+        await s.commit()
+        return ok
+
+
+# Bulk decisions (/approve 1,2,5-9, "Approve all" on /pending): one statement per batch, at most
+# BULK_DECIDE_MAX rows. Rows are locked in id order, so two bulk runs cannot deadlock each other.
+BULK_DECIDE_MAX = int(os.getenv("BULK_DECIDE_MAX", "1000"))
+
+
+def _bulk_cap(ids: Sequence[int], ranges: Sequence[Tuple[int, int]], window, limit: int) -> int:
+    # rows one statement may decide; more explicit ids than that is an error, not a silent cut
+    n = len({int(i) for i in ids})
+    if n > int(limit):
+        raise ValueError(f"At most {int(limit)} ids per command (got {n}).")
+    return n if not ranges and window is None else int(limit)
+
+
+def _decide_selection(
+    ids: Sequence[int], ranges: Sequence[Tuple[int, int]], window: Optional[Tuple[Optional[str], str]]
+) -> Tuple[str, Dict[str, Any]]:
+    # ids OR id ranges (inclusive) OR a keyset window (after, upto] of the /pending order
+    conds: List[str] = []
+    params: Dict[str, Any] = {}
+    if ids:
+        conds.append("id = ANY(CAST(:ids AS BIGINT[]))")
+        params["ids"] = [int(i) for i in ids]
+    if ranges:
+        conds.append(
+            "EXISTS (SELECT 1 FROM unnest(CAST(:lo AS BIGINT[]), CAST(:hi AS BIGINT[])) AS r(lo, hi) WHERE id BETWEEN r.lo AND r.hi)"
+        )
+        params["lo"] = [int(a) for a, _ in ranges]
+        params["hi"] = [int(b) for _, b in ranges]
+    upto = decode_cursor(window[1]) if window else None
+    if upto is not None:
+        after = decode_cursor(window[0])
+        cond = "(created_at, id) <= (:upto_ts, :upto_id)"
+        params.update(upto_ts=upto[0], upto_id=upto[1])
+        if after is not None:
+            cond += " AND (created_at, id) > (:after_ts, :after_id)"
+            params.update(after_ts=after[0], after_id=after[1])
+        conds.append(f"({cond})")
+    return (" OR ".join(conds) or "false"), params
+
+
+async def _missing_outcomes(s, ids: Sequence[int], done: set) -> List[Dict[str, Any]]:
+    # explicit ids the batch did not decide: not found, already decided (current status), or still
+    # pending because ids and ranges together selected more than the limit
+    missing = sorted({int(i) for i in ids} - done)
+    if not missing:
+        return []
+    r = await s.execute(text("SELECT id, status FROM payment_requests WHERE id = ANY(CAST(:ids AS BIGINT[]))"), {"ids": missing})
+    status = {int(x[0]): x[1] for x in r.fetchall()}
+
+    def outcome(i: int) -> str:
+        if i not in status:
+            return "not_found"
+        return "over_limit" if status[i] == "pending" else "not_pending"
+
+    return [{"id": i, "outcome": outcome(i), "status": status.get(i)} for i in missing]
+
+
+async def approve_requests(
+    decided_by: int,
+    ids: Sequence[int] = (),
+    ranges: Sequence[Tuple[int, int]] = (),
+    window: Optional[Tuple[Optional[str], str]] = None,
+    limit: int = BULK_DECIDE_MAX,
+) -> List[Dict[str, Any]]:
+    # Set-based approve_request: status flips, awards and referral bonuses for every selected pending
+    # row in one statement. Returns one outcome per decided row and per explicit id, ordered by id.
+    # Raises ValueError for more than `limit` explicit ids.
+    levels = len(REF_BONUS_LEVELS)
+    cap = _bulk_cap(ids, ranges, window, limit)
+    if cap <= 0:
+        return []
+    # award ids first, then `levels` bonus slots per request (slot = (rn - 1) * levels + depth)
+    reserved = next_ids(cap * (1 + levels))
+    award_ids, bonus_ids = reserved[:cap], reserved[cap:]
+    sel, params = _decide_selection(ids, ranges, window)
+    async for s in get_db_session():
+        r = await s.execute(
+            text(f"""
+                WITH pick AS (
+                    SELECT id FROM payment_requests
+                    WHERE status='pending' AND ({sel})
+                    ORDER BY id
+                    LIMIT :lim
+                    FOR UPDATE
+                ),
+                upd AS (
+                    UPDATE payment_requests
+                    SET status='approved', decided_by=:db, decided_at=now()
+                    WHERE id = ANY(ARRAY(SELECT id FROM pick)) AND status='pending'
+                    RETURNING id, user_id, kind, amount
+                ),
+                num AS (
+                    SELECT id, user_id, kind, amount, row_number() OVER (ORDER BY id) AS rn FROM upd
+                ),
+                award AS (
+                    INSERT INTO points_ledger(id,user_id,delta,reason,ref)
+                    SELECT (CAST(:aids AS BIGINT[]))[rn], user_id, amount, kind, CAST(id AS TEXT) FROM num
+                    RETURNING id
+                ),
+                bonus AS (
+                    INSERT INTO points_ledger(id,user_id,delta,reason,ref)
+                    SELECT (CAST(:bids AS BIGINT[]))[(num.rn - 1) * :levels + rp.depth], rp.ancestor_id,
+                           GREATEST(1, (num.amount * lv.pct) / 100),
+                           CASE WHEN rp.depth = 1 THEN 'ref_bonus' ELSE 'ref_bonus_l' || rp.depth END,
+                           CAST(num.id AS TEXT)
+                    FROM num
+                    JOIN referral_paths rp ON rp.descendant_id = num.user_id AND rp.depth <= :levels
+                    JOIN unnest(CAST(:pcts AS INT[])) WITH ORDINALITY AS lv(pct, lvl) ON lv.lvl = rp.depth
+                    WHERE lv.pct > 0
+                    RETURNING ref, id, user_id, delta
+                )
+                -- request rows and bonus rows in one result (joining DML CTEs gets 1-row estimates)
+                SELECT id, user_id, amount, kind, NULL AS req_id FROM num
+                UNION ALL
+                SELECT id, user_id, delta, NULL, CAST(ref AS BIGINT) FROM bonus
+            """),
+            {
+                **params, "lim": cap, "db": int(decided_by), "aids": award_ids, "bids": bonus_ids,
+                "levels": levels, "pcts": REF_BONUS_LEVELS,
+            },
+        )
+        level_of = {bid: i % levels + 1 for i, bid in enumerate(bonus_ids)}
+        rows = r.fetchall()
+        decided = {
+            int(rid): {"id": int(rid), "outcome": "approved", "user_id": int(uid), "kind": kind, "amount": int(amount), "bonuses": []}
+            for rid, uid, amount, kind, req_id in rows
+            if req_id is None
+        }
+        # bonus ids were handed out by slot, so the id tells the level
+        for bid, uid, delta, _, req_id in sorted(x for x in rows if x[4] is not None):
+            decided[int(req_id)]["bonuses"].append({"user_id": int(uid), "delta": int(delta), "level": level_of[int(bid)]})
+        out: List[Dict[str, Any]] = list(decided.values())
+        out += await _missing_outcomes(s, ids, {o["id"] for o in out})
+        await s.commit()
+        await _rank_after_commit(
+            [(o["user_id"], o["amount"]) for o in out if o["outcome"] == "approved"]
+            + [(b["user_id"], b["delta"]) for o in out if o["outcome"] == "approved" for b in o["bonuses"]]
+        )
+        return sorted(out, key=lambda o: o["id"])
+    return []
+
+
+async def reject_requests(
+    decided_by: int,
+    ids: Sequence[int] = (),
+    ranges: Sequence[Tuple[int, int]] = (),
+    window: Optional[Tuple[Optional[str], str]] = None,
+    limit: int = BULK_DECIDE_MAX,
+) -> List[Dict[str, Any]]:
+    # same selection and outcomes as approve_requests, without ledger writes
+    cap = _bulk_cap(ids, ranges, window, limit)
+    if cap <= 0:
+        return []
+    sel, params = _decide_selection(ids, ranges, window)
+    async for s in get_db_session():
+        r = await s.execute(
+            text(f"""
+                WITH pick AS (
+                    SELECT id FROM payment_requests
+                    WHERE status='pending' AND ({sel})
+                    ORDER BY id
+                    LIMIT :lim
+                    FOR UPDATE
+                )
+                UPDATE payment_requests
+                SET status='rejected', decided_by=:db, decided_at=now()
+                WHERE id = ANY(ARRAY(SELECT id FROM pick)) AND status='pending'
+                RETURNING id, user_id
+            """),
+            {**params, "lim": cap, "db": int(decided_by)},
+        )
+        out = [{"id": int(rid), "outcome": "rejected", "user_id": int(uid)} for rid, uid in r.fetchall()]
+        out += await _missing_outcomes(s, ids, {o["id"] for o in out})
+        await s.commit()
+        return sorted(out, key=lambda o: o["id"])
+    return []
+
+
+async def _rank_after_commit(deltas: Iterable[Tuple[int, int]]) -> None:
+    # mirror committed balance changes into the Redis leaderboard (best-effort; see leaderboard.rebuild)
+    per_user: Dict[int, int] = defaultdict(int)
+    for u, d in deltas:
+        per_user[int(u)] += int(d)
+    await after_commit(partial(leaderboard.apply, dict(per_user)))
+
+
 async def add_points(user_id: int, delta: int, reason: str, ref: Optional[str] = None) -> int:
-    entry_id = _now_ms()
+    entry_id = next_id()
     async for s in get_db_session():
         await s.execute(
             text("""
@@ -103,34 +437,230 @@ async def add_points(user_id: int, delta: int, reason: str, ref: Optional[str] =
             {"id": entry_id, "uid": int(user_id), "d": int(delta), "r": reason, "ref": ref},
         )
         await s.commit()
+    await _rank_after_commit([(user_id, delta)])
     return entry_id
 
 
-async def get_points_balance(user_id: int) -> int:
+# Bulk ingestion: rows are COPYed into a temp table in batches, then moved into the ledger with one
+# INSERT (the balance trigger then runs once per statement). Bulk refs live in their own namespace
+# (BULK_REF_PREFIX, so a CSV ref "123" is not request #123's award) and the unique partial index
+# ux_points_ledger_bulk_ref makes (ref, user_id) apply once, across concurrent runs too.
+BULK_POINTS_BATCH = 10_000
+BULK_REF_PREFIX = "bulk:"
+
+
+def _with_ids(batch: List[Tuple[int, int, str, str]]) -> List[Tuple[int, int, int, str, str]]:
+    return [(i, int(u), int(d), r, BULK_REF_PREFIX + ref) for i, (u, d, r, ref) in zip(next_ids(len(batch)), batch)]
+
+
+def _batches(entries: Iterable[Tuple[int, int, str, str]], size: int) -> Iterator[List[Tuple[int, int, int, str, str]]]:
+    batch: List[Tuple[int, int, str, str]] = []
+    for e in entries:
+        batch.append(e)
+        if len(batch) >= size:
+            yield _with_ids(batch)
+            batch = []
+    if batch:
+        yield _with_ids(batch)
+
+
+async def add_points_many(entries: Iterable[Tuple[int, int, str, str]], batch_size: int = BULK_POINTS_BATCH) -> Dict[str, int]:
+    # entries: (user_id, delta, reason, ref), stored as ref "bulk:<ref>". Idempotent per
+    # (ref, user_id): pairs already in the ledger, or repeated in the input, are skipped.
+    # All-or-nothing: one transaction.
     async for s in get_db_session():
-        r = await s.execute(text("SELECT COALESCE(SUM(delta),0) FROM points_ledger WHERE user_id=:u"), {"u": int(user_id)})
+        await s.execute(
+            text("""
+                CREATE TEMP TABLE IF NOT EXISTS _bulk_points (
+                    id BIGINT, user_id BIGINT, delta INTEGER, reason VARCHAR(64), ref VARCHAR(256)
+                ) ON COMMIT DROP
+            """)
+        )
+        await s.execute(text("TRUNCATE _bulk_points"))
+        raw = await (await s.connection()).get_raw_connection()
+        rows = 0
+        for batch in _batches(entries, batch_size):
+            await raw.driver_connection.copy_records_to_table(
+                "_bulk_points", records=batch, columns=("id", "user_id", "delta", "reason", "ref")
+            )
+            rows += len(batch)
+        r = await s.execute(
+            text("""
+                WITH ins AS (
+                    INSERT INTO points_ledger(id,user_id,delta,reason,ref)
+                    SELECT DISTINCT ON (b.ref, b.user_id) b.id, b.user_id, b.delta, b.reason, b.ref
+                    FROM _bulk_points b
+                    ORDER BY b.ref, b.user_id, b.id
+                    ON CONFLICT (ref, user_id) WHERE ref LIKE 'bulk:%' DO NOTHING
+                    RETURNING user_id, delta
+                )
+                SELECT user_id, count(*), SUM(delta) FROM ins GROUP BY user_id
+            """)
+        )
+        per_user = [(int(u), int(n), int(d)) for u, n, d in r.fetchall()]
+        await s.commit()
+        await _rank_after_commit([(u, d) for u, _, d in per_user])
+        inserted = sum(n for _, n, _ in per_user)
+        return {"rows": rows, "inserted": inserted, "skipped": rows - inserted, "users": len(per_user), "total_delta": sum(d for _, _, d in per_user)}
+    return {"rows": 0, "inserted": 0, "skipped": 0, "users": 0, "total_delta": 0}
+
+
+async def get_points_balance(user_id: int) -> int:
+    # points_balances is kept in step with points_ledger by a trigger (same transaction)
+    async for s in get_read_session():
+        r = await s.execute(text("SELECT balance FROM points_balances WHERE user_id=:u"), {"u": int(user_id)})
         return int(r.scalar() or 0)
 
 
-async def list_user_requests(user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+# Users with ledger rows or a balance row, after :after, in user_id order. The ledger side is a
+# loose index scan on ix_points_ledger_user, so a user with 1M rows costs one index probe here.
+_RECONCILE_IDS = """
+    WITH RECURSIVE l(u, n) AS (
+        SELECT (SELECT min(user_id) FROM points_ledger WHERE user_id > :after), 1
+        UNION ALL
+        SELECT (SELECT min(user_id) FROM points_ledger WHERE user_id > l.u), l.n + 1
+        FROM l WHERE l.u IS NOT NULL AND l.n < :lim
+    )
+    SELECT u FROM l WHERE u IS NOT NULL
+    UNION
+    (SELECT user_id FROM points_balances WHERE user_id > :after ORDER BY user_id LIMIT :lim)
+    ORDER BY 1
+    LIMIT :lim
+"""
+
+_RECONCILE_DRIFT = """
+    SELECT i.u, b.balance, COALESCE((SELECT SUM(delta) FROM points_ledger WHERE user_id = i.u), 0) AS actual
+    FROM unnest(CAST(:ids AS BIGINT[])) AS i(u)
+    LEFT JOIN points_balances b ON b.user_id = i.u
+"""
+
+
+async def _reconcile_chunk(ids: List[int], fix: bool) -> List[Dict[str, Any]]:
     async for s in get_db_session():
+        if fix:
+            # Lock the chunk's balance rows (creating missing ones) in user_id order, like the trigger.
+            # Writers that already committed are visible to the next statement; the rest wait for us
+            # and then apply their delta on top of the corrected balance.
+            await s.execute(
+                text("""
+                    INSERT INTO points_balances(user_id,balance)
+                    SELECT u, 0 FROM unnest(CAST(:ids AS BIGINT[])) AS t(u) ORDER BY u
+                    ON CONFLICT DO NOTHING
+                """),
+                {"ids": ids},
+            )
+            await s.execute(
+                text("SELECT 1 FROM points_balances WHERE user_id = ANY(CAST(:ids AS BIGINT[])) ORDER BY user_id FOR UPDATE"),
+                {"ids": ids},
+            )
+        r = await s.execute(text(_RECONCILE_DRIFT), {"ids": ids})
+        drift = [
+            {"user_id": int(x[0]), "stored": (int(x[1]) if x[1] is not None else None), "actual": int(x[2])}
+            for x in r.fetchall()
+            if (x[1] or 0) != x[2]
+        ]
+        if fix and drift:
+            await s.execute(
+                text("""
+                    UPDATE points_balances b SET balance=t.a, updated_at=now()
+                    FROM unnest(CAST(:ids AS BIGINT[]), CAST(:bal AS BIGINT[])) AS t(u, a)
+                    WHERE b.user_id = t.u
+                """),
+                {"ids": [d["user_id"] for d in drift], "bal": [d["actual"] for d in drift]},
+            )
+        await s.commit()
+        if fix and drift:
+            await _rank_after_commit([(d["user_id"], d["actual"] - (d["stored"] or 0)) for d in drift])
+        return drift
+    return []
+
+
+async def reconcile_balances(chunk: int = 500, fix: bool = False) -> Dict[str, Any]:
+    # Re-derive points_balances from points_ledger, chunk users per transaction, and report drift.
+    # fix=True rewrites drifted rows (safe while the bot is writing; see _reconcile_chunk).
+    after = -(2**63)
+    users = 0
+    drift: List[Dict[str, Any]] = []
+    while True:
+        async for s in get_db_session():
+            r = await s.execute(text(_RECONCILE_IDS), {"after": after, "lim": int(chunk)})
+            ids = [int(x[0]) for x in r.fetchall()]
+        if not ids:
+            break
+        found = await _reconcile_chunk(ids, fix)
+        users += len(ids)
+        for d in found:
+            log_json(logging.WARNING, "balance_drift", fixed=fix, **d)
+        BALANCE_RECONCILE.labels(result="ok").inc(len(ids) - len(found))
+        BALANCE_RECONCILE.labels(result=("fixed" if fix else "drift")).inc(len(found))
+        drift += found
+        after = ids[-1]
+    return {"users": users, "drifted": len(drift), "fixed": (len(drift) if fix else 0), "drift": drift[:50]}
+
+
+async def list_user_requests(user_id: int, limit: int = 5, after: Optional[str] = None) -> List[Dict[str, Any]]:
+    # newest first, paged by cursor like list_pending_requests
+    cond, params = _keyset(after, "<")
+    async for s in get_read_session():
         r = await s.execute(
-            text("""
+            text(f"""
                 SELECT id,kind,amount,currency,status,tx_ref,created_at,decided_at
                 FROM payment_requests
-                WHERE user_id=:u
-                ORDER BY created_at DESC
+                WHERE user_id=:u {cond}
+                ORDER BY created_at DESC, id DESC
                 LIMIT :lim
             """),
-            {"u": int(user_id), "lim": int(limit)},
+            {"u": int(user_id), "lim": int(limit), **params},
         )
         out = []
         for row in r.fetchall():
-            out.append({"id": int(row[0]), "kind": row[1], "amount": int(row[2]), "currency": row[3], "status": row[4], "tx_ref": row[5], "created_at": str(row[6]), "decided_at": (str(row[7]) if row[7] else None)})
+            out.append({"id": int(row[0]), "kind": row[1], "amount": int(row[2]), "currency": row[3], "status": row[4], "tx_ref": row[5], "created_at": str(row[6]), "decided_at": (str(row[7]) if row[7] else None), "cursor": encode_cursor(row[6], row[0])})
         return out
 
 
+async def get_my_dashboard(user_id: int, limit: int = 5) -> Dict[str, Any]:
+    # /my in one round trip: balance, referral stats and the newest `limit` requests.
+    # The header row is LEFT JOINed to the request rows, so a user without requests still gets one row.
+    async for s in get_read_session():
+        r = await s.execute(
+            text("""
+                WITH hdr AS (
+                    SELECT
+                        (SELECT balance FROM points_balances WHERE user_id=:u) AS balance,
+                        (SELECT direct_count FROM referral_stats WHERE user_id=:u) AS invited,
+                        (SELECT ancestor_id FROM referral_paths WHERE descendant_id=:u AND depth=1) AS referrer_id
+                ),
+                reqs AS (
+                    SELECT id,kind,amount,currency,status,tx_ref,created_at,decided_at
+                    FROM payment_requests
+                    WHERE user_id=:u
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT :lim
+                )
+                SELECT hdr.balance, hdr.invited, hdr.referrer_id,
+                       reqs.id, reqs.kind, reqs.amount, reqs.currency, reqs.status, reqs.tx_ref, reqs.created_at, reqs.decided_at
+                FROM hdr LEFT JOIN reqs ON true
+                ORDER BY reqs.created_at DESC, reqs.id DESC
+            """),
+            {"u": int(user_id), "lim": int(limit)},
+        )
+        rows = r.fetchall()
+        head = rows[0]
+        return {
+            "balance": int(head[0] or 0),
+            "invited": int(head[1] or 0),
+            "referrer_id": (int(head[2]) if head[2] is not None else None),
+            "requests": [
+                {"id": int(row[3]), "kind": row[4], "amount": int(row[5]), "currency": row[6], "status": row[7], "tx_ref": row[8], "created_at": str(row[9]), "decided_at": (str(row[10]) if row[10] else None), "cursor": encode_cursor(row[9], row[3])}
+                for row in rows
+                if row[3] is not None
+            ],
+        }
+
+
 async def upsert_referral(referrer_id: int, referred_id: int) -> bool:
+    # True when referred_id is now linked under referrer_id in the referral tree. The referrals
+    # trigger keeps the first referrer only and drops edges that would close a cycle.
     if int(referrer_id) == int(referred_id):
         return False
     async for s in get_db_session():
@@ -138,19 +668,83 @@ async def upsert_referral(referrer_id: int, referred_id: int) -> bool:
             text("INSERT INTO referrals(referrer_id,referred_id) VALUES (:r,:u) ON CONFLICT DO NOTHING"),
             {"r": int(referrer_id), "u": int(referred_id)},
         )
+        r = await s.execute(
+            text("SELECT 1 FROM referral_paths WHERE ancestor_id=:r AND descendant_id=:u AND depth=1"),
+            {"r": int(referrer_id), "u": int(referred_id)},
+        )
+        linked = r.first() is not None
         await s.commit()
-    return True
+        return linked
+    return False
 
 
 async def get_referrer(referred_id: int) -> Optional[int]:
     async for s in get_db_session():
-        r = await s.execute(text("SELECT referrer_id FROM referrals WHERE referred_id=:u LIMIT 1"), {"u": int(referred_id)})
+        r = await s.execute(text("SELECT ancestor_id FROM referral_paths WHERE descendant_id=:u AND depth=1"), {"u": int(referred_id)})
         row = r.first()
         return int(row[0]) if row else None
 
 
+async def get_referral_stats(user_id: int) -> Dict[str, int]:
+    # cached by the referrals trigger: direct invites and everyone below (REFERRAL_MAX_DEPTH levels)
+    async for s in get_read_session():
+        r = await s.execute(text("SELECT direct_count,total_count FROM referral_stats WHERE user_id=:u"), {"u": int(user_id)})
+        row = r.first()
+        return {"direct": int(row[0]) if row else 0, "total": int(row[1]) if row else 0}
+    return {"direct": 0, "total": 0}
+
+
+async def top_referrers(limit: int = 10) -> List[Dict[str, int]]:
+    async for s in get_read_session():
+        r = await s.execute(
+            text("SELECT user_id,direct_count,total_count FROM referral_stats ORDER BY total_count DESC, user_id LIMIT :lim"),
+            {"lim": int(limit)},
+        )
+        return [{"user_id": int(x[0]), "direct": int(x[1]), "total": int(x[2])} for x in r.fetchall()]
+    return []
+
+
+async def rebuild_referral_graph() -> Dict[str, int]:
+    # Repair job: re-derive referral_paths/referral_stats from referrals (which only keeps tree
+    # edges; see the trigger) up to REFERRAL_MAX_DEPTH levels. Blocks referral reads/inserts meanwhile.
+    async for s in get_db_session():
+        await s.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": REFERRAL_LOCK})
+        await s.execute(text("TRUNCATE referral_paths, referral_stats"))
+        r = await s.execute(
+            text("""
+                WITH RECURSIVE parent AS (
+                    SELECT DISTINCT ON (referred_id) referrer_id, referred_id
+                    FROM referrals WHERE referrer_id <> referred_id
+                    ORDER BY referred_id, created_at, referrer_id
+                ),
+                walk(ancestor_id, descendant_id, depth, path) AS (
+                    SELECT referrer_id, referred_id, 1, ARRAY[referred_id, referrer_id] FROM parent
+                    UNION ALL
+                    SELECT p.referrer_id, w.descendant_id, w.depth + 1, w.path || p.referrer_id
+                    FROM walk w JOIN parent p ON p.referred_id = w.ancestor_id
+                    WHERE w.depth < :maxd AND NOT p.referrer_id = ANY(w.path)
+                )
+                INSERT INTO referral_paths(ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, descendant_id, depth FROM walk
+                ON CONFLICT DO NOTHING
+            """),
+            {"maxd": REFERRAL_MAX_DEPTH},
+        )
+        paths = r.rowcount
+        r = await s.execute(
+            text("""
+                INSERT INTO referral_stats(user_id, direct_count, total_count)
+                SELECT ancestor_id, count(*) FILTER (WHERE depth = 1), count(*) FROM referral_paths GROUP BY ancestor_id
+            """)
+        )
+        users = r.rowcount
+        await s.commit()
+        return {"paths": int(paths), "users": int(users)}
+    return {"paths": 0, "users": 0}
+
+
 async def add_account(user_id: int, acc_type: str, label: str, details: dict) -> int:
-    acc_id = _now_ms()
+    acc_id = next_id()
     import json
     async for s in get_db_session():
         await s.execute(
@@ -169,21 +763,22 @@ async def add_account(user_id: int, acc_type: str, label: str, details: dict) ->
         await s.commit()
     return int(acc_id)
 
-async def list_accounts(user_id: int, limit: int = 10):
-    async for s in get_db_session():
+async def list_accounts(user_id: int, limit: int = 10, after: Optional[str] = None):
+    cond, params = _keyset(after, "<")
+    async for s in get_read_session():
         r = await s.execute(
-            text("""
+            text(f"""
                 SELECT id,type,label,details_json,created_at
                 FROM accounts
-                WHERE user_id=:u
-                ORDER BY created_at DESC
+                WHERE user_id=:u {cond}
+                ORDER BY created_at DESC, id DESC
                 LIMIT :lim
             """),
-            {"u": int(user_id), "lim": int(limit)},
+            {"u": int(user_id), "lim": int(limit), **params},
         )
         out = []
         for row in r.fetchall():
-            out.append({"id": int(row[0]), "type": row[1], "label": row[2], "details_json": row[3], "created_at": str(row[4])})
+            out.append({"id": int(row[0]), "type": row[1], "label": row[2], "details_json": row[3], "created_at": str(row[4]), "cursor": encode_cursor(row[4], row[0])})
         return out
 
 async def set_plan_price(code: str, amount: int, currency: str = "SELHA") -> None:
@@ -198,12 +793,20 @@ async def set_plan_price(code: str, amount: int, currency: str = "SELHA") -> Non
             {"c": code, "n": code, "amt": int(amount), "cur": currency},
         )
         await s.commit()
+    # every replica drops its cached plans once the new price is visible
+    await after_commit(PLANS_CACHE.invalidate)
 
-async def list_plans():
+async def _load_plans() -> List[Dict[str, Any]]:
     async for s in get_db_session():
         r = await s.execute(text("SELECT code,name,price_amount,price_currency,is_active FROM plans ORDER BY code"))
         out = []
         for row in r.fetchall():
             out.append({"code": row[0], "name": row[1], "price_amount": int(row[2]), "price_currency": row[3], "is_active": bool(row[4])})
         return out
+    return []
 
+PLANS_CACHE: VersionedCache[List[Dict[str, Any]]] = VersionedCache("plans", _load_plans, ttl_s=ttl_from_env("plans"))
+
+async def list_plans():
+    # served from PLANS_CACHE: no DB round trip unless /set_price ran or the TTL expired
+    return [dict(p) for p in await PLANS_CACHE.get()]
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from bot import infrastructure
+from bot.infrastructure import check_postgres, check_redis
+from bot.metrics import PROBE_LATENCY, PROBE_UP
+from bot.readiness import READINESS
+
+logger = logging.getLogger("guardian_prober")
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    ok: bool
+    latency_ms: float
+    at: float
+    error: Optional[str] = None
+
+
+class Prober:
+    """Periodic health probe with a rolling latency window and single-flight on-demand probes."""
+
+    def __init__(
+        self, name: str, fn: Callable[[], Awaitable[None]], timeout_s: float = 2.0, window: int = 120, critical: bool = True
+    ):
+        self.name = name
+        self._fn = fn
+        # critical probes gate readiness; the others (read replicas) only report and steer routing
+        self.critical = critical
+        self.timeout_s = timeout_s
+        self.latest: Optional[ProbeResult] = None
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._inflight: Optional[asyncio.Future] = None
+
+    async def _run_once(self) -> ProbeResult:
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._fn(), timeout=self.timeout_s)
+            ok, err = True, None
+        except Exception as e:
+            ok, err = False, f"{type(e).__name__}: {e}"
+        dt = time.perf_counter() - t0
+        res = ProbeResult(ok=ok, latency_ms=dt * 1000, at=time.time(), error=err)
+        self.latest = res
+        self._samples.append(res.latency_ms)
+        PROBE_LATENCY.labels(component=self.name).observe(dt)
+        PROBE_UP.labels(component=self.name).set(1 if ok else 0)
+        return res
+
+    async def probe(self) -> ProbeResult:
+        # coalesce: concurrent callers share the probe already on the wire
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._run_once())
+        return await asyncio.shield(self._inflight)
+
+    async def get(self, max_age_s: float = 5.0) -> ProbeResult:
+        r = self.latest
+        if r is not None and time.time() - r.at <= max_age_s:
+            return r
+        return await self.probe()
+
+    @property
+    def healthy(self) -> bool:
+        return self.latest is None or self.latest.ok
+
+    def stats(self) -> Dict:
+        r = self.latest
+        s: List[float] = sorted(self._samples)
+
+        def pct(p: float) -> Optional[float]:
+            return round(s[min(len(s) - 1, int(p * len(s)))], 2) if s else None
+
+        return {
+            "ok": (r.ok if r else None),
+            "latency_ms": (round(r.latency_ms, 2) if r else None),
+            "age_s": (round(time.time() - r.at, 1) if r else None),
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "samples": len(s),
+            "error": (r.error if r else None),
+        }
+
+
+PROBERS: Dict[str, Prober] = {
+    "postgres": Prober("postgres", check_postgres),
+    "redis": Prober("redis", check_redis),
+}
+_task: Optional[asyncio.Task] = None
+
+
+def readiness_report() -> Dict:
+    # the one readiness verdict (HTTP /readyz and the /readyz command): startup state plus the
+    # critical probers' cached results, no DB/Redis round trip. A bad replica only leaves read
+    # rotation (Replica.healthy); the primary keeps serving and stays ready.
+    return {
+        "ok": READINESS.ready and all(p.healthy for p in PROBERS.values() if p.critical),
+        "components": READINESS.snapshot(),
+        "probes": {name: p.stats() for name, p in PROBERS.items()},
+    }
+
+
+async def _loop(interval_s: float) -> None:
+    while True:
+        await asyncio.gather(*(p.probe() for p in PROBERS.values()), return_exceptions=True)
+        await asyncio.sleep(interval_s)
+
+
+def start() -> None:
+    global _task
+    # read replicas: a failed probe (down or lagging) takes the replica out of read rotation
+    for rep in infrastructure.replicas:
+        PROBERS.setdefault(rep.name, Prober(rep.name, rep.check, critical=False))
+    if _task is None or _task.done():
+        interval_s = float(os.getenv("HEALTH_PROBE_INTERVAL_S", "5"))
+        _task = asyncio.create_task(_loop(interval_s), name="health-prober")
+        logger.info("health prober started (interval=%.1fs)", interval_s)
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,27 @@
+import re
+from typing import List, Sequence, Tuple
+
+# /approve and /reject arguments: ids and inclusive ranges, separated by spaces and/or commas,
+# e.g. "/approve 12,15 20-40". A range selects the pending requests whose id falls inside it.
+_RANGE = re.compile(r"^(\d+)(?:-|\.\.)(\d+)$")
+
+
+def parse_id_list(args: Sequence[str]) -> Tuple[List[int], List[Tuple[int, int]]]:
+    # -> (ids, ranges); raises ValueError naming the first bad token
+    ids: List[int] = []
+    ranges: List[Tuple[int, int]] = []
+    for token in ",".join(args).replace(" ", ",").split(","):
+        token = token.strip()
+        if not token:
+            continue
+        m = _RANGE.match(token)
+        if m:
+            lo, hi = int(m.group(1)), int(m.group(2))
+            if lo > hi:
+                raise ValueError(f"bad range {token}")
+            ranges.append((lo, hi))
+        elif token.isdigit():
+            ids.append(int(token))
+        else:
+            raise ValueError(f"bad id {token}")
+    return list(dict.fromkeys(ids)), ranges
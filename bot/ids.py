@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import random
+import time
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+from bot import infrastructure
+from bot.leader import RedisLock, worker_id
+from bot.readiness import FAILED, OK, PENDING, READINESS
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_ids")
+
+# Snowflake layout (63 bits, fits BIGINT): 41 bits ms since EPOCH_MS | 10 bits worker | 12 bits sequence.
+# Legacy ids were plain ms timestamps (~1.7e12); every new id is larger, so ORDER BY id stays time-ordered.
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQ_BITS = 12
+SEQ_MASK = (1 << SEQ_BITS) - 1
+MAX_WORKER = (1 << WORKER_BITS) - 1
+# worker ids 0..511 are leased through Redis; 512..1023 are derived from host:pid, only when there
+# is no Redis at all (single process: dev, tools). With Redis, nothing is minted without a lease.
+LEASED_WORKERS = 512
+
+
+class WorkerLeaseError(RuntimeError):
+    """No worker id is held: minting now could duplicate another process's ids."""
+
+
+def _clock_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def fallback_worker() -> int:
+    return LEASED_WORKERS + zlib.crc32(worker_id().encode()) % (MAX_WORKER + 1 - LEASED_WORKERS)
+
+
+def parse(id_: int) -> Tuple[int, int, int]:
+    # -> (unix ms, worker, sequence)
+    return (
+        (id_ >> (WORKER_BITS + SEQ_BITS)) + EPOCH_MS,
+        (id_ >> SEQ_BITS) & MAX_WORKER,
+        id_ & SEQ_MASK,
+    )
+
+
+class SnowflakeGenerator:
+    """Time-ordered 63-bit ids. No lock: next_id() never awaits, so on the event loop each call runs to completion."""
+
+    def __init__(self, worker: int, clock: Callable[[], int] = _clock_ms):
+        self._clock = clock
+        self._ms = 0
+        self._seq = 0
+        self.worker = worker
+
+    @property
+    def worker(self) -> Optional[int]:
+        return None if self._worker_bits is None else self._worker_bits >> SEQ_BITS
+
+    @worker.setter
+    def worker(self, value: Optional[int]) -> None:
+        # None: no usable worker id (waiting for a lease, or it lapsed); next_id() raises
+        if value is None:
+            self._worker_bits = None
+            return
+        if not 0 <= int(value) <= MAX_WORKER:
+            raise ValueError(f"worker id out of range 0..{MAX_WORKER}: {value}")
+        self._worker_bits = int(value) << SEQ_BITS
+
+    def next_id(self) -> int:
+        if self._worker_bits is None:
+            raise WorkerLeaseError("no id worker lease held")
+        ms = self._clock()
+        if ms > self._ms:
+            self._ms = ms
+            self._seq = 0
+        else:
+            # same ms, or the clock stepped back: never reuse or go below the last id
+            self._seq += 1
+            if self._seq > SEQ_MASK:
+                # sequence exhausted: borrow the next ms instead of spinning; the clock catches up
+                self._ms += 1
+                self._seq = 0
+        return ((self._ms - EPOCH_MS) << (WORKER_BITS + SEQ_BITS)) | self._worker_bits | self._seq
+
+    def next_ids(self, n: int) -> List[int]:
+        # bulk reservation: consecutive sequence numbers are consecutive ids
+        out: List[int] = []
+        while len(out) < n:
+            first = self.next_id()
+            take = min(n - len(out) - 1, SEQ_MASK - self._seq)
+            out.append(first)
+            if take > 0:
+                out.extend(range(first + 1, first + 1 + take))
+                self._seq += take
+        return out
+
+
+def _initial_worker() -> int:
+    pinned = os.getenv("ID_WORKER_ID")
+    return int(pinned) if pinned else fallback_worker()
+
+
+GENERATOR = SnowflakeGenerator(_initial_worker())
+
+
+def next_id() -> int:
+    return GENERATOR.next_id()
+
+
+def next_ids(n: int) -> List[int]:
+    return GENERATOR.next_ids(n)
+
+
+# --- Worker id lease (Redis) ---
+# The lease is trusted until `ttl - 2 * renew` after the start of the last successful renew, so a
+# process that cannot reach Redis stops minting before its key can expire and be leased again.
+# A fresh lease is used only after one renew interval: a previous holder whose key vanished
+# (Redis flush or restart) finds out at its next renew and stops first. READINESS "ids" holds the
+# webhook (503, Telegram retries) while no lease is held.
+_lock: Optional[RedisLock] = None
+_task: Optional[asyncio.Task] = None
+
+
+async def _acquire(ttl_s: float) -> Optional[Tuple[int, RedisLock]]:
+    start = random.randrange(LEASED_WORKERS)
+    for i in range(LEASED_WORKERS):
+        n = (start + i) % LEASED_WORKERS
+        lock = RedisLock(f"idworker:{n}", ttl_s=ttl_s)
+        if await lock.acquire():
+            return n, lock
+    log_json(logging.WARNING, "id_worker_lease_exhausted", holder=worker_id())
+    return None
+
+
+def _drop_lease(reason: str) -> None:
+    global _lock
+    log_json(logging.WARNING, "id_worker_lease_lost", worker=GENERATOR.worker, reason=reason)
+    GENERATOR.worker = None
+    READINESS.set("ids", FAILED, f"worker id lease {reason}")
+    _lock = None
+
+
+async def _lease_loop(ttl_s: float, renew_s: float) -> None:
+    global _lock
+    deadline = 0.0
+    while True:
+        t0 = time.monotonic()
+        try:
+            if _lock is not None:
+                if await asyncio.wait_for(_lock.renew(), timeout=renew_s):
+                    deadline = t0 + ttl_s - 2 * renew_s
+                else:
+                    _drop_lease("taken over")
+            if _lock is None:
+                got = await _acquire(ttl_s)
+                if got is not None:
+                    n, _lock = got
+                    deadline = t0 + ttl_s - 2 * renew_s
+                    await asyncio.sleep(renew_s)
+                    GENERATOR.worker = n
+                    READINESS.set("ids", OK)
+                    log_json(logging.INFO, "id_worker_leased", worker=n, holder=worker_id())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_json(logging.WARNING, "id_worker_lease_error", worker=GENERATOR.worker, error=f"{type(e).__name__}: {e}")
+        if _lock is not None and time.monotonic() >= deadline:
+            _drop_lease("expired unrenewed")
+        await asyncio.sleep(renew_s)
+
+
+def start() -> None:
+    # ID_WORKER_ID pins the worker id; without Redis the host:pid fallback stays in use
+    global _task
+    if os.getenv("ID_WORKER_ID") or infrastructure.redis_client is None:
+        logger.info("id worker %d (no lease)", GENERATOR.worker)
+        READINESS.set("ids", OK)
+        return
+    ttl_s = float(os.getenv("ID_WORKER_LEASE_TTL_S", "600"))
+    renew_s = min(float(os.getenv("ID_WORKER_RENEW_S", "5")), ttl_s / 4)
+    GENERATOR.worker = None
+    READINESS.set("ids", PENDING)
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_lease_loop(ttl_s, renew_s), name="id-worker-lease")
+
+
+async def stop() -> None:
+    global _task, _lock
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    if _lock is not None:
+        await _lock.release()
+        _lock = None
@@ -1,19 +1,26 @@
 ﻿import os
 import logging
 import asyncio
-from typing import Optional
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy import text
-import redis.asyncio as redis
 from alembic import command
 from alembic.config import Config
 
+from bot.metrics import DB_READS, DB_SESSIONS
+from bot.pools import engine_kwargs, instrument_engine, redis_from_url
+
 logger = logging.getLogger("guardian_infra")
 
 engine = None
 SessionLocal: Optional[async_sessionmaker] = None
 redis_client = None
+replicas: List["Replica"] = []
 
 
 def _to_asyncpg_url(url: str) -> str:
@@ -48,27 +55,41 @@ async def init_infrastructure(wait: bool = True):
     if not redis_url:
         raise RuntimeError("REDIS_URL missing")
 
-    engine = create_async_engine(_to_asyncpg_url(db_url), echo=False)
+    engine = instrument_engine(create_async_engine(_to_asyncpg_url(db_url), echo=False, **engine_kwargs("postgres")), "postgres")
     SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
-    redis_client = redis.from_url(redis_url)
+    # optional read replicas (comma-separated); read-only store calls go through get_read_session()
+    replicas[:] = [
+        Replica(f"replica{i}", url.strip())
+        for i, url in enumerate(os.getenv("DATABASE_REPLICA_URLS", "").split(","))
+        if url.strip()
+    ]
+    redis_client = redis_from_url(redis_url)
 
     if wait:
-        await _retry(
-            "Postgres",
-            check_postgres,
-            attempts=int(os.getenv("DB_WAIT_ATTEMPTS", "40")),
-            delay_s=float(os.getenv("DB_WAIT_DELAY_S", "1")),
-        )
-        await _retry(
-            "Redis",
-            check_redis,
-            attempts=int(os.getenv("REDIS_WAIT_ATTEMPTS", "40")),
-            delay_s=float(os.getenv("REDIS_WAIT_DELAY_S", "1")),
-        )
+        # independent services: probe both at once instead of back to back
+        await asyncio.gather(wait_postgres(), wait_redis())
 
     logger.info("Infrastructure initialized (wait=%s)", wait)
 
 
+async def wait_postgres():
+    await _retry(
+        "Postgres",
+        check_postgres,
+        attempts=int(os.getenv("DB_WAIT_ATTEMPTS", "40")),
+        delay_s=float(os.getenv("DB_WAIT_DELAY_S", "1")),
+    )
+
+
+async def wait_redis():
+    await _retry(
+        "Redis",
+        check_redis,
+        attempts=int(os.getenv("REDIS_WAIT_ATTEMPTS", "40")),
+        delay_s=float(os.getenv("REDIS_WAIT_DELAY_S", "1")),
+    )
+
+
 async def check_postgres():
     if engine is None:
         raise RuntimeError("Postgres not initialized")
@@ -99,25 +120,369 @@ async def runtime_report(full: bool = False) -> str:
         lines.append("")
         for k in ("TELEGRAM_TOKEN", "DATABASE_URL", "REDIS_URL", "ADMIN_CHAT_ID", "WEBHOOK_URL"):
             lines.append(f"{k}: {'SET' if os.getenv(k) else 'MISSING'}")
+        lines.append("")
+        for name, eng in [("postgres", engine)] + [(r.name, r.engine) for r in replicas]:
+            if eng is not None:
+                lines.append(f"pool {name}: {eng.pool.status()}")
+        if redis_client is not None:
+            p = redis_client.connection_pool
+            lines.append(f"pool redis: in use {len(p._in_use_connections)} / max {p.max_connections}")
 
     return "\n".join(lines)
 
 
+# --- Read replicas ---
+# A replica takes reads while its prober (bot/health_prober.py) sees it up and within
+# DB_REPLICA_MAX_LAG_S; otherwise, and for DB_READ_YOUR_WRITES_S after the acting user's own
+# write, reads go to the primary. A replica that fails to hand out a connection is dropped from
+# rotation on the spot (until its next good probe) and that read goes to the primary.
+REPLICA_MAX_LAG_S = float(os.getenv("DB_REPLICA_MAX_LAG_S", "5"))
+READ_YOUR_WRITES_S = float(os.getenv("DB_READ_YOUR_WRITES_S", "5"))
+REPLICA_CONNECT_TIMEOUT_S = float(os.getenv("DB_REPLICA_CONNECT_TIMEOUT_S", "2"))
+# 0 on a caught-up (or idle) standby; NULLs on a primary count as no lag
+_REPLICA_LAG = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        kw = engine_kwargs(name)
+        # fail over to the primary quickly instead of waiting out asyncpg's 60s connect timeout
+        kw["connect_args"]["timeout"] = REPLICA_CONNECT_TIMEOUT_S
+        self.engine = instrument_engine(create_async_engine(_to_asyncpg_url(url), echo=False, **kw), name)
+        self.SessionLocal = async_sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        self.healthy = True
+        self.lag_s: Optional[float] = None
+
+    async def check(self) -> None:
+        # health probe: raises (and takes the replica out of rotation) when down or lagging
+        try:
+            async with self.engine.connect() as conn:
+                self.lag_s = float((await conn.execute(text(_REPLICA_LAG))).scalar() or 0)
+        except BaseException:
+            self.healthy = False
+            raise
+        self.healthy = self.lag_s <= REPLICA_MAX_LAG_S
+        if not self.healthy:
+            raise RuntimeError(f"replica lag {self.lag_s:.1f}s > {REPLICA_MAX_LAG_S}s")
+
+
+class _Actor:
+    # the Telegram user an update runs for; `sticky` memoizes the shared (Redis) verdict so an
+    # update asks Redis at most once, however many reads it makes
+    __slots__ = ("user_id", "sticky")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.sticky: Optional[bool] = None
+
+
+_rr = itertools.count()
+_actor: ContextVar[Optional[_Actor]] = ContextVar("db_actor", default=None)
+# this worker's own writes: user_id -> monotonic deadline, pruned once per READ_YOUR_WRITES_S
+_sticky_until: Dict[int, float] = {}
+_next_prune = 0.0
+
+
+@contextmanager
+def acting_as(user_id: Optional[int]):
+    # the key of read-your-writes stickiness for everything the update does
+    token = _actor.set(_Actor(int(user_id)) if user_id is not None else None)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def _sticky_key(user_id: int) -> str:
+    return f"guardian:ryw:{user_id}"
+
+
+async def note_write() -> None:
+    # called once a write is committed: keep this user's reads on the primary for a while,
+    # on every worker (Redis) -- another worker may serve their next update
+    global _next_prune
+    actor = _actor.get()
+    if actor is None or not replicas:
+        return
+    actor.sticky = True
+    now = time.monotonic()
+    if now >= _next_prune:
+        for u in [u for u, until in _sticky_until.items() if until <= now]:
+            del _sticky_until[u]
+        _next_prune = now + READ_YOUR_WRITES_S
+    _sticky_until[actor.user_id] = now + READ_YOUR_WRITES_S
+    if redis_client is not None:
+        try:
+            await redis_client.set(_sticky_key(actor.user_id), 1, px=int(READ_YOUR_WRITES_S * 1000))
+        except Exception as e:
+            logger.warning("read-your-writes mark failed: %s: %s", type(e).__name__, e)
+
+
+async def _is_sticky() -> bool:
+    # this worker's map first; Redis (a write on another worker) once per update
+    actor = _actor.get()
+    if actor is None:
+        return False
+    if _sticky_until.get(actor.user_id, 0.0) > time.monotonic():
+        return True
+    if actor.sticky is None:
+        if redis_client is None:
+            actor.sticky = False
+        else:
+            try:
+                actor.sticky = bool(await redis_client.exists(_sticky_key(actor.user_id)))
+            except Exception:
+                actor.sticky = True  # cannot tell: the primary is always correct
+    return actor.sticky
+
+
+def _pick_replica() -> Optional[Replica]:
+    healthy = [r for r in replicas if r.healthy]
+    return healthy[next(_rr) % len(healthy)] if healthy else None
+
+
+class _UowSession:
+    # Store functions commit after every statement; inside a unit of work that commit is
+    # deferred to the end of the update so all calls share one connection and transaction.
+    def __init__(self, session: AsyncSession, uow: "UnitOfWork"):
+        self._session = session
+        self._uow = uow
+
+    async def commit(self):
+        # only write paths commit: remembered for read-your-writes once the unit commits
+        self._uow.wrote = True
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class UnitOfWork:
+    def __init__(self):
+        self.session: Optional[AsyncSession] = None
+        self.after_commit: List[Callable[[], Awaitable[None]]] = []
+        self.wrote = False
+
+    def bind(self) -> _UowSession:
+        # lazy: handlers that never touch the DB never check out a connection
+        if self.session is None:
+            if SessionLocal is None:
+                raise RuntimeError("DB session factory not initialized")
+            self.session = SessionLocal()
+            DB_SESSIONS.labels(mode="uow").inc()
+        return _UowSession(self.session, self)
+
+
+_uow: ContextVar[Optional[UnitOfWork]] = ContextVar("db_unit_of_work", default=None)
+
+
+@asynccontextmanager
+async def unit_of_work():
+    if _uow.get() is not None:
+        # nested (e.g. a handler calling another handler): join the outer unit
+        yield _uow.get()
+        return
+    uow = UnitOfWork()
+    token = _uow.set(uow)
+    try:
+        yield uow
+        if uow.session is not None:
+            await uow.session.commit()
+    except BaseException:
+        if uow.session is not None:
+            await uow.session.rollback()
+        raise
+    finally:
+        _uow.reset(token)
+        if uow.session is not None:
+            await uow.session.close()
+    await _committed(uow)
+
+
+async def _committed(uow: UnitOfWork) -> None:
+    wrote, callbacks = uow.wrote, uow.after_commit
+    uow.wrote, uow.after_commit = False, []
+    if wrote:
+        await note_write()
+    for cb in callbacks:
+        await _run_after_commit(cb)
+
+
+async def commit_unit_of_work() -> None:
+    # Commit the current unit of work so far; called before every outbound Bot API call
+    # (app_factory), so a reply never reports a change that could still roll back and no row
+    # lock or pooled connection is held across the round trip. The unit stays open: later store
+    # calls start a new transaction on the same session.
+    uow = _uow.get()
+    if uow is None or uow.session is None or not uow.session.in_transaction():
+        return
+    await uow.session.commit()
+    await _committed(uow)
+
+
+@asynccontextmanager
+async def savepoint():
+    # For best-effort store calls whose errors the caller swallows: inside a unit of work a
+    # failure rolls back to this SAVEPOINT instead of aborting the whole update's transaction.
+    uow = _uow.get()
+    if uow is None:
+        yield
+        return
+    uow.bind()
+    async with uow.session.begin_nested():
+        yield
+
+
+async def _run_after_commit(cb: Callable[[], Awaitable[None]]) -> None:
+    try:
+        await cb()
+    except Exception as e:
+        logger.warning("after-commit hook failed: %s: %s", type(e).__name__, e)
+
+
+async def after_commit(cb: Callable[[], Awaitable[None]]) -> None:
+    # run cb once the caller's writes are visible: at the end of the current unit of work, or now
+    uow = _uow.get()
+    if uow is not None:
+        uow.after_commit.append(cb)
+    else:
+        await _run_after_commit(cb)
+
+
 async def get_db_session():
+    uow = _uow.get()
+    if uow is not None:
+        yield uow.bind()
+        return
     if SessionLocal is None:
         raise RuntimeError("DB session factory not initialized")
+    DB_SESSIONS.labels(mode="standalone").inc()
     async with SessionLocal() as session:
+        yield _StandaloneSession(session)
+
+
+class _StandaloneSession:
+    # a plain session whose commit also records the write for read-your-writes
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def commit(self):
+        await self._session.commit()
+        await note_write()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+async def get_read_session():
+    # For read-only store calls: a replica session when one is healthy, else the primary
+    # (get_db_session). A unit of work already on the primary keeps its session, so reads
+    # after a write in the same update see it.
+    uow = _uow.get()
+    if uow is not None and uow.session is not None:
+        DB_READS.labels(target="primary", reason="uow").inc()
+        yield uow.bind()
+        return
+    rep = _pick_replica() if replicas else None
+    reason = "no_replica" if not replicas else "unhealthy" if rep is None else "sticky" if await _is_sticky() else None
+    if reason is not None:
+        DB_READS.labels(target="primary", reason=reason).inc()
+        async for s in get_db_session():
+            yield s
+        return
+    session = await _replica_session(rep)
+    if session is None:
+        DB_READS.labels(target="primary", reason="replica_error").inc()
+        async for s in get_db_session():
+            yield s
+        return
+    DB_READS.labels(target=rep.name, reason="rotation").inc()
+    async with session:
         yield session
 
 
-async def run_migrations_safe():
+async def _replica_session(rep: Replica) -> Optional[AsyncSession]:
+    # check the connection out up front: a replica that went down since its last probe costs
+    # this read one failed connect, not an error, and leaves rotation until the prober sees it up
+    session = rep.SessionLocal()
+    try:
+        await session.connection()
+        return session
+    except Exception as e:
+        rep.healthy = False
+        logger.warning("%s: read failed over to the primary: %s: %s", rep.name, type(e).__name__, e)
+        await session.close()
+        return None
+
+
+# pg_advisory_lock key shared by every replica running migrations
+MIGRATION_LOCK_KEY = 7_246_010_225
+
+
+def _to_sync_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("postgresql+asyncpg://"):
+        url = url.replace("postgresql+asyncpg://", "postgresql://", 1)
+    return url
+
+
+def _db_revisions(conn) -> set:
+    from sqlalchemy import inspect
+
+    if not inspect(conn).has_table("alembic_version"):
+        return set()
+    return {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+
+
+def _run_migrations_sync(db_url: str) -> str:
+    from alembic.script import ScriptDirectory
+    from sqlalchemy import create_engine, pool
+
+    cfg = Config("alembic.ini")
+    heads = set(ScriptDirectory.from_config(cfg).get_heads())
+    sync_engine = create_engine(_to_sync_url(db_url), poolclass=pool.NullPool)
+    try:
+        with sync_engine.connect() as conn:
+            # fast path: already at head -> never load migrations/env.py
+            if _db_revisions(conn) == heads:
+                conn.rollback()
+                return "up_to_date"
+
+            # replicas booting together queue up here; the first one migrates
+            conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": MIGRATION_LOCK_KEY})
+            conn.commit()
+            try:
+                if _db_revisions(conn) == heads:
+                    conn.rollback()
+                    return "up_to_date"
+                conn.rollback()
+                cfg.attributes["connection"] = conn
+                command.upgrade(cfg, "head")
+                conn.commit()
+                return "applied"
+            finally:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": MIGRATION_LOCK_KEY})
+                conn.commit()
+    finally:
+        sync_engine.dispose()
+
+
+async def run_migrations_safe() -> str:
+    # -> "applied" | "up_to_date"; raises when the schema could not be brought to head, so the
+    # caller can keep readiness (and everything that needs the schema) off
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
-        logger.warning("DATABASE_URL missing, skipping migrations")
-        return
+        raise RuntimeError("DATABASE_URL missing")
     try:
-        cfg = Config("alembic.ini")
-        command.upgrade(cfg, "head")
-        logger.info("Alembic migrations applied")
+        # Alembic is synchronous: keep it off the event loop
+        result = await asyncio.to_thread(_run_migrations_sync, db_url)
     except Exception as e:
         logger.error("Migration failed: %s: %s", type(e).__name__, e)
+        raise
+    logger.info("Alembic migrations: %s", result)
+    return result
@@ -0,0 +1,68 @@
+import logging
+import os
+import uuid
+from typing import Optional
+
+from bot import infrastructure
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_leader")
+
+# compare-and-{extend,delete}: only the current holder may renew or release
+_RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+
+def worker_id() -> str:
+    return f"{os.getenv('HOSTNAME', 'local')}:{os.getpid()}"
+
+
+class RedisLock:
+    """Leader lock shared by all uvicorn workers/replicas through the infra Redis client."""
+
+    def __init__(self, name: str, ttl_s: float = 30.0):
+        self.key = f"guardian:lock:{name}"
+        self.ttl_ms = int(ttl_s * 1000)
+        self.token = f"{worker_id()}:{uuid.uuid4().hex}"
+        self.held = False
+
+    async def acquire(self) -> bool:
+        r = infrastructure.redis_client
+        if r is None:
+            # no Redis -> no shared state; assume a single process
+            self.held = True
+            return True
+        self.held = bool(await r.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        return self.held
+
+    async def renew(self) -> bool:
+        r = infrastructure.redis_client
+        if r is None:
+            return self.held
+        self.held = bool(await r.eval(_RENEW, 1, self.key, self.token, self.ttl_ms))
+        return self.held
+
+    async def release(self) -> None:
+        r = infrastructure.redis_client
+        if r is not None and self.held:
+            try:
+                await r.eval(_RELEASE, 1, self.key, self.token)
+            except Exception as e:
+                log_json(logging.WARNING, "leader_release_failed", key=self.key, error=f"{type(e).__name__}: {e}")
+        self.held = False
+
+
+async def claim_once(name: str, ttl_s: float = 3600.0) -> bool:
+    # one-shot election: the first worker to claim `name` wins; the key just expires
+    try:
+        won = await RedisLock(name, ttl_s=ttl_s).acquire()
+    except Exception as e:
+        log_json(logging.WARNING, "leader_claim_failed", name=name, error=f"{type(e).__name__}: {e}")
+        return False
+    log_json(logging.INFO, "leader_claim", name=name, won=won, worker=worker_id())
+    return won
+
+
+def boot_claim_name(sha: Optional[str]) -> str:
+    # once per deploy: every worker of the same commit competes for the same key
+    return f"boot:{(sha or 'local')[:12]}"
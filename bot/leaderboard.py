@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from bot import infrastructure
+from bot.leader import RedisLock, claim_once
+from bot.metrics import LEADERBOARD_UPDATES
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_leaderboard")
+
+# Points leaderboard: a Redis ZSET (member = user_id, score = balance) kept in step with the ledger.
+# Writers ZINCRBY their committed deltas (after_commit); rebuild() re-derives the set from
+# points_balances and repairs whatever was lost while Redis was unreachable.
+KEY = "guardian:leaderboard:points"
+TMP_KEY = KEY + ":tmp"
+# deltas applied while a rebuild is running; merged into the rebuilt set so they are not lost
+DELTA_KEY = KEY + ":delta"
+# size of the set at the last rebuild: tells "nobody has points yet" (0, no ZSET key) apart from
+# "Redis lost the set" (marker gone, or > 0 with the set missing)
+BUILT_KEY = KEY + ":built"
+REBUILD_LOCK = "leaderboard-rebuild"
+REBUILD_CHUNK = 5000
+REBUILD_LOCK_KEY = RedisLock(REBUILD_LOCK).key
+
+# ZINCRBY every (user, delta); while the rebuild lock exists also record them in DELTA_KEY
+_APPLY = """
+local building = redis.call('exists', KEYS[3]) == 1
+for i = 1, #ARGV, 2 do
+    redis.call('zincrby', KEYS[1], ARGV[i + 1], ARGV[i])
+    if building then redis.call('zincrby', KEYS[2], ARGV[i + 1], ARGV[i]) end
+end
+return 0
+"""
+# live = snapshot + deltas recorded since the snapshot started
+_SWAP = """
+redis.call('zunionstore', KEYS[1], 2, KEYS[2], KEYS[3])
+redis.call('del', KEYS[2], KEYS[3])
+local size = redis.call('zcard', KEYS[1])
+redis.call('set', KEYS[4], size)
+return size
+"""
+
+
+async def apply(deltas: Dict[int, int]) -> None:
+    # best-effort: call through infrastructure.after_commit; a failed update is repaired by rebuild()
+    r = infrastructure.redis_client
+    deltas = {int(u): int(d) for u, d in deltas.items() if d}
+    if r is None or not deltas:
+        return
+    items = list(deltas.items())
+    try:
+        for i in range(0, len(items), REBUILD_CHUNK):
+            args: List[int] = []
+            for u, d in items[i:i + REBUILD_CHUNK]:
+                args += [u, d]
+            await r.eval(_APPLY, 3, KEY, DELTA_KEY, REBUILD_LOCK_KEY, *args)
+        LEADERBOARD_UPDATES.labels(result="ok").inc(len(items))
+    except Exception as e:
+        LEADERBOARD_UPDATES.labels(result="error").inc(len(items))
+        log_json(logging.WARNING, "leaderboard_update_error", users=len(items), error=f"{type(e).__name__}: {e}")
+
+
+async def _db_top(limit: int) -> List[Dict[str, int]]:
+    # fallback without Redis: scans points_balances (one row per user), never the ledger
+    async for s in infrastructure.get_read_session():
+        r = await s.execute(
+            text("SELECT user_id, balance FROM points_balances ORDER BY balance DESC, user_id LIMIT :lim"),
+            {"lim": int(limit)},
+        )
+        return [{"rank": i, "user_id": int(u), "points": int(b)} for i, (u, b) in enumerate(r.fetchall(), 1)]
+    return []
+
+
+async def top(limit: int = 10) -> List[Dict[str, int]]:
+    r = infrastructure.redis_client
+    if r is not None:
+        try:
+            rows = await r.zrevrange(KEY, 0, int(limit) - 1, withscores=True)
+            return [{"rank": i, "user_id": int(u), "points": int(p)} for i, (u, p) in enumerate(rows, 1)]
+        except Exception as e:
+            log_json(logging.WARNING, "leaderboard_read_error", error=f"{type(e).__name__}: {e}")
+    return await _db_top(limit)
+
+
+async def rank(user_id: int) -> Optional[Dict[str, int]]:
+    # 1-based position by points, None when the user has no balance yet. The fallback counts the
+    # balances above the user on ix_points_balances_rank: fine for /top, kept off hot paths like /my
+    r = infrastructure.redis_client
+    if r is not None:
+        try:
+            pipe = r.pipeline(transaction=False)
+            pipe.zrevrank(KEY, int(user_id))
+            pipe.zscore(KEY, int(user_id))
+            pos, score = await pipe.execute()
+            return None if pos is None else {"rank": int(pos) + 1, "points": int(score)}
+        except Exception as e:
+            log_json(logging.WARNING, "leaderboard_read_error", error=f"{type(e).__name__}: {e}")
+    async for s in infrastructure.get_read_session():
+        r = await s.execute(
+            text("""
+                SELECT b.balance, (SELECT count(*) FROM points_balances o WHERE o.balance > b.balance) + 1
+                FROM points_balances b WHERE b.user_id=:u
+            """),
+            {"u": int(user_id)},
+        )
+        row = r.first()
+        return {"rank": int(row[1]), "points": int(row[0])} if row else None
+    return None
+
+
+async def rebuild(chunk: int = REBUILD_CHUNK) -> Optional[Dict[str, int]]:
+    # Re-derive the ZSET from points_balances without blocking writers. The lock doubles as the
+    # "rebuild running" flag _APPLY checks; a writer that committed just before the snapshot but
+    # applies its delta after the lock was taken is counted twice until the next rebuild.
+    r = infrastructure.redis_client
+    if r is None or infrastructure.engine is None:
+        return None
+    lock = RedisLock(REBUILD_LOCK, ttl_s=60.0)
+    if not await lock.acquire():
+        return None  # another worker is rebuilding
+    t0 = time.perf_counter()
+    try:
+        await r.delete(TMP_KEY, DELTA_KEY)
+        users = 0
+        async with infrastructure.engine.connect() as c:
+            result = await c.stream(text("SELECT user_id, balance FROM points_balances WHERE balance <> 0"))
+            async for part in result.partitions(chunk):
+                await r.zadd(TMP_KEY, {int(u): int(b) for u, b in part})
+                users += len(part)
+                await lock.renew()
+        size = await r.eval(_SWAP, 4, KEY, TMP_KEY, DELTA_KEY, BUILT_KEY)
+    finally:
+        await lock.release()
+    out = {"users": users, "size": int(size), "ms": int((time.perf_counter() - t0) * 1000)}
+    log_json(logging.INFO, "leaderboard_rebuilt", **out)
+    return out
+
+
+# --- Rebuild job ---
+_task: Optional[asyncio.Task] = None
+
+
+async def _needs_rebuild() -> bool:
+    # never built on this Redis (fresh, flushed or restarted), or the set vanished since
+    r = infrastructure.redis_client
+    built = await r.get(BUILT_KEY)
+    return built is None or (int(built) > 0 and not await r.exists(KEY))
+
+
+async def _rebuild_loop(interval_s: float) -> None:
+    # one rebuild per interval across all workers (claim per time slot), and right away when the set is missing
+    last_slot = None
+    while True:
+        try:
+            slot = int(time.time() // interval_s)
+            if await _needs_rebuild():
+                await rebuild()
+            elif slot != last_slot and await claim_once(f"leaderboard:{slot}", ttl_s=interval_s):
+                await rebuild()
+            last_slot = slot
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_json(logging.WARNING, "leaderboard_rebuild_error", error=f"{type(e).__name__}: {e}")
+        await asyncio.sleep(min(60.0, interval_s))
+
+
+def start() -> None:
+    # LEADERBOARD_REBUILD_S=0 disables the periodic job (tools/rebuild_leaderboard.py still works)
+    global _task
+    interval_s = float(os.getenv("LEADERBOARD_REBUILD_S", "3600"))
+    if interval_s <= 0 or infrastructure.redis_client is None:
+        return
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_rebuild_loop(interval_s), name="leaderboard-rebuild")
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
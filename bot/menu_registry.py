@@ -41,8 +41,10 @@ COMMANDS: List[Cmd] = [
     Cmd("donate", "Support / donate", "user"),
     Cmd("ref", "Referral link", "user"),
     Cmd("my", "My points & requests", "user"),
+    Cmd("top", "Points leaderboard", "user"),
     Cmd("buy", "Request token purchase", "user"),
     Cmd("claim", "Claim donation (manual verify)", "user", show_in_start=False, show_in_menu=True),
+    Cmd("accounts", "My payout accounts", "user", show_in_start=False, show_in_menu=True),
 
     # Infra
     Cmd("status", "Infra status", "admin"),
@@ -50,10 +52,14 @@ COMMANDS: List[Cmd] = [
 
     # Admin inbox
     Cmd("pending", "List pending requests", "admin"),
-    Cmd("approve", "Approve request (admin)", "admin", show_in_start=False, show_in_menu=True),
-    Cmd("reject", "Reject request (admin)", "admin", show_in_start=False, show_in_menu=True),
+    Cmd("approve", "Approve request(s): ids, a-b ranges", "admin", show_in_start=False, show_in_menu=True),
+    Cmd("reject", "Reject request(s): ids, a-b ranges", "admin", show_in_start=False, show_in_menu=True),
     Cmd("dm", "DM a user", "admin", show_in_start=False, show_in_menu=True),
     Cmd("broadcast_admins", "Broadcast to admins", "owner", show_in_start=False, show_in_menu=True),
+    Cmd("grant_admin", "Grant admin", "owner", show_in_start=False, show_in_menu=True),
+    Cmd("revoke_admin", "Revoke admin", "owner", show_in_start=False, show_in_menu=True),
+    Cmd("set_price", "Set plan price", "owner", show_in_start=False, show_in_menu=True),
+    Cmd("bulk_points", "Bulk credit points (reply to CSV)", "owner", show_in_start=False, show_in_menu=True),
 
     # Owner/system
     Cmd("admin", "Admin report", "admin", show_in_start=False, show_in_menu=True),
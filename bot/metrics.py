@@ -0,0 +1,104 @@
+import logging
+
+# Optional Prometheus metrics (best-effort): without prometheus_client every
+# metric below is a no-op so callers never need to guard.
+logger = logging.getLogger("guardian_metrics")
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+
+    ENABLED = True
+except Exception:
+    Counter = Gauge = Histogram = None
+    ENABLED = False
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def dec(self, *args, **kwargs):
+        pass
+
+    def set(self, *args, **kwargs):
+        pass
+
+    def observe(self, *args, **kwargs):
+        pass
+
+
+def counter(name: str, doc: str, labels=()):
+    return Counter(name, doc, labels) if ENABLED else _Noop()
+
+
+def gauge(name: str, doc: str, labels=()):
+    return Gauge(name, doc, labels) if ENABLED else _Noop()
+
+
+def histogram(name: str, doc: str, labels=(), buckets=None):
+    if not ENABLED:
+        return _Noop()
+    if buckets:
+        return Histogram(name, doc, labels, buckets=buckets)
+    return Histogram(name, doc, labels)
+
+
+# --- Webhook update queue ---
+UPDATE_QUEUE_DEPTH = gauge("guardian_update_queue_depth", "Updates waiting in the webhook queue")
+UPDATE_QUEUE_WAIT = histogram(
+    "guardian_update_queue_wait_seconds",
+    "Time an update spent queued before a worker picked it up",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+UPDATE_QUEUE_DROPPED = counter("guardian_update_queue_dropped_total", "Updates dropped by the webhook queue", ("reason",))
+UPDATE_QUEUE_PROCESSED = counter("guardian_update_queue_processed_total", "Updates processed by queue workers", ("ok",))
+
+# --- Webhook update de-duplication ---
+UPDATE_DEDUP = counter("guardian_update_dedup_total", "Webhook updates by de-duplication result", ("result",))
+
+# --- Webhook pre-dispatch filter ---
+WEBHOOK_UPDATES = counter("guardian_webhook_updates_total", "Webhook updates by type and pre-filter action", ("type", "action"))
+
+# --- Webhook admission control ---
+ADMISSION_DECISIONS = counter("guardian_admission_total", "Webhook admission decisions", ("lane", "decision", "reason"))
+ADMISSION_INFLIGHT = gauge("guardian_admission_inflight", "Admitted updates not yet finished (queued + running)")
+ADMISSION_LATENCY_EWMA = gauge("guardian_admission_latency_ewma_ms", "Smoothed update handling latency used for shedding")
+
+# --- Active health prober ---
+PROBE_LATENCY = histogram(
+    "guardian_probe_latency_seconds",
+    "Latency of background Postgres/Redis health probes",
+    ("component",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+PROBE_UP = gauge("guardian_probe_up", "Last health probe result (1 ok, 0 failed)", ("component",))
+
+# --- DB sessions ---
+DB_SESSIONS = counter("guardian_db_sessions_total", "DB sessions opened by store calls", ("mode",))
+DB_READS = counter("guardian_db_reads_total", "Read-only store calls by target (primary or replica name) and reason", ("target", "reason"))
+
+# --- Connection pools (bot/pools.py; pool = postgres | replica<i> | redis) ---
+POOL_CHECKED_OUT = gauge("guardian_pool_checked_out", "Connections currently checked out of the pool", ("pool",))
+POOL_WAIT = histogram(
+    "guardian_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool (waiting for a free slot, or opening a new one)",
+    ("pool",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POOL_CONNECTIONS = counter("guardian_pool_connections_total", "Pool connection events: connect, close, invalidate, timeout, error", ("pool", "event"))
+
+# --- Points balances ---
+BALANCE_RECONCILE = counter("guardian_balance_reconcile_users_total", "Users checked by balance reconciliation", ("result",))
+
+# --- Read-through caches ---
+CACHE_REQUESTS = counter("guardian_cache_requests_total", "Read-through cache lookups", ("cache", "result"))
+
+# --- Points leaderboard ---
+LEADERBOARD_UPDATES = counter("guardian_leaderboard_updates_total", "Per-user deltas applied to the Redis leaderboard", ("result",))
+
+# --- Admin inbox ---
+ADMIN_INBOX_REQUESTS = counter("guardian_admin_inbox_requests_total", "New requests reported in admin inbox digests")
+ADMIN_INBOX_SENDS = counter("guardian_admin_inbox_sends_total", "Admin inbox digest deliveries", ("result",))
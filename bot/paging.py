@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# Keyset cursors over (created_at, id): "<base36 µs since epoch>.<base36 id>", short enough for
+# Telegram callback_data (64 bytes) together with a "pg:<kind>:" prefix.
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _b36(n: int) -> str:
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = _DIGITS[r] + out
+        if not n:
+            return out
+
+
+def encode_cursor(created_at: datetime, id_: int) -> str:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    d = created_at - _EPOCH
+    us = (d.days * 86400 + d.seconds) * 1_000_000 + d.microseconds
+    return f"{_b36(us)}.{_b36(int(id_))}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    # None for a missing or malformed cursor (first page)
+    if not cursor:
+        return None
+    try:
+        us, id_ = cursor.split(".", 1)
+        return _EPOCH + timedelta(microseconds=int(us, 36)), int(id_, 36)
+    except ValueError:
+        return None
+
+
+def split_page(items: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    # store calls fetch limit+1 rows; the extra row only tells us there is a next page
+    if len(items) > limit:
+        return items[:limit], items[limit - 1]["cursor"]
+    return items, None
@@ -0,0 +1,40 @@
+import csv
+import io
+from typing import List, Tuple
+
+# /bulk_points CSV: user_id,delta,ref[,reason] -- a header row is optional
+MAX_ERRORS = 10
+_INT32 = 2**31 - 1
+# points_ledger.ref is VARCHAR(256) and add_points_many stores "bulk:<ref>"
+MAX_REF_LEN = 250
+
+
+def parse_points_csv(data: str, default_reason: str = "airdrop") -> Tuple[List[Tuple[int, int, str, str]], List[str]]:
+    # -> (entries for economy_store.add_points_many, errors); callers reject the file on any error
+    entries: List[Tuple[int, int, str, str]] = []
+    errors: List[str] = []
+    for lineno, row in enumerate(csv.reader(io.StringIO(data)), start=1):
+        row = [c.strip() for c in row]
+        if not row or not any(row):
+            continue
+        if lineno == 1 and not row[0].lstrip("-").isdigit():
+            continue  # header
+        try:
+            if len(row) < 3:
+                raise ValueError("expected user_id,delta,ref[,reason]")
+            uid, delta, ref = int(row[0]), int(row[1]), row[2]
+            reason = (row[3] if len(row) > 3 and row[3] else default_reason)
+            if uid <= 0:
+                raise ValueError(f"bad user_id {row[0]}")
+            if delta == 0 or abs(delta) > _INT32:
+                raise ValueError(f"bad delta {row[1]}")
+            if not ref or len(ref) > MAX_REF_LEN:
+                raise ValueError(f"ref must be 1..{MAX_REF_LEN} chars")
+            if len(reason) > 64:
+                raise ValueError("reason longer than 64 chars")
+        except ValueError as e:
+            if len(errors) < MAX_ERRORS:
+                errors.append(f"line {lineno}: {e}")
+            continue
+        entries.append((uid, delta, reason, ref))
+    return entries, errors
@@ -0,0 +1,111 @@
+import os
+import time
+from typing import Any, Dict, Optional
+
+import redis.asyncio as redis
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from bot.metrics import POOL_CHECKED_OUT, POOL_CONNECTIONS, POOL_WAIT
+
+# Connection pools for the Postgres engines (primary and replicas) and the Redis client, sized
+# from env and exported as guardian_pool_* metrics labelled by pool name ("postgres",
+# "replica<i>", "redis"). Checkout wait climbing towards the pool timeout is the early sign of
+# pool exhaustion, well before webhook handlers start timing out.
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in ("0", "false", "no", "off")
+
+
+def _env_float(name: str) -> Optional[float]:
+    v = os.getenv(name)
+    return float(v) if v else None
+
+
+class _TimedQueuePool(AsyncAdaptedQueuePool):
+    # _do_get is where a checkout waits for a free slot (and opens a connection when one is due)
+    pool_name = "postgres"
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            POOL_CONNECTIONS.labels(pool=self.pool_name, event="timeout").inc()
+            raise
+        POOL_WAIT.labels(pool=self.pool_name).observe(time.perf_counter() - t0)
+        return conn
+
+
+def engine_kwargs(name: str) -> Dict[str, Any]:
+    # create_async_engine() arguments; the same settings apply to the primary and every replica
+    recycle = int(os.getenv("DB_POOL_RECYCLE_S", "1800"))
+    return {
+        "poolclass": type(f"_TimedQueuePool_{name}", (_TimedQueuePool,), {"pool_name": name}),
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT_S", "30")),
+        "pool_recycle": recycle if recycle > 0 else -1,
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", "1"),
+        # asyncpg's per-connection prepared statement cache; 0 behind PgBouncer in transaction mode
+        "connect_args": {"statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))},
+    }
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> AsyncEngine:
+    # checked-out gauge and connection churn from pool events (they fire in the sync pool layer)
+    pool = engine.sync_engine.pool
+    checked_out = POOL_CHECKED_OUT.labels(pool=name)
+
+    def on(event_name: str, fn) -> None:
+        event.listen(pool, event_name, fn)
+
+    on("connect", lambda *_: POOL_CONNECTIONS.labels(pool=name, event="connect").inc())
+    on("close", lambda *_: POOL_CONNECTIONS.labels(pool=name, event="close").inc())
+    on("invalidate", lambda *_: POOL_CONNECTIONS.labels(pool=name, event="invalidate").inc())
+    on("checkout", lambda *_: checked_out.inc())
+    on("checkin", lambda *_: checked_out.dec())
+    return engine
+
+
+class InstrumentedRedisPool(redis.BlockingConnectionPool):
+    """Bounded Redis pool: callers wait up to `timeout` for a free connection instead of failing."""
+
+    pool_name = "redis"
+
+    def make_connection(self):
+        POOL_CONNECTIONS.labels(pool=self.pool_name, event="connect").inc()
+        return super().make_connection()
+
+    async def get_connection(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            conn = await super().get_connection(*args, **kwargs)
+        except redis.ConnectionError as e:
+            # "No connection available." is the pool timeout; anything else failed to connect
+            failed = "timeout" if "No connection available" in str(e) else "error"
+            POOL_CONNECTIONS.labels(pool=self.pool_name, event=failed).inc()
+            raise
+        finally:
+            POOL_CHECKED_OUT.labels(pool=self.pool_name).set(len(self._in_use_connections))
+        POOL_WAIT.labels(pool=self.pool_name).observe(time.perf_counter() - t0)
+        return conn
+
+    async def release(self, connection):
+        await super().release(connection)
+        POOL_CHECKED_OUT.labels(pool=self.pool_name).set(len(self._in_use_connections))
+
+
+def redis_from_url(url: str) -> redis.Redis:
+    pool = InstrumentedRedisPool.from_url(
+        url,
+        max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+        timeout=float(os.getenv("REDIS_POOL_TIMEOUT_S", "5")),
+        socket_timeout=_env_float("REDIS_SOCKET_TIMEOUT_S"),
+        socket_connect_timeout=_env_float("REDIS_CONNECT_TIMEOUT_S"),
+        health_check_interval=int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL_S", "30")),
+    )
+    return redis.Redis.from_pool(pool)
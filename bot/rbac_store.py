@@ -2,7 +2,7 @@
 from typing import Optional, List, Dict
 
 from sqlalchemy import text
-from bot.infrastructure import get_db_session
+from bot.infrastructure import get_db_session, get_read_session
 
 
 async def has_role(tg_user_id: int, role_name: str) -> bool:
@@ -52,7 +52,7 @@ async def revoke_role(tg_user_id: int, role_name: str) -> None:
 
 
 async def list_users_with_role(role_name: str) -> List[Dict]:
-    async for s in get_db_session():
+    async for s in get_read_session():
         r = await s.execute(
             text("""
                 SELECT ur.user_id, ur.granted_by, ur.granted_at
@@ -0,0 +1,34 @@
+import time
+from typing import Any, Dict, Optional
+
+# Component states: pending -> ok | failed; disabled = not configured, never blocks readiness.
+PENDING, OK, FAILED, DISABLED = "pending", "ok", "failed", "disabled"
+
+
+class Readiness:
+    """Per-component startup state behind /readyz and the webhook 503 gate."""
+
+    def __init__(self):
+        self._c: Dict[str, Dict[str, Any]] = {}
+        self._t0 = time.monotonic()
+
+    def set(self, name: str, status: str, error: Optional[BaseException | str] = None) -> None:
+        if isinstance(error, BaseException):
+            error = f"{type(error).__name__}: {error}"
+        self._c[name] = {"status": status, "error": error, "after_ms": int((time.monotonic() - self._t0) * 1000)}
+
+    def status(self, name: str) -> str:
+        return self._c.get(name, {}).get("status", PENDING)
+
+    def ok(self, name: str) -> bool:
+        return self.status(name) == OK
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._c) and all(c["status"] in (OK, DISABLED) for c in self._c.values())
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {k: dict(v) for k, v in self._c.items()}
+
+
+READINESS = Readiness()
@@ -1,18 +1,35 @@
-﻿import logging
+﻿import asyncio
+import logging
 import os
 import time
 from contextlib import asynccontextmanager
+from typing import Optional
 
 from fastapi import FastAPI, Request, Response, Header
 from fastapi.responses import JSONResponse
 
 from telegram import Update
 
-from bot.app_factory import build_application
-from bot.infrastructure import init_infrastructure, run_migrations_safe, runtime_report
+from bot import admin_inbox, health_prober, ids, leaderboard
+from bot import admission as admission_mod
+from bot.admission import busy_reply, from_env as admission_from_env, sender_of
+from bot.app_factory import boot_tasks, build_application
+from bot.infrastructure import init_infrastructure, run_migrations_safe, wait_postgres, wait_redis
+from bot.readiness import DISABLED, FAILED, OK, PENDING, READINESS
+from bot.update_dedup import from_env as update_dedup_from_env
+from bot.update_filter import command_of, from_application as update_filter_from_application, loads as json_loads
+from bot import webhook_reply
+from bot.leader import boot_claim_name, claim_once
+from bot.update_queue import from_env as update_queue_from_env
+from bot.webhook_recorder import from_env as webhook_recorder_from_env
 
 APP_START = time.time()
 ptb_app = None
+update_queue = None
+update_filter = None
+update_dedup = update_dedup_from_env()
+admission = admission_from_env()
+webhook_recorder = webhook_recorder_from_env()
 
 
 def uptime_s() -> int:
@@ -28,42 +45,160 @@ def git_sha() -> str:
     )
 
 
-@asynccontextmanager
-async def lifespan(_app: FastAPI):
-    # Infra (do not crash app)
+async def _start_infra() -> bool:
+    # an unset DATABASE_URL / REDIS_URL disables that component (DB-free commands keep working,
+    # e.g. under tools/bench_workers.py); a configured one that cannot start is failed
+    disabled = {name for name, var in (("postgres", "DATABASE_URL"), ("redis", "REDIS_URL")) if not os.getenv(var)}
+    if "postgres" in disabled:
+        disabled.add("migrations")
+    for name in disabled:
+        READINESS.set(name, DISABLED)
     try:
-        await init_infrastructure(wait=True)
+        await init_infrastructure(wait=False)
+        return True
     except Exception as e:
         logging.getLogger(__name__).error(
             "infra init failed (startup continues): %s: %s", type(e).__name__, e
         )
+        for name in ("postgres", "redis", "migrations"):
+            if name not in disabled:
+                READINESS.set(name, FAILED, e)
+        return False
+
+
+async def _probe(name: str, wait_fn) -> None:
+    try:
+        await wait_fn()
+        READINESS.set(name, OK)
+    except Exception as e:
+        READINESS.set(name, FAILED, e)
+        logging.getLogger(__name__).error("%s not ready (startup continues): %s: %s", name, type(e).__name__, e)
+
 
+async def _migrate(pg_probe: asyncio.Task) -> None:
+    await pg_probe
+    if not READINESS.ok("postgres"):
+        READINESS.set("migrations", FAILED, "postgres not ready")
+        return
     # Migrations (safe)
     try:
         await run_migrations_safe()
+        READINESS.set("migrations", OK)
     except Exception as e:
+        READINESS.set("migrations", FAILED, e)
         logging.getLogger(__name__).error(
             "migrations failed (startup continues): %s: %s", type(e).__name__, e
         )
 
+
+async def _start_ptb(redis_probe: Optional[asyncio.Task]) -> None:
     # Telegram PTB embedded
-    global ptb_app
-    if ptb_app is None:
-        if os.getenv("TELEGRAM_TOKEN"):
-            ptb_app = build_application()
-            logging.getLogger(__name__).info("PTB application initialized")
-        else:
-            logging.getLogger(__name__).warning("TELEGRAM_TOKEN missing; PTB disabled")
+    global ptb_app, update_queue, update_filter
+    if not os.getenv("TELEGRAM_TOKEN"):
+        logging.getLogger(__name__).warning("TELEGRAM_TOKEN missing; PTB disabled")
+        READINESS.set("ptb", DISABLED)
+        return
+    try:
+        app_ = build_application()
+        await app_.initialize()
+        await app_.start()
+    except Exception as e:
+        READINESS.set("ptb", FAILED, e)
+        logging.getLogger(__name__).error("PTB start failed: %s: %s", type(e).__name__, e)
+        return
+    ptb_app = app_
+    logging.getLogger(__name__).info("PTB application initialized")
+
+    # Skip PTB decoding for updates no registered handler can match (UPDATE_PREFILTER=0 -> off)
+    if os.getenv("UPDATE_PREFILTER", "1").lower() not in ("0", "false", "no", "off"):
+        update_filter = update_filter_from_application(ptb_app)
+    # Webhook acks immediately; workers process updates (UPDATE_QUEUE_WORKERS=0 -> inline)
+    update_queue = update_queue_from_env(process_payload)
+    if update_queue is not None:
+        update_queue.start()
+    READINESS.set("ptb", OK)
+
+    # uvicorn --workers N: only the elected worker sends the boot report / set_my_commands
+    if redis_probe is not None:
+        await redis_probe
+    if await claim_once(boot_claim_name(git_sha()), ttl_s=float(os.getenv("BOOT_CLAIM_TTL_S", "300"))):
+        try:
+            await boot_tasks(ptb_app)
+        except Exception as e:
+            logging.getLogger(__name__).error(
+                "boot tasks failed (startup continues): %s: %s", type(e).__name__, e
+            )
+
+
+async def _start_ids(redis_probe: asyncio.Task) -> None:
+    # Snowflake worker id: lease one of the Redis slots (the lease loop keeps retrying while Redis
+    # is down; nothing is minted until it holds one)
+    await redis_probe
+    ids.start()
+
+
+async def _start_leaderboard(redis_probe: asyncio.Task, migrate: asyncio.Task) -> None:
+    # the rebuild job reads points_balances: wait for Redis and the migrations
+    await asyncio.gather(redis_probe, migrate)
+    if READINESS.ok("redis") and READINESS.ok("migrations"):
+        leaderboard.start()
+
+
+async def _startup() -> None:
+    # Staged startup: the port is already bound; Postgres/Redis probes run concurrently,
+    # migrations wait for Postgres only, PTB starts right away.
+    for name in ("postgres", "redis", "migrations", "ids", "ptb"):
+        READINESS.set(name, PENDING)
+    redis_probe = None
+    tasks = []
+    if not await _start_infra():
+        ids.start()  # no Redis client: the static host:pid worker id
+    else:
+        health_prober.start()
+        pg_probe = asyncio.create_task(_probe("postgres", wait_postgres))
+        redis_probe = asyncio.create_task(_probe("redis", wait_redis))
+        migrate = asyncio.create_task(_migrate(pg_probe))
+        tasks += [
+            pg_probe, redis_probe, migrate,
+            asyncio.create_task(_start_ids(redis_probe)),
+            asyncio.create_task(_start_leaderboard(redis_probe, migrate)),
+        ]
+    tasks.append(asyncio.create_task(_start_ptb(redis_probe)))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if READINESS.ok("migrations"):
+        # owner/admin ids for the admission priority lane
+        admission_mod.start(admission)
+    if ptb_app is not None and READINESS.ok("migrations"):
+        # new-request digests for admins (LISTEN/NOTIFY, one elected worker)
+        admin_inbox.start(ptb_app.bot)
+    logging.getLogger(__name__).info("startup finished: %s", READINESS.snapshot())
 
-    if ptb_app is not None:
-        await ptb_app.initialize()
-        await ptb_app.start()
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    global update_queue
+    startup = asyncio.create_task(_startup(), name="startup")
 
     yield
 
+    if not startup.done():
+        startup.cancel()
+        await asyncio.gather(startup, return_exceptions=True)
+    await health_prober.stop()
+    await admin_inbox.stop()
+    await admission_mod.stop()
+
+    if update_queue is not None:
+        await update_queue.stop()
+        update_queue = None
+
     if ptb_app is not None:
         await ptb_app.stop()
         await ptb_app.shutdown()
+    await leaderboard.stop()
+    await ids.stop()
+    if webhook_recorder is not None:
+        await asyncio.to_thread(webhook_recorder.close)
 
 
 app = FastAPI(lifespan=lifespan)
@@ -90,19 +225,13 @@ async def health():
 
 @app.get("/readyz")
 async def readyz():
+    # served from startup state + the background prober's cache: no DB/Redis round trip here
     t0 = time.perf_counter()
-    try:
-        _ = await runtime_report(full=False)
-        return {"ok": True, "elapsed_ms": int((time.perf_counter() - t0) * 1000)}
-    except Exception as e:
-        return JSONResponse(
-            {
-                "ok": False,
-                "elapsed_ms": int((time.perf_counter() - t0) * 1000),
-                "error": f"{type(e).__name__}: {e}",
-            },
-            status_code=503,
-        )
+    body = health_prober.readiness_report()
+    body["elapsed_ms"] = int((time.perf_counter() - t0) * 1000)
+    if not body["ok"]:
+        return JSONResponse(body, status_code=503)
+    return body
 
 
 @app.get("/version")
@@ -110,6 +239,27 @@ async def version():
     return {"service": "guardian", "git_sha": git_sha(), "uptime_s": uptime_s()}
 
 
+async def process_payload(payload: dict) -> None:
+    # every admitted update ends here exactly once (inline or from a queue worker)
+    t0 = time.perf_counter()
+    try:
+        update = Update.de_json(payload, ptb_app.bot)
+        await ptb_app.process_update(update)
+    finally:
+        admission.finished(time.perf_counter() - t0)
+
+
+async def _process_inline(payload: dict, update_id) -> None:
+    # processed before the ack: on failure (or a cut-off request) un-mark the update_id so
+    # Telegram's retry is processed instead of acked as a duplicate
+    try:
+        await process_payload(payload)
+    except BaseException:
+        if update_dedup is not None:
+            await update_dedup.forget(update_id)
+        raise
+
+
 @app.post("/tg/webhook")
 async def tg_webhook(
     request: Request,
@@ -122,11 +272,55 @@ async def tg_webhook(
             return JSONResponse({"ok": False, "error": "BAD_SECRET"}, status_code=403)
 
     if ptb_app is None:
-        return JSONResponse({"ok": False, "error": "PTB_DISABLED"}, status_code=503)
-
-    payload = await request.json()
-    update = Update.de_json(payload, ptb_app.bot)
-    await ptb_app.process_update(update)
+        if READINESS.status("ptb") == DISABLED:
+            return JSONResponse({"ok": False, "error": "PTB_DISABLED"}, status_code=503)
+        # still starting (or failed): Telegram keeps the update and retries
+        return JSONResponse({"ok": False, "error": "NOT_READY"}, status_code=503, headers={"Retry-After": "5"})
+    gate = {name: READINESS.status(name) for name in ("migrations", "ids")}
+    if any(status in (PENDING, FAILED) for status in gate.values()):
+        # handlers need the migrated schema and a worker id for new rows: acking now would lose
+        # the update in a failing handler (no DATABASE_URL at all = disabled: DB-free commands only)
+        return JSONResponse({"ok": False, "error": "NOT_READY", **gate}, status_code=503, headers={"Retry-After": "5"})
+
+    payload = json_loads(await request.body())
+    # Traffic capture for tools/replay_webhook.py (WEBHOOK_RECORD_PATH, sampled + anonymized)
+    if webhook_recorder is not None:
+        webhook_recorder.maybe_record(payload)
+
+    if update_filter is not None and not update_filter.wants(payload):
+        return {"ok": True}
+
+    update_id = payload.get("update_id")
+    # Telegram re-delivers slow/failed updates; ack duplicates before any PTB/DB work
+    if update_dedup is not None and await update_dedup.is_duplicate(update_id):
+        return {"ok": True, "duplicate": True}
+
+    # Admission control: updates from the owner/admins always get in (priority lane); everyone
+    # else is shed with 200 under overload so Telegram does not back off the whole bot.
+    command = command_of(payload)
+    admitted, lane = admission.admit(command, sender_of(payload))
+    if not admitted:
+        return busy_reply(payload) or {"ok": True, "shed": True}
+
+    # Webhook-reply mode (WEBHOOK_REPLY=1): simple commands run inline and their single
+    # sendMessage rides back in this response instead of a separate Bot API call.
+    if webhook_reply.wants(command):
+        with webhook_reply.capture() as reply:
+            await _process_inline(payload, update_id)
+        return reply or {"ok": True}
+
+    if update_queue is not None:
+        if not update_queue.submit(payload, priority=(lane == "priority")):
+            admission.finished()
+            if update_dedup is not None:
+                await update_dedup.forget(update_id)
+            # Telegram re-delivers on non-2xx; let it back off instead of losing the update
+            return JSONResponse(
+                {"ok": False, "error": "QUEUE_FULL"}, status_code=503, headers={"Retry-After": "1"}
+            )
+        return {"ok": True}
+
+    await _process_inline(payload, update_id)
     return {"ok": True}
 
 
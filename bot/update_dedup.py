@@ -0,0 +1,77 @@
+import logging
+import os
+from collections import deque
+from typing import Deque, Optional, Set
+
+from bot import infrastructure
+from bot.metrics import UPDATE_DEDUP
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_dedup")
+
+
+class UpdateDeduper:
+    """Drops re-delivered update_ids: local ring for the hot window, Redis SET NX for replicas."""
+
+    def __init__(self, window: int = 10000, ttl_s: int = 3600, prefix: str = "guardian:upd"):
+        self._window = max(1, int(window))
+        self._ttl_s = max(1, int(ttl_s))
+        self._prefix = prefix
+        self._ring: Deque[int] = deque()
+        self._seen: Set[int] = set()
+
+    def _remember(self, update_id: int) -> None:
+        if len(self._ring) >= self._window:
+            self._seen.discard(self._ring.popleft())
+        self._ring.append(update_id)
+        self._seen.add(update_id)
+
+    async def is_duplicate(self, update_id: Optional[int]) -> bool:
+        if update_id is None:
+            return False
+        update_id = int(update_id)
+        if update_id in self._seen:
+            UPDATE_DEDUP.labels(result="local").inc()
+            return True
+
+        r = infrastructure.redis_client
+        if r is not None:
+            try:
+                # SET NX is atomic, so exactly one worker/replica wins the update
+                fresh = await r.set(f"{self._prefix}:{update_id}", 1, nx=True, ex=self._ttl_s)
+                if not fresh:
+                    UPDATE_DEDUP.labels(result="redis").inc()
+                    return True
+            except Exception as e:
+                # fail open: a Redis hiccup must not stop the bot
+                UPDATE_DEDUP.labels(result="redis_error").inc()
+                log_json(logging.WARNING, "update_dedup_redis_error", update_id=update_id, error=f"{type(e).__name__}: {e}")
+
+        # only claimed updates enter the local window, so forget() on the owner stays authoritative
+        self._remember(update_id)
+        UPDATE_DEDUP.labels(result="new").inc()
+        return False
+
+    async def forget(self, update_id: Optional[int]) -> None:
+        # the update was not accepted (e.g. queue full): let Telegram's retry through
+        if update_id is None:
+            return
+        update_id = int(update_id)
+        self._seen.discard(update_id)
+        r = infrastructure.redis_client
+        if r is not None:
+            try:
+                await r.delete(f"{self._prefix}:{update_id}")
+            except Exception:
+                pass
+
+
+def from_env() -> Optional[UpdateDeduper]:
+    if os.getenv("UPDATE_DEDUP", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    bot_id = (os.getenv("TELEGRAM_TOKEN") or "").split(":", 1)[0] or "bot"
+    return UpdateDeduper(
+        window=int(os.getenv("UPDATE_DEDUP_WINDOW", "10000")),
+        ttl_s=int(os.getenv("UPDATE_DEDUP_TTL_S", "3600")),
+        prefix=f"guardian:upd:{bot_id}",
+    )
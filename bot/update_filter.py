@@ -0,0 +1,79 @@
+import json
+import logging
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+
+from bot.menu_registry import COMMANDS
+from bot.metrics import WEBHOOK_UPDATES
+
+# Optional fast JSON (best-effort)
+try:
+    import orjson
+
+    loads = orjson.loads
+except Exception:
+    loads = json.loads
+
+logger = logging.getLogger("guardian_filter")
+
+# CommandHandler's default filter (UpdateType.MESSAGES) only looks at these
+_COMMAND_CARRIERS = ("message", "edited_message")
+
+
+def update_type(payload: Dict[str, Any]) -> str:
+    for k in payload:
+        if k != "update_id":
+            return k
+    return "unknown"
+
+
+def command_of(payload: Dict[str, Any]) -> Optional[str]:
+    # mirrors CommandHandler.check_update on the raw dict: leading bot_command entity only
+    for k in _COMMAND_CARRIERS:
+        msg = payload.get(k)
+        if not isinstance(msg, dict):
+            continue
+        text = msg.get("text")
+        entities = msg.get("entities")
+        if not text or not entities:
+            return None
+        first = entities[0]
+        if first.get("type") != "bot_command" or first.get("offset") != 0:
+            return None
+        return text[1:first.get("length", 0)].split("@", 1)[0].lower()
+    return None
+
+
+class UpdateFilter:
+    """Decides from the raw payload whether any registered handler could match the update."""
+
+    def __init__(self, commands: Iterable[str], passthrough_types: Iterable[str] = ()):
+        self.commands: FrozenSet[str] = frozenset(c.lower() for c in commands)
+        self.passthrough_types: FrozenSet[str] = frozenset(passthrough_types)
+
+    def wants(self, payload: Dict[str, Any]) -> bool:
+        kind = update_type(payload)
+        if kind in self.passthrough_types:
+            ok = True
+        else:
+            cmd = command_of(payload)
+            ok = cmd is not None and cmd in self.commands
+        WEBHOOK_UPDATES.labels(type=kind, action=("dispatched" if ok else "filtered")).inc()
+        return ok
+
+
+def from_application(app) -> Optional[UpdateFilter]:
+    # Only safe while every handler is one we understand; anything else disables pre-filtering.
+    from telegram.ext import CallbackQueryHandler, CommandHandler
+
+    commands = {c.cmd for c in COMMANDS}
+    passthrough = set()
+    for group in app.handlers.values():
+        for h in group:
+            if isinstance(h, CommandHandler):
+                commands.update(h.commands)
+            elif isinstance(h, CallbackQueryHandler):
+                passthrough.add("callback_query")
+            else:
+                logger.info("update pre-filter disabled: unsupported handler %s", type(h).__name__)
+                return None
+    return UpdateFilter(commands, passthrough)
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from bot.metrics import UPDATE_QUEUE_DEPTH, UPDATE_QUEUE_DROPPED, UPDATE_QUEUE_PROCESSED, UPDATE_QUEUE_WAIT
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_queue")
+
+# Update payload keys that carry a chat (or at least a sender) we can order on.
+_CHAT_CARRIERS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "business_message",
+    "edited_business_message",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+    "message_reaction",
+)
+
+
+def chat_key(payload: Dict[str, Any]) -> Any:
+    # ordering key: chat id when present, else sender id, else the update itself
+    for k in _CHAT_CARRIERS:
+        obj = payload.get(k)
+        if isinstance(obj, dict):
+            chat = obj.get("chat")
+            if isinstance(chat, dict) and chat.get("id") is not None:
+                return chat["id"]
+    for obj in payload.values():
+        if not isinstance(obj, dict):
+            continue
+        msg = obj.get("message")
+        if isinstance(msg, dict) and isinstance(msg.get("chat"), dict):
+            return msg["chat"].get("id")
+        sender = obj.get("from")
+        if isinstance(sender, dict) and sender.get("id") is not None:
+            return sender["id"]
+    return ("update", payload.get("update_id"))
+
+
+class UpdateQueue:
+    """Bounded in-process queue: one update per chat (and lane) in flight, chats run in parallel."""
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        workers: int = 8,
+        maxsize: int = 1000,
+        priority_maxsize: int = 100,
+    ):
+        self._handler = handler
+        self._workers = max(1, int(workers))
+        # per lane: [priority, user]; the priority lane has its own (small) bound
+        self._maxsize = (max(1, int(priority_maxsize)), max(1, int(maxsize)))
+        self._lane_size = [0, 0]
+        self._pending: Dict[Any, Deque[Tuple[float, Dict[str, Any]]]] = {}
+        # (lane, seq, key): lane 0 = priority (admin/owner), 1 = user; seq keeps FIFO per lane
+        self._ready: "asyncio.PriorityQueue[Tuple[int, int, Any]]" = asyncio.PriorityQueue()
+        self._seq = 0
+        self._tasks: List[asyncio.Task] = []
+        self._size = 0
+        self._inflight = 0
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    def _schedule(self, key: Any) -> None:
+        self._seq += 1
+        self._ready.put_nowait((key[0], self._seq, key))
+
+    def submit(self, payload: Dict[str, Any], priority: bool = False) -> bool:
+        # priority updates overtake queued user updates; each lane is bounded on its own
+        lane = 0 if priority else 1
+        if self._lane_size[lane] >= self._maxsize[lane]:
+            UPDATE_QUEUE_DROPPED.labels(reason=("priority_full" if priority else "full")).inc()
+            log_json(logging.WARNING, "update_queue_full", lane=("priority" if priority else "user"), depth=self._size, update_id=payload.get("update_id"))
+            return False
+        key = (lane, chat_key(payload))
+        dq = self._pending.get(key)
+        if dq is None:
+            # chat idle: schedule it; otherwise its worker picks this up next
+            dq = self._pending[key] = deque()
+            self._schedule(key)
+        dq.append((time.perf_counter(), payload))
+        self._size += 1
+        self._lane_size[lane] += 1
+        UPDATE_QUEUE_DEPTH.set(self._size)
+        return True
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        for i in range(self._workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"update-worker-{i}"))
+        logger.info("update queue started (workers=%d maxsize=%d priority_maxsize=%d)", self._workers, self._maxsize[1], self._maxsize[0])
+
+    async def stop(self, timeout_s: float = 10.0) -> None:
+        deadline = time.monotonic() + timeout_s
+        while (self._size or self._inflight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._size:
+            UPDATE_QUEUE_DROPPED.labels(reason="shutdown").inc(self._size)
+            log_json(logging.WARNING, "update_queue_abandoned", depth=self._size)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, key = await self._ready.get()
+            dq = self._pending[key]
+            t_enq, payload = dq.popleft()
+            self._size -= 1
+            self._lane_size[key[0]] -= 1
+            UPDATE_QUEUE_DEPTH.set(self._size)
+            UPDATE_QUEUE_WAIT.observe(time.perf_counter() - t_enq)
+            self._inflight += 1
+            ok = True
+            try:
+                await self._handler(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                ok = False
+                log_json(
+                    logging.ERROR,
+                    "update_worker_error",
+                    update_id=payload.get("update_id"),
+                    error=f"{type(e).__name__}: {e}",
+                )
+            finally:
+                self._inflight -= 1
+                UPDATE_QUEUE_PROCESSED.labels(ok=str(ok).lower()).inc()
+                if dq:
+                    # back of the line so one busy chat cannot starve the others
+                    self._schedule(key)
+                else:
+                    del self._pending[key]
+
+
+def from_env(handler: Callable[[Dict[str, Any]], Awaitable[None]]) -> Optional[UpdateQueue]:
+    # UPDATE_QUEUE_WORKERS = concurrent handlers inside this process. Per-chat ordering holds only
+    # within one process: under `uvicorn --workers N` (or several replicas) Telegram's requests are
+    # spread across processes, so two updates of one chat can run at the same time.
+    workers = int(os.getenv("UPDATE_QUEUE_WORKERS", "8"))
+    if workers <= 0:
+        return None
+    return UpdateQueue(
+        handler,
+        workers=workers,
+        maxsize=int(os.getenv("UPDATE_QUEUE_MAXSIZE", "1000")),
+        priority_maxsize=int(os.getenv("UPDATE_QUEUE_PRIORITY_MAXSIZE", "100")),
+    )
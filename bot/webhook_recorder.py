@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from bot.telemetry import log_json
+
+logger = logging.getLogger("guardian_recorder")
+
+# Dropped outright: names, contact data, links.
+_PII_KEYS = {
+    "first_name", "last_name", "username", "phone_number", "email", "bio",
+    "title", "invite_link", "url", "vcard", "language_code",
+}
+# Integer identities replaced by a stable salted hash (same user -> same fake id).
+_ID_KEYS = {"id", "user_id", "chat_id"}
+_TEXT_KEYS = {"text", "caption"}
+
+
+def _fake_id(value: int, salt: str) -> int:
+    h = int.from_bytes(hashlib.sha256(f"{salt}:{value}".encode()).digest()[:6], "big") % 10**10 + 1
+    return -h if value < 0 else h
+
+
+def _mask_text(text: str) -> str:
+    # keep /command and numeric args (amounts, ids) so replays hit the same code paths; every
+    # other token keeps its length in UTF-16 units (what Telegram entity offsets count), so an
+    # emoji outside the BMP becomes "xx"
+    out = []
+    for i, tok in enumerate(text.split(" ")):
+        if (i == 0 and tok.startswith("/")) or tok.isdigit():
+            out.append(tok)
+        else:
+            out.append("".join("xx" if ord(c) > 0xFFFF else "x" for c in tok))
+    return " ".join(out)
+
+
+def anonymize(obj: Any, salt: str) -> Any:
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            if k in _PII_KEYS:
+                continue
+            if k in _ID_KEYS and isinstance(v, int) and not isinstance(v, bool):
+                out[k] = _fake_id(v, salt)
+            elif k in _TEXT_KEYS and isinstance(v, str):
+                out[k] = _mask_text(v)
+            else:
+                out[k] = anonymize(v, salt)
+        return out
+    if isinstance(obj, list):
+        return [anonymize(x, salt) for x in obj]
+    return obj
+
+
+class WebhookRecorder:
+    """Appends a sample of anonymized webhook payloads to a JSONL file for tools/replay_webhook.py.
+
+    The webhook handler only enqueues; a daemon thread anonymizes and writes, so file I/O never
+    runs on the event loop. When the writer falls behind by max_pending samples, new ones are dropped.
+    """
+
+    def __init__(self, path: str, sample: float = 0.1, salt: str = "", max_pending: int = 10000):
+        self.path = path
+        self.sample = max(0.0, min(1.0, float(sample)))
+        self.salt = salt
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+
+    def maybe_record(self, payload: Dict[str, Any]) -> None:
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((round(time.time(), 3), payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_writer(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="webhook-recorder", daemon=True)
+                self._thread.start()
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                ts, payload = item
+                line = json.dumps({"ts": ts, "payload": anonymize(payload, self.salt)}, ensure_ascii=False, separators=(",", ":"))
+                # one short append per sampled update; O_APPEND keeps lines whole across workers
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                self.recorded += 1
+            except Exception as e:
+                log_json(logging.WARNING, "webhook_record_failed", path=self.path, error=f"{type(e).__name__}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        # blocks until every enqueued sample is written (tests, shutdown)
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def from_env() -> Optional[WebhookRecorder]:
+    path = os.getenv("WEBHOOK_RECORD_PATH")
+    if not path:
+        return None
+    # default salt is stable per bot so all workers map the same user to the same fake id
+    salt = os.getenv("WEBHOOK_RECORD_SALT") or hashlib.sha256((os.getenv("TELEGRAM_TOKEN") or "").encode()).hexdigest()
+    rec = WebhookRecorder(path, sample=float(os.getenv("WEBHOOK_RECORD_SAMPLE", "0.1")), salt=salt)
+    logger.info("webhook recorder enabled (path=%s sample=%.3f)", rec.path, rec.sample)
+    return rec
@@ -0,0 +1,59 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from bot import infrastructure
+
+# Webhook-reply mode: Telegram accepts one Bot API call as the webhook response body,
+# so simple commands can answer without an outbound sendMessage round trip.
+# The trade-off: Telegram never reports whether that call failed.
+ENABLED = os.getenv("WEBHOOK_REPLY", "0").lower() in ("1", "true", "yes", "on")
+COMMANDS = frozenset(
+    c.strip().lower()
+    for c in os.getenv("WEBHOOK_REPLY_COMMANDS", "health,whoami,donate,menu,healthz").split(",")
+    if c.strip()
+)
+
+_SLOT: ContextVar[Optional[Dict[str, Any]]] = ContextVar("webhook_reply_slot", default=None)
+
+
+def wants(command: Optional[str]) -> bool:
+    return ENABLED and command is not None and command in COMMANDS
+
+
+@contextmanager
+def capture() -> Iterator[Dict[str, Any]]:
+    # handlers awaited inside this block may park their single reply in the yielded dict
+    slot: Dict[str, Any] = {}
+    token = _SLOT.set(slot)
+    try:
+        yield slot
+    finally:
+        _SLOT.reset(token)
+
+
+async def reply_text(update, text: str, parse_mode: Optional[str] = None):
+    msg = update.effective_message
+    if msg is None:
+        # e.g. an inline callback query without its message: nothing to reply to, send to the chat
+        chat = update.effective_chat
+        if chat is None:
+            return None
+        return await update.get_bot().send_message(chat_id=chat.id, text=text, parse_mode=parse_mode)
+    slot = _SLOT.get()
+    if slot is None or slot:
+        return await msg.reply_text(text, parse_mode=parse_mode)
+
+    # the reply leaves with the HTTP response: commit first, as for any other Bot API call
+    await infrastructure.commit_unit_of_work()
+    # same shape Message.reply_text would send
+    body: Dict[str, Any] = {"method": "sendMessage", "chat_id": msg.chat_id, "text": text}
+    if parse_mode:
+        body["parse_mode"] = parse_mode
+    if msg.chat.type != "private":
+        body["reply_parameters"] = {"message_id": msg.message_id}
+    if msg.is_topic_message and msg.message_thread_id:
+        body["message_thread_id"] = msg.message_thread_id
+    slot.update(body)
+    return None
@@ -33,17 +33,25 @@ def run_migrations_offline() -> None:
     with context.begin_transaction():
         context.run_migrations()
 
+def _run_with(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        compare_type=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
 def run_migrations_online() -> None:
+    # bot.infrastructure hands over its advisory-locked connection
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_with(connection)
+        return
     url = get_url()
     connectable = create_engine(url, poolclass=pool.NullPool)
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-            compare_type=True,
-        )
-        with context.begin_transaction():
-            context.run_migrations()
+        _run_with(connection)
 
 if context.is_offline_mode():
     run_migrations_offline()
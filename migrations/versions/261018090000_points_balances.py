@@ -0,0 +1,56 @@
+"""points balances
+
+Revision ID: 261018090000
+Revises: 260225142333
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "261018090000"
+down_revision = "260225142333"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "points_balances",
+        sa.Column("user_id", sa.BigInteger, primary_key=True),
+        sa.Column("balance", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+    # Statement-level trigger: one upsert per user per INSERT statement, in the inserting
+    # transaction. Rows are applied in user_id order so bulk inserts lock balances consistently.
+    op.execute(
+        """
+        CREATE FUNCTION points_balances_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO points_balances(user_id, balance, updated_at)
+            SELECT user_id, SUM(delta), now() FROM new_rows GROUP BY user_id ORDER BY user_id
+            ON CONFLICT (user_id)
+            DO UPDATE SET balance = points_balances.balance + EXCLUDED.balance, updated_at = EXCLUDED.updated_at;
+            RETURN NULL;
+        END
+        $$;
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER trg_points_balances AFTER INSERT ON points_ledger "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION points_balances_apply();"
+    )
+
+    # CREATE TRIGGER holds off concurrent ledger inserts until this transaction commits,
+    # so the backfill and the trigger never double-count a row.
+    op.execute(
+        "INSERT INTO points_balances(user_id,balance) "
+        "SELECT user_id, SUM(delta) FROM points_ledger GROUP BY user_id;"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_points_balances ON points_ledger;")
+    op.execute("DROP FUNCTION IF EXISTS points_balances_apply();")
+    op.drop_table("points_balances")
@@ -0,0 +1,28 @@
+"""points ledger bulk ref unique index
+
+Revision ID: 261018100000
+Revises: 261018090000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "261018100000"
+down_revision = "261018090000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # add_points_many credits a (ref, user_id) pair once; bulk refs are "bulk:<csv ref>"
+    op.create_index(
+        "ux_points_ledger_bulk_ref",
+        "points_ledger",
+        ["ref", "user_id"],
+        unique=True,
+        postgresql_where=sa.text("ref LIKE 'bulk:%'"),
+    )
+
+
+def downgrade():
+    op.drop_index("ux_points_ledger_bulk_ref", table_name="points_ledger")
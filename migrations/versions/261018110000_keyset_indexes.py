@@ -0,0 +1,37 @@
+"""keyset pagination indexes
+
+Revision ID: 261018110000
+Revises: 261018100000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "261018110000"
+down_revision = "261018100000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # /pending pages: only pending rows, in (created_at, id) order
+    op.create_index(
+        "ix_payment_requests_pending",
+        "payment_requests",
+        ["created_at", "id"],
+        unique=False,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+    # per-user history pages: id breaks created_at ties so the keyset condition stays an index range
+    op.drop_index("ix_payment_requests_user", table_name="payment_requests")
+    op.create_index("ix_payment_requests_user", "payment_requests", ["user_id", "created_at", "id"], unique=False)
+    op.drop_index("ix_accounts_user", table_name="accounts")
+    op.create_index("ix_accounts_user", "accounts", ["user_id", "created_at", "id"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_accounts_user", table_name="accounts")
+    op.create_index("ix_accounts_user", "accounts", ["user_id", "created_at"], unique=False)
+    op.drop_index("ix_payment_requests_user", table_name="payment_requests")
+    op.create_index("ix_payment_requests_user", "payment_requests", ["user_id", "created_at"], unique=False)
+    op.drop_index("ix_payment_requests_pending", table_name="payment_requests")
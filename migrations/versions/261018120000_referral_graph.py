@@ -0,0 +1,133 @@
+"""referral graph
+
+Revision ID: 261018120000
+Revises: 261018110000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "261018120000"
+down_revision = "261018110000"
+branch_labels = None
+depends_on = None
+
+# keep in sync with bot.economy_store.REFERRAL_MAX_DEPTH / REFERRAL_LOCK
+MAX_DEPTH = 10
+REFERRAL_LOCK = 7_246_010_226
+
+
+def upgrade():
+    # Closure table of the referral tree (self rows omitted), capped at MAX_DEPTH levels.
+    op.create_table(
+        "referral_paths",
+        sa.Column("ancestor_id", sa.BigInteger, nullable=False),
+        sa.Column("descendant_id", sa.BigInteger, nullable=False),
+        sa.Column("depth", sa.SmallInteger, nullable=False),
+        sa.PrimaryKeyConstraint("ancestor_id", "descendant_id"),
+    )
+    # one tree parent per user, and the "ancestors of X" lookup used by multi-level bonuses
+    op.create_index(
+        "ux_referral_paths_parent", "referral_paths", ["descendant_id"], unique=True,
+        postgresql_where=sa.text("depth = 1"),
+    )
+    op.create_index("ix_referral_paths_descendant", "referral_paths", ["descendant_id", "depth"], unique=False)
+
+    # Cached counts: direct = depth-1 rows, total = all closure rows under the user.
+    op.create_table(
+        "referral_stats",
+        sa.Column("user_id", sa.BigInteger, primary_key=True),
+        sa.Column("direct_count", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("total_count", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_referral_stats_total", "referral_stats", [sa.text("total_count DESC"), "user_id"], unique=False)
+
+    # BEFORE INSERT row trigger on referrals: graph edits are serialized by an advisory lock; a second
+    # referrer for the same user, or an edge that would close a cycle (of any length: the closure
+    # only reaches MAX_DEPTH levels, so longer chains are walked in MAX_DEPTH hops), is dropped (not
+    # stored), so referrals only ever holds tree edges and the backfill below can rebuild the same tree.
+    # Chains may grow deeper than MAX_DEPTH; counts and bonuses only look MAX_DEPTH levels up.
+    op.execute(
+        f"""
+        CREATE FUNCTION referral_paths_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock({REFERRAL_LOCK});
+            IF NEW.referrer_id = NEW.referred_id
+               OR EXISTS (SELECT 1 FROM referral_paths WHERE descendant_id = NEW.referred_id AND depth = 1)
+               OR EXISTS (SELECT 1 FROM referral_paths WHERE ancestor_id = NEW.referred_id AND descendant_id = NEW.referrer_id)
+               -- beyond MAX_DEPTH: hop up the chain MAX_DEPTH levels at a time (one row per hop)
+               OR EXISTS (
+                   WITH RECURSIVE hop(u) AS (
+                       SELECT ancestor_id FROM referral_paths WHERE descendant_id = NEW.referrer_id AND depth = {MAX_DEPTH}
+                       UNION
+                       SELECT p.ancestor_id FROM hop JOIN referral_paths p ON p.descendant_id = hop.u AND p.depth = {MAX_DEPTH}
+                   )
+                   SELECT 1 FROM hop
+                   WHERE hop.u = NEW.referred_id
+                      OR EXISTS (SELECT 1 FROM referral_paths WHERE descendant_id = hop.u AND ancestor_id = NEW.referred_id)
+               ) THEN
+                RETURN NULL;
+            END IF;
+            WITH ins AS (
+                INSERT INTO referral_paths(ancestor_id, descendant_id, depth)
+                SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+                FROM (SELECT ancestor_id, depth FROM referral_paths WHERE descendant_id = NEW.referrer_id
+                      UNION ALL SELECT NEW.referrer_id, 0) a
+                CROSS JOIN (SELECT descendant_id, depth FROM referral_paths WHERE ancestor_id = NEW.referred_id
+                      UNION ALL SELECT NEW.referred_id, 0) d
+                WHERE a.depth + d.depth + 1 <= {MAX_DEPTH}
+                ON CONFLICT DO NOTHING
+                RETURNING ancestor_id, depth
+            )
+            INSERT INTO referral_stats(user_id, direct_count, total_count, updated_at)
+            SELECT ancestor_id, count(*) FILTER (WHERE depth = 1), count(*), now()
+            FROM ins GROUP BY ancestor_id ORDER BY ancestor_id
+            ON CONFLICT (user_id) DO UPDATE SET
+                direct_count = referral_stats.direct_count + EXCLUDED.direct_count,
+                total_count = referral_stats.total_count + EXCLUDED.total_count,
+                updated_at = EXCLUDED.updated_at;
+            RETURN NEW;
+        END
+        $$;
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER trg_referral_paths BEFORE INSERT ON referrals "
+        "FOR EACH ROW EXECUTE FUNCTION referral_paths_apply();"
+    )
+
+    # Backfill from existing rows: earliest referrer wins, cycles are cut.
+    op.execute(
+        f"""
+        WITH RECURSIVE parent AS (
+            SELECT DISTINCT ON (referred_id) referrer_id, referred_id
+            FROM referrals WHERE referrer_id <> referred_id
+            ORDER BY referred_id, created_at, referrer_id
+        ),
+        walk(ancestor_id, descendant_id, depth, path) AS (
+            SELECT referrer_id, referred_id, 1, ARRAY[referred_id, referrer_id] FROM parent
+            UNION ALL
+            SELECT p.referrer_id, w.descendant_id, w.depth + 1, w.path || p.referrer_id
+            FROM walk w JOIN parent p ON p.referred_id = w.ancestor_id
+            WHERE w.depth < {MAX_DEPTH} AND NOT p.referrer_id = ANY(w.path)
+        )
+        INSERT INTO referral_paths(ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM walk
+        ON CONFLICT DO NOTHING;
+        """
+    )
+    op.execute(
+        "INSERT INTO referral_stats(user_id, direct_count, total_count) "
+        "SELECT ancestor_id, count(*) FILTER (WHERE depth = 1), count(*) FROM referral_paths GROUP BY ancestor_id;"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_referral_paths ON referrals;")
+    op.execute("DROP FUNCTION IF EXISTS referral_paths_apply();")
+    op.drop_index("ix_referral_stats_total", table_name="referral_stats")
+    op.drop_table("referral_stats")
+    op.drop_index("ix_referral_paths_descendant", table_name="referral_paths")
+    op.drop_index("ux_referral_paths_parent", table_name="referral_paths")
+    op.drop_table("referral_paths")
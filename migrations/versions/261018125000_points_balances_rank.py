@@ -0,0 +1,25 @@
+"""points balances rank index
+
+Revision ID: 261018125000
+Revises: 261018120000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "261018125000"
+down_revision = "261018120000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # leaderboard fallbacks without Redis: /top reads the first rows in this order, rank() counts
+    # the balances above one user with an index range
+    op.create_index(
+        "ix_points_balances_rank", "points_balances", [sa.text("balance DESC"), "user_id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index("ix_points_balances_rank", table_name="points_balances")
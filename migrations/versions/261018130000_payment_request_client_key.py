@@ -0,0 +1,30 @@
+"""payment request client key
+
+Revision ID: 261018130000
+Revises: 261018125000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "261018130000"
+down_revision = "261018125000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # idempotency key of the message that created the request ("tg:<chat_id>:<message_id>")
+    op.add_column("payment_requests", sa.Column("client_key", sa.String(64), nullable=True))
+    op.create_index(
+        "ux_payment_requests_client_key",
+        "payment_requests",
+        ["user_id", "client_key"],
+        unique=True,
+        postgresql_where=sa.text("client_key IS NOT NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ux_payment_requests_client_key", table_name="payment_requests")
+    op.drop_column("payment_requests", "client_key")
@@ -0,0 +1,38 @@
+"""payment requests notify
+
+Revision ID: 261018140000
+Revises: 261018130000
+"""
+
+from alembic import op
+
+revision = "261018140000"
+down_revision = "261018130000"
+branch_labels = None
+depends_on = None
+
+# keep in sync with bot.admin_inbox.CHANNEL
+CHANNEL = "payment_requests_new"
+
+
+def upgrade():
+    # NOTIFY is transactional: listeners hear about a request only once its insert has committed.
+    op.execute(
+        f"""
+        CREATE FUNCTION payment_requests_notify() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify('{CHANNEL}', NEW.id::text);
+            RETURN NULL;
+        END
+        $$;
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER trg_payment_requests_notify AFTER INSERT ON payment_requests "
+        "FOR EACH ROW WHEN (NEW.status = 'pending') EXECUTE FUNCTION payment_requests_notify();"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_payment_requests_notify ON payment_requests;")
+    op.execute("DROP FUNCTION IF EXISTS payment_requests_notify();")
@@ -0,0 +1,47 @@
+import asyncio
+
+from bot.admin_inbox import DigestBatcher, format_digest, send_bounded
+
+
+def test_batcher_flushes_one_deduplicated_batch_per_window():
+    flushed = []
+
+    async def flush(ids, dropped):
+        flushed.append((ids, dropped))
+
+    async def run():
+        b = DigestBatcher(flush, window_s=0.05, max_ids=3)
+        task = asyncio.create_task(b.run())
+        for i in (1, 2, 1, 3, 4, 5):
+            b.add(i)
+        await asyncio.sleep(0.1)
+        b.add(6)
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert flushed == [([1, 2, 3], 2), ([6], 0)]
+
+
+def test_digest_caps_lines_and_counts_the_rest():
+    rows = [{"id": i, "user_id": 7, "kind": "buy_token", "amount": 5, "currency": "SELHA", "tx_ref": None} for i in range(3)]
+    text_ = format_digest(rows, more=4, max_lines=2)
+    assert text_.splitlines()[0] == "NEW REQUESTS (7)"
+    assert "#2 " not in text_
+    assert "... and 5 more" in text_
+
+
+def test_send_bounded_limits_concurrency_and_survives_failures():
+    inflight, peak = [0], [0]
+
+    async def send(chat_id):
+        inflight[0] += 1
+        peak[0] = max(peak[0], inflight[0])
+        await asyncio.sleep(0.01)
+        inflight[0] -= 1
+        if chat_id == 3:
+            raise RuntimeError("blocked")
+
+    sent = asyncio.run(send_bounded(send, [1, 2, 3, 4, 5, 1], concurrency=2))
+    assert sent == 4
+    assert peak[0] == 2
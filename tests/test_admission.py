@@ -0,0 +1,28 @@
+from bot.admission import Admission, sender_of
+
+ADMIN = 42
+
+
+def test_lane_comes_from_the_sender_not_the_command():
+    a = Admission(privileged=[ADMIN])
+    assert a.admit("my", ADMIN) == (True, "priority")
+    assert a.admit("status", 7) == (True, "user")  # admin command, ordinary sender
+    assert a.admit("status", None) == (True, "user")
+    assert sender_of({"update_id": 1, "message": {"from": {"id": 7}, "chat": {"id": 7}}}) == 7
+    assert sender_of({"update_id": 2, "callback_query": {"from": {"id": ADMIN}}}) == ADMIN
+    assert sender_of({"update_id": 3}) is None
+
+
+def test_user_commands_shed_on_inflight_and_latency():
+    a = Admission(max_inflight=8, max_latency_ms=100, privileged=[ADMIN])
+    for _ in range(8):
+        assert a.admit("my", 7)[0]
+    assert a.admit("my", 7) == (False, "user")
+    assert a.admit("status", 7) == (False, "user")
+    assert a.admit("status", ADMIN) == (True, "priority")
+
+    for _ in range(8):
+        a.finished(0.5)  # 500 ms each
+    assert a.inflight == 1 and a.latency_ms > 100
+    assert a.admit("my", 7)[0]  # below the busy floor latency does not shed
+    assert not a.admit("my", 7)[0]
@@ -0,0 +1,86 @@
+import asyncio
+
+from bot import infrastructure
+from bot.cache import VersionedCache
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.kv = {}
+
+    async def get(self, key):
+        return self.kv.get(key)
+
+    async def incr(self, key):
+        self.kv[key] = int(self.kv.get(key, 0)) + 1
+        return self.kv[key]
+
+
+def _loader(calls):
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    return load
+
+
+def test_hits_memory_and_coalesces_concurrent_misses(monkeypatch):
+    monkeypatch.setattr(infrastructure, "redis_client", _FakeRedis())
+    calls = []
+
+    async def run():
+        c = VersionedCache("t", _loader(calls), ttl_s=60, check_s=60)
+        assert await asyncio.gather(*(c.get() for _ in range(10))) == [1] * 10
+        assert await c.get() == 1
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_version_bump_from_another_replica_reloads(monkeypatch):
+    monkeypatch.setattr(infrastructure, "redis_client", _FakeRedis())
+    calls = []
+
+    async def run():
+        a = VersionedCache("t", _loader(calls), ttl_s=60, check_s=0)
+        b = VersionedCache("t", _loader(calls), ttl_s=60, check_s=0)
+        assert await a.get() == 1
+        assert await b.get() == 2
+        assert await a.get() == 1  # same version: served from memory
+        await b.invalidate()
+        assert await a.get() == 3
+
+    asyncio.run(run())
+
+
+def test_load_racing_an_invalidate_is_not_cached_without_redis(monkeypatch):
+    monkeypatch.setattr(infrastructure, "redis_client", None)
+    calls = []
+
+    async def run():
+        c = VersionedCache("t", _loader(calls), ttl_s=60, check_s=60)
+        first = asyncio.ensure_future(c.get())
+        await asyncio.sleep(0)  # the load is on the wire
+        await c.invalidate()
+        assert await first == 1  # its caller still gets an answer
+        assert await c.get() == 2  # but the next read reloads
+
+    asyncio.run(run())
+
+
+def test_after_commit_waits_for_the_unit_of_work(monkeypatch):
+    monkeypatch.setattr(infrastructure, "SessionLocal", None)
+    seen = []
+
+    async def hook():
+        seen.append("hook")
+
+    async def run():
+        async with infrastructure.unit_of_work():
+            await infrastructure.after_commit(hook)
+            seen.append("body")
+        await infrastructure.after_commit(hook)
+
+    asyncio.run(run())
+    assert seen == ["body", "hook", "hook"]
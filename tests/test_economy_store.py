@@ -0,0 +1,178 @@
+import asyncio
+import os
+import random
+
+import pytest
+from sqlalchemy import text
+
+from bot import economy_store as store
+from bot import infrastructure
+
+# Store paths against a real, migrated Postgres (DATABASE_URL). Every test runs inside one unit of
+# work that is rolled back at the end, so nothing is left behind.
+pytestmark = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="needs DATABASE_URL (migrated Postgres)")
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _in_rolled_back_uow(fn):
+    async def main():
+        os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:1/0")
+        await infrastructure.init_infrastructure(wait=False)
+        infrastructure.redis_client = None  # DB only: cache/leaderboard hooks never run on rollback
+        try:
+            async with infrastructure.engine.connect() as c:
+                if (await c.execute(text("SELECT to_regclass('referral_paths')"))).scalar() is None:
+                    pytest.skip("database not migrated")
+            with pytest.raises(_Rollback):
+                async with infrastructure.unit_of_work():
+                    await fn()
+                    raise _Rollback
+        finally:
+            await infrastructure.engine.dispose()
+
+    asyncio.run(main())
+
+
+def _uid() -> int:
+    # well away from real Telegram ids; rows are rolled back anyway
+    return random.randrange(9 * 10**14, 10**15)
+
+
+def test_approve_awards_points_once_and_pays_the_referrer():
+    async def run():
+        referrer, user, admin = _uid(), _uid(), _uid()
+        assert await store.upsert_referral(referrer, user)
+        req_id, _ = await store.create_payment_request(user, "buy", 200)
+
+        first = await store.approve_request(req_id, admin)
+        again = await store.approve_request(req_id, admin)
+
+        assert first["outcome"] == "approved" and first["amount"] == 200
+        assert first["referrer_id"] == referrer and first["bonus"] == 10  # REF_BONUS_LEVELS default "5"
+        assert again == {"outcome": "not_pending", "status": "approved"}
+        assert await store.get_points_balance(user) == 200
+        assert await store.get_points_balance(referrer) == 10
+        assert (await store.approve_request(-1, admin))["outcome"] == "not_found"
+
+    _in_rolled_back_uow(run)
+
+
+def test_dashboard_and_keyset_pages_cover_every_request_once():
+    async def run():
+        referrer, user = _uid(), _uid()
+        empty = await store.get_my_dashboard(user)
+        assert empty == {"balance": 0, "invited": 0, "referrer_id": None, "requests": []}
+
+        await store.upsert_referral(referrer, user)
+        await store.add_points(user, 7, "test")
+        # one transaction: every row shares created_at, so the id tie-break carries the order
+        ids = [(await store.create_payment_request(user, "buy", 10 + i))[0] for i in range(7)]
+        newest_first = sorted(ids, reverse=True)
+
+        dash = await store.get_my_dashboard(user, limit=3)
+        assert (dash["balance"], dash["referrer_id"]) == (7, referrer)
+        assert [r["id"] for r in dash["requests"]] == newest_first[:3]
+        assert (await store.get_my_dashboard(referrer))["invited"] == 1
+
+        # "Next" from the dashboard continues with list_user_requests, page by page
+        seen, cursor = [r["id"] for r in dash["requests"]], dash["requests"][-1]["cursor"]
+        while cursor:
+            page = await store.list_user_requests(user, limit=3, after=cursor)
+            seen += [r["id"] for r in page]
+            cursor = page[-1]["cursor"] if len(page) == 3 else None
+        assert seen == newest_first
+
+    _in_rolled_back_uow(run)
+
+
+def test_referral_tree_keeps_first_referrer_drops_cycles_and_pays_up_the_closure(monkeypatch):
+    monkeypatch.setattr(store, "REF_BONUS_LEVELS", [10, 5])
+
+    async def run():
+        a, b, c, d, other = (_uid() for _ in range(5))
+        assert await store.upsert_referral(a, b)
+        assert await store.upsert_referral(b, c)
+        assert await store.upsert_referral(c, d)
+        assert not await store.upsert_referral(other, b)  # b already has a referrer
+        assert not await store.upsert_referral(d, a)  # would close a cycle
+        assert not await store.upsert_referral(a, a)
+
+        assert await store.get_referrer(c) == b
+        assert await store.get_referral_stats(a) == {"direct": 1, "total": 3}
+        assert await store.get_referral_stats(c) == {"direct": 1, "total": 1}
+        assert await store.get_referral_stats(other) == {"direct": 0, "total": 0}
+
+        req_id, _ = await store.create_payment_request(d, "buy", 100)
+        out = await store.approve_request(req_id, _uid())
+        assert [(x["user_id"], x["delta"], x["level"]) for x in out["bonuses"]] == [(c, 10, 1), (b, 5, 2)]
+
+    _in_rolled_back_uow(run)
+
+
+def test_create_payment_request_is_idempotent_per_user_and_client_key():
+    async def run():
+        user, other = _uid(), _uid()
+        first = await store.create_payment_request(user, "buy", 50, client_key="upd:1")
+        replay = await store.create_payment_request(user, "buy", 999, client_key="upd:1")
+        assert first[1] is True and replay == (first[0], False)
+
+        assert (await store.create_payment_request(user, "buy", 50, client_key="upd:2"))[1] is True
+        # the key is scoped to the user; no key means no dedup
+        assert (await store.create_payment_request(other, "buy", 50, client_key="upd:1"))[1] is True
+        plain = [await store.create_payment_request(user, "buy", 50) for _ in range(2)]
+        assert all(created for _, created in plain) and plain[0][0] != plain[1][0]
+
+        async for s in infrastructure.get_db_session():
+            n = (await s.execute(text("SELECT count(*) FROM payment_requests WHERE user_id=:u"), {"u": user})).scalar()
+        assert n == 4
+
+    _in_rolled_back_uow(run)
+
+
+def test_bulk_decide_rejects_too_many_ids_and_reports_ids_cut_by_the_limit():
+    async def run():
+        user, admin = _uid(), _uid()
+        a, b, c = [(await store.create_payment_request(user, "buy", 10))[0] for _ in range(3)]
+
+        with pytest.raises(ValueError, match="At most 2 ids"):
+            await store.approve_requests(admin, ids=[a, b, c], limit=2)
+
+        # the range fills the batch first (id order), so the explicit id is left pending
+        out = await store.reject_requests(admin, ids=[c], ranges=[(a, b)], limit=2)
+        assert [(o["id"], o["outcome"]) for o in out] == [(a, "rejected"), (b, "rejected"), (c, "over_limit")]
+
+    _in_rolled_back_uow(run)
+
+
+def test_bulk_points_apply_once_and_do_not_collide_with_request_refs():
+    async def run():
+        user, other = _uid(), _uid()
+        req_id, _ = await store.create_payment_request(user, "buy", 5)
+        await store.approve_request(req_id, _uid())  # ledger ref = str(req_id)
+
+        rows = [(user, 10, "airdrop", str(req_id)), (other, 3, "airdrop", "drop1"), (other, 4, "airdrop", "drop1")]
+        first = await store.add_points_many(rows)
+        again = await store.add_points_many(rows)
+
+        assert (first["inserted"], first["skipped"], first["total_delta"]) == (2, 1, 13)
+        assert (again["inserted"], again["skipped"]) == (0, 3)
+        assert await store.get_points_balance(user) == 15 and await store.get_points_balance(other) == 3
+
+    _in_rolled_back_uow(run)
+
+
+def test_cycles_longer_than_the_closure_depth_are_dropped():
+    async def run():
+        chain = [_uid() for _ in range(2 * store.REFERRAL_MAX_DEPTH + 3)]
+        for parent, child in zip(chain, chain[1:]):
+            assert await store.upsert_referral(parent, child)
+        assert not await store.upsert_referral(chain[-1], chain[0])  # would close a 23-edge cycle
+        assert not await store.upsert_referral(chain[-1], chain[5])
+        assert await store.get_referrer(chain[0]) is None
+        # counts stop at REFERRAL_MAX_DEPTH levels
+        assert await store.get_referral_stats(chain[0]) == {"direct": 1, "total": store.REFERRAL_MAX_DEPTH}
+
+    _in_rolled_back_uow(run)
@@ -0,0 +1,70 @@
+import asyncio
+
+from bot import health_prober
+from bot.health_prober import Prober
+
+
+def test_concurrent_probes_are_coalesced_and_cached():
+    calls = []
+
+    async def check():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+    async def run():
+        p = Prober("db", check)
+        results = await asyncio.gather(*(p.get(max_age_s=60) for _ in range(50)))
+        assert len(calls) == 1 and all(r is results[0] for r in results)
+        await p.get(max_age_s=60)
+        assert len(calls) == 1
+        await p.get(max_age_s=0)
+        assert len(calls) == 2
+        return p.stats()
+
+    st = asyncio.run(run())
+    assert st["ok"] and st["samples"] == 2
+
+
+def test_failed_probe_is_reported():
+    async def check():
+        raise ConnectionError("down")
+
+    p = Prober("redis", check)
+    r = asyncio.run(p.probe())
+    assert not r.ok and "down" in r.error and not p.healthy
+
+
+def test_readiness_report_combines_startup_state_and_probes(monkeypatch):
+    from bot.readiness import FAILED, OK, Readiness
+
+    ready = Readiness()
+    ready.set("postgres", OK)
+    monkeypatch.setattr(health_prober, "READINESS", ready)
+    monkeypatch.setattr(health_prober, "PROBERS", {})
+    assert health_prober.readiness_report()["ok"]
+    ready.set("migrations", FAILED, "boom")
+    report = health_prober.readiness_report()
+    assert not report["ok"] and report["components"]["migrations"]["status"] == FAILED
+
+
+def test_a_failing_replica_probe_does_not_fail_readiness(monkeypatch):
+    from bot.readiness import OK, Readiness
+
+    async def down():
+        raise ConnectionError("replica down")
+
+    async def up():
+        pass
+
+    ready = Readiness()
+    ready.set("postgres", OK)
+    monkeypatch.setattr(health_prober, "READINESS", ready)
+    replica, primary = Prober("replica0", down, critical=False), Prober("postgres", up)
+    monkeypatch.setattr(health_prober, "PROBERS", {"postgres": primary, "replica0": replica})
+    asyncio.run(replica.probe())
+    report = health_prober.readiness_report()
+    assert report["ok"] and report["probes"]["replica0"]["ok"] is False
+
+    monkeypatch.setattr(primary, "_fn", down)
+    asyncio.run(primary.probe())
+    assert not health_prober.readiness_report()["ok"]
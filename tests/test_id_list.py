@@ -0,0 +1,13 @@
+import pytest
+
+from bot.id_list import parse_id_list
+
+
+def test_ids_and_ranges_with_mixed_separators():
+    assert parse_id_list(["12,15", "20-40", "7..9,", "15"]) == ([12, 15], [(20, 40), (7, 9)])
+
+
+def test_rejects_bad_tokens():
+    for args in (["12", "x"], ["9-3"], ["-4"]):
+        with pytest.raises(ValueError):
+            parse_id_list(args)
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from bot import ids, infrastructure
+from bot.ids import EPOCH_MS, SEQ_MASK, SnowflakeGenerator, WorkerLeaseError, fallback_worker, parse
+from bot.leader import RedisLock
+from bot.readiness import FAILED, OK, Readiness
+
+
+class _Clock:
+    def __init__(self, ms):
+        self.ms = ms
+
+    def __call__(self):
+        return self.ms
+
+
+def test_ids_are_unique_and_increasing_within_one_ms():
+    clock = _Clock(EPOCH_MS + 1000)
+    g = SnowflakeGenerator(worker=3, clock=clock)
+    out = [g.next_id() for _ in range(SEQ_MASK + 10)]  # overflows the sequence of a single ms
+    assert out == sorted(out) and len(set(out)) == len(out)
+    assert parse(out[0]) == (EPOCH_MS + 1000, 3, 0)
+    assert parse(out[-1])[0] == EPOCH_MS + 1001  # borrowed the next ms instead of spinning
+
+
+def test_clock_step_back_never_goes_below_last_id():
+    clock = _Clock(EPOCH_MS + 5000)
+    g = SnowflakeGenerator(worker=1, clock=clock)
+    a = g.next_id()
+    clock.ms -= 2000
+    b = g.next_id()
+    assert b > a and parse(b)[0] == EPOCH_MS + 5000
+
+
+def test_workers_do_not_collide_and_legacy_ids_sort_first():
+    clock = _Clock(1_772_000_000_000)  # Feb 2026, when the ms-timestamp keys were written
+    a = [SnowflakeGenerator(worker=w, clock=clock).next_id() for w in (0, 1, 1023)]
+    assert len(set(a)) == 3
+    assert min(a) > 1_800_000_000_000  # old ms-timestamp keys stay below every new id
+
+
+def test_next_ids_is_consecutive_and_continues_the_stream():
+    g = SnowflakeGenerator(worker=9, clock=_Clock(EPOCH_MS + 42))
+    block = g.next_ids(5000)
+    assert len(set(block)) == 5000 and block == sorted(block)
+    assert g.next_id() > block[-1]
+
+
+def test_fallback_worker_stays_out_of_the_leased_range():
+    assert 512 <= fallback_worker() <= 1023
+
+
+def test_no_worker_id_means_no_ids():
+    g = SnowflakeGenerator(worker=None, clock=_Clock(EPOCH_MS))
+    with pytest.raises(WorkerLeaseError):
+        g.next_id()
+    g.worker = 4
+    assert parse(g.next_ids(2)[0])[1] == 4
+
+
+@pytest.fixture
+def lease(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    ready = Readiness()
+    monkeypatch.setattr(infrastructure, "redis_client", fakeredis.FakeAsyncRedis())
+    monkeypatch.setattr(ids, "GENERATOR", SnowflakeGenerator(worker=None))
+    monkeypatch.setattr(ids, "READINESS", ready)
+    monkeypatch.setattr(ids, "_lock", None)
+    return ready
+
+
+def test_lease_is_used_after_a_grace_period_and_dropped_before_it_can_expire(lease, monkeypatch):
+    async def run():
+        task = asyncio.create_task(ids._lease_loop(ttl_s=0.8, renew_s=0.1))
+        await asyncio.sleep(0.05)
+        assert ids.GENERATOR.worker is None  # leased, but a flushed-out previous holder may still mint
+        await asyncio.sleep(0.15)
+        assert 0 <= ids.GENERATOR.worker < ids.LEASED_WORKERS and lease.ok("ids")
+
+        async def unreachable(self):
+            raise ConnectionError("redis down")
+
+        monkeypatch.setattr(RedisLock, "renew", unreachable)
+        monkeypatch.setattr(RedisLock, "acquire", unreachable)
+        await asyncio.sleep(0.4)
+        assert ids.GENERATOR.worker is not None  # still inside ttl - 2 * renew
+        await asyncio.sleep(0.4)
+        assert ids.GENERATOR.worker is None and lease.status("ids") == FAILED
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_lease_taken_over_after_a_redis_flush_stops_minting_at_the_next_renew(lease):
+    async def run():
+        task = asyncio.create_task(ids._lease_loop(ttl_s=60, renew_s=0.05))
+        await asyncio.sleep(0.15)
+        held = ids.GENERATOR.worker
+        assert held is not None
+        r = infrastructure.redis_client
+        await r.flushall()
+        await r.set(f"guardian:lock:idworker:{held}", "another-process")
+        await asyncio.sleep(0.07)
+        assert ids.GENERATOR.worker != held
+        await asyncio.sleep(0.1)
+        assert ids.GENERATOR.worker is not None and lease.ok("ids")  # a fresh slot, after its grace
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
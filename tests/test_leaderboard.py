@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from bot import infrastructure, leaderboard
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class _FakeResult:
+    def __init__(self, rows, during=None):
+        self._rows = rows
+        self._during = during
+
+    async def partitions(self, size):
+        for i in range(0, len(self._rows), size):
+            yield self._rows[i:i + size]
+            if self._during is not None:
+                # a writer commits while the snapshot is being streamed
+                await self._during()
+                self._during = None
+
+
+class _FakeEngine:
+    # engine.connect() -> conn.stream(...) over a fixed points_balances snapshot
+    def __init__(self, rows, during=None):
+        self._result = _FakeResult(rows, during)
+
+    def connect(self):
+        engine = self
+
+        class _Conn:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def stream(self, stmt):
+                return engine._result
+
+        return _Conn()
+
+
+@pytest.fixture
+def redis_(monkeypatch):
+    r = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(infrastructure, "redis_client", r)
+    return r
+
+
+def test_apply_top_and_rank(redis_):
+    async def run():
+        await leaderboard.apply({1: 10, 2: 30, 3: 20})
+        await leaderboard.apply({1: 25, 4: 0})  # zero deltas are skipped
+        return await leaderboard.top(2), await leaderboard.rank(1), await leaderboard.rank(4)
+
+    top, rank1, rank4 = asyncio.run(run())
+    assert top == [{"rank": 1, "user_id": 1, "points": 35}, {"rank": 2, "user_id": 2, "points": 30}]
+    assert rank1 == {"rank": 1, "points": 35}
+    assert rank4 is None
+
+
+def test_reads_fall_back_to_the_db_when_redis_fails(monkeypatch):
+    class _Broken:
+        async def zrevrange(self, *a, **kw):
+            raise ConnectionError("down")
+
+    async def db_top(limit):
+        return [{"rank": 1, "user_id": 9, "points": 1}]
+
+    monkeypatch.setattr(infrastructure, "redis_client", _Broken())
+    monkeypatch.setattr(leaderboard, "_db_top", db_top)
+    assert asyncio.run(leaderboard.top(5)) == [{"rank": 1, "user_id": 9, "points": 1}]
+
+
+def test_rebuild_replaces_the_set_and_keeps_deltas_applied_meanwhile(redis_, monkeypatch):
+    async def write_during_rebuild():
+        # committed after the snapshot was taken: must survive the swap
+        await leaderboard.apply({2: 5, 7: 1})
+
+    rows = [(1, 100), (2, 50), (3, 10)]
+    monkeypatch.setattr(infrastructure, "engine", _FakeEngine(rows, during=write_during_rebuild))
+
+    async def run():
+        await redis_.zadd(leaderboard.KEY, {99: 1000})  # stale member, not in points_balances
+        out = await leaderboard.rebuild(chunk=2)
+        members = await redis_.zrevrange(leaderboard.KEY, 0, -1, withscores=True)
+        leftovers = await redis_.exists(leaderboard.TMP_KEY, leaderboard.DELTA_KEY, leaderboard.REBUILD_LOCK_KEY)
+        return out, {int(u): int(p) for u, p in members}, leftovers
+
+    out, members, leftovers = asyncio.run(run())
+    assert out["users"] == 3 and out["size"] == 4
+    assert members == {1: 100, 2: 55, 3: 10, 7: 1}
+    assert leftovers == 0
+
+
+def test_rebuild_skips_while_another_worker_holds_the_lock(redis_, monkeypatch):
+    monkeypatch.setattr(infrastructure, "engine", _FakeEngine([(1, 1)]))
+
+    async def run():
+        await redis_.set(leaderboard.REBUILD_LOCK_KEY, "other-worker")
+        return await leaderboard.rebuild()
+
+    assert asyncio.run(run()) is None
+
+
+def test_an_empty_rebuild_is_remembered_so_workers_do_not_retry_it(redis_, monkeypatch):
+    monkeypatch.setattr(infrastructure, "engine", _FakeEngine([]))
+
+    async def run():
+        assert await leaderboard._needs_rebuild()  # fresh Redis
+        out = await leaderboard.rebuild()
+        after_empty = await leaderboard._needs_rebuild()
+        infrastructure.engine = _FakeEngine([(1, 5)])  # first points awarded
+        await leaderboard.rebuild()
+        await redis_.delete(leaderboard.KEY)  # evicted / lost
+        return out["size"], after_empty, await leaderboard._needs_rebuild()
+
+    size, after_empty, after_loss = asyncio.run(run())
+    assert size == 0 and not after_empty and after_loss
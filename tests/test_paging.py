@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+
+from bot.paging import decode_cursor, encode_cursor, split_page
+
+
+def test_cursor_round_trip_keeps_microseconds_and_big_ids():
+    ts = datetime(2026, 10, 18, 9, 30, 1, 123456, tzinfo=timezone.utc)
+    cur = encode_cursor(ts, 2**62 + 5)
+    assert decode_cursor(cur) == (ts, 2**62 + 5)
+    assert len("pg:pending:" + cur) <= 64
+
+
+def test_bad_cursor_means_first_page():
+    assert decode_cursor(None) is None
+    assert decode_cursor("not-a-cursor") is None
+    assert decode_cursor("zz.!!") is None
+
+
+def test_split_page_uses_the_last_shown_row_as_cursor():
+    items = [{"id": i, "cursor": f"c{i}"} for i in range(4)]
+    assert split_page(items, 3) == (items[:3], "c2")
+    assert split_page(items[:3], 3) == (items[:3], None)
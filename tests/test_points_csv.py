@@ -0,0 +1,13 @@
+from bot.points_csv import parse_points_csv
+
+
+def test_parses_rows_with_optional_header_and_reason():
+    entries, errors = parse_points_csv("user_id,delta,ref\n1,10,drop1\n2,-3,drop1,refund\n\n")
+    assert errors == []
+    assert entries == [(1, 10, "airdrop", "drop1"), (2, -3, "refund", "drop1")]
+
+
+def test_reports_bad_lines_by_number():
+    entries, errors = parse_points_csv("1,10,drop\nx,1,drop\n3,0,drop\n4,5\n5,1,\n")
+    assert entries == [(1, 10, "airdrop", "drop")]
+    assert [e.split(":")[0] for e in errors] == ["line 2", "line 3", "line 4", "line 5"]
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+import redis.asyncio as redis
+
+from bot import pools
+
+
+class _FakeConnection:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    async def connect(self):
+        pass
+
+    async def can_read_destructive(self):
+        return False
+
+    def should_reconnect(self):
+        return False
+
+    async def disconnect(self):
+        pass
+
+    async def re_auth(self):
+        pass
+
+
+def test_engine_kwargs_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_RECYCLE_S", "0")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "off")
+    monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "0")
+    kw = pools.engine_kwargs("replica0")
+    assert (kw["pool_size"], kw["max_overflow"], kw["pool_recycle"], kw["pool_pre_ping"]) == (20, 0, -1, False)
+    assert kw["connect_args"] == {"statement_cache_size": 0}
+    assert kw["poolclass"].pool_name == "replica0"
+
+
+def test_redis_pool_waits_for_a_free_connection_then_times_out():
+    async def run():
+        pool = pools.InstrumentedRedisPool(connection_class=_FakeConnection, max_connections=1, timeout=0.2)
+        first = await pool.get_connection()
+
+        async def release_soon():
+            await asyncio.sleep(0.05)
+            await pool.release(first)
+
+        releaser = asyncio.create_task(release_soon())
+        assert await pool.get_connection() is first  # waited, did not open a second connection
+        await releaser
+        with pytest.raises(redis.ConnectionError):
+            await pool.get_connection()
+
+    asyncio.run(run())
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from bot import infrastructure
+from bot.infrastructure import acting_as, note_write
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class _FakeSession:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.closed = False
+
+    async def connection(self):
+        if self.fail:
+            raise ConnectionRefusedError("replica down")
+
+    async def close(self):
+        self.closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+
+class _FakeReplica:
+    def __init__(self, name, healthy=True, fail=False):
+        self.name = name
+        self.healthy = healthy
+        self.fail = fail
+        self.sessions = []
+
+    def SessionLocal(self):
+        s = _FakeSession(self.name, self.fail)
+        self.sessions.append(s)
+        return s
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    async def primary_session():
+        yield "primary"
+
+    r = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(infrastructure, "redis_client", r)
+    monkeypatch.setattr(infrastructure, "get_db_session", primary_session)
+    monkeypatch.setattr(infrastructure, "replicas", [])
+    monkeypatch.setattr(infrastructure, "_sticky_until", {})
+    monkeypatch.setattr(infrastructure, "_next_prune", 0.0)
+    return r
+
+
+async def _read_target():
+    async for s in infrastructure.get_read_session():
+        return s if s == "primary" else s.name
+
+
+def test_pick_replica_round_robins_over_healthy_replicas_only(routing):
+    reps = [_FakeReplica("replica0"), _FakeReplica("replica1", healthy=False), _FakeReplica("replica2")]
+    infrastructure.replicas[:] = reps
+    picked = {infrastructure._pick_replica().name for _ in range(6)}
+    assert picked == {"replica0", "replica2"}
+
+    for r in reps:
+        r.healthy = False
+    assert infrastructure._pick_replica() is None
+
+
+def test_reads_route_to_the_primary_without_healthy_replicas(routing):
+    assert asyncio.run(_read_target()) == "primary"  # no replicas configured
+    infrastructure.replicas[:] = [_FakeReplica("replica0", healthy=False)]
+    assert asyncio.run(_read_target()) == "primary"
+    infrastructure.replicas[0].healthy = True
+    assert asyncio.run(_read_target()) == "replica0"
+
+
+def test_own_write_keeps_reads_on_the_primary_on_every_worker(routing):
+    infrastructure.replicas[:] = [_FakeReplica("replica0")]
+
+    async def update(user_id, write=False):
+        with acting_as(user_id):
+            before = await _read_target()
+            if write:
+                await note_write()
+            return before, await _read_target()
+
+    async def run():
+        assert await update(5, write=True) == ("replica0", "primary")
+        assert await update(5) == ("primary", "primary")
+        assert await update(6) == ("replica0", "replica0")
+        infrastructure._sticky_until.clear()  # the next update lands on another worker
+        assert await update(5) == ("primary", "primary")
+        assert await routing.pttl(infrastructure._sticky_key(5)) > 0
+
+    asyncio.run(run())
+
+
+def test_redis_is_asked_once_per_update(routing):
+    infrastructure.replicas[:] = [_FakeReplica("replica0")]
+
+    async def run():
+        with acting_as(7):
+            assert await _read_target() == "replica0"
+            await routing.set(infrastructure._sticky_key(7), 1)  # another worker writes meanwhile
+            assert await _read_target() == "replica0"  # verdict memoized for this update
+        with acting_as(7):
+            assert await _read_target() == "primary"
+
+    asyncio.run(run())
+
+
+def test_failed_replica_checkout_falls_back_to_the_primary(routing):
+    bad, good = _FakeReplica("replica0", fail=True), _FakeReplica("replica1")
+    infrastructure.replicas[:] = [bad, good]
+
+    async def run():
+        return [await _read_target() for _ in range(4)]
+
+    targets = asyncio.run(run())
+    assert "primary" in targets and set(targets) <= {"primary", "replica1"}
+    assert not bad.healthy and len(bad.sessions) == 1 and bad.sessions[0].closed
+    assert all(s.closed for s in good.sessions)
+
+
+def test_expired_sticky_entries_are_pruned(routing):
+    infrastructure.replicas[:] = [_FakeReplica("replica0")]
+    infrastructure._sticky_until.update({1: 0.0, 2: 0.0})
+
+    async def run():
+        with acting_as(3):
+            await note_write()
+
+    asyncio.run(run())
+    assert set(infrastructure._sticky_until) == {3}
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot import infrastructure, server
+from bot.readiness import DISABLED, FAILED, OK, Readiness
+from bot.update_dedup import UpdateDeduper
+
+
+class _Request:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def body(self):
+        return self._body
+
+
+def _payload(update_id):
+    return b'{"update_id": %d, "message": {"message_id": 1, "chat": {"id": 5, "type": "private"}, "text": "/whoami"}}' % update_id
+
+
+def test_inline_failure_lets_telegram_retry_through(monkeypatch):
+    calls = []
+
+    async def failing(payload):
+        calls.append(payload["update_id"])
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(server, "ptb_app", SimpleNamespace())
+    monkeypatch.setattr(server, "update_queue", None)
+    monkeypatch.setattr(server, "update_filter", None)
+    monkeypatch.setattr(server, "webhook_recorder", None)
+    monkeypatch.setattr(server, "update_dedup", UpdateDeduper())
+    monkeypatch.setattr(server, "process_payload", failing)
+    ready = Readiness()
+    ready.set("migrations", OK)
+    ready.set("ids", OK)
+    monkeypatch.setattr(server, "READINESS", ready)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await server.tg_webhook(_Request(_payload(7)))
+        assert await server.tg_webhook(_Request(_payload(7))) == {"ok": True}
+
+    asyncio.run(run())
+    assert calls == [7, 7]
+
+
+def test_webhook_is_503_until_migrations_are_ok(monkeypatch):
+    async def never(payload):
+        raise AssertionError("must not be processed")
+
+    monkeypatch.setattr(server, "ptb_app", SimpleNamespace())
+    monkeypatch.setattr(server, "process_payload", never)
+    ready = Readiness()
+    monkeypatch.setattr(server, "READINESS", ready)
+
+    async def run():
+        pending = await server.tg_webhook(_Request(_payload(8)))
+        ready.set("migrations", FAILED, "boom")
+        failed = await server.tg_webhook(_Request(_payload(8)))
+        return pending, failed
+
+    for r in asyncio.run(run()):
+        assert r.status_code == 503 and r.headers["Retry-After"] == "5"
+
+
+def test_without_database_url_db_free_updates_still_get_through(monkeypatch):
+    processed = []
+
+    async def process(payload):
+        processed.append(payload["update_id"])
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(server, "ptb_app", SimpleNamespace())
+    monkeypatch.setattr(server, "update_queue", None)
+    monkeypatch.setattr(server, "update_filter", None)
+    monkeypatch.setattr(server, "webhook_recorder", None)
+    monkeypatch.setattr(server, "update_dedup", None)
+    monkeypatch.setattr(server, "process_payload", process)
+    ready = Readiness()
+    monkeypatch.setattr(server, "READINESS", ready)
+    monkeypatch.setattr(server.ids, "READINESS", ready)
+    monkeypatch.setattr(infrastructure, "redis_client", None)
+
+    async def run():
+        assert not await server._start_infra()
+        server.ids.start()  # no Redis: the static worker id
+        return await server.tg_webhook(_Request(_payload(9)))
+
+    assert asyncio.run(run()) == {"ok": True}
+    assert processed == [9]
+    assert {ready.status(n) for n in ("postgres", "redis", "migrations")} == {DISABLED} and ready.ready
+    assert ready.ok("ids")
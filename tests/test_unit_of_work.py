@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from bot import infrastructure
+
+
+class _FakeSession:
+    opened = []
+
+    def __init__(self):
+        self.calls = []
+        _FakeSession.opened.append(self)
+
+    async def execute(self, stmt, params=None):
+        if stmt == "FAIL":
+            raise RuntimeError("statement failed")
+        self.calls.append("execute")
+
+    async def commit(self):
+        self.calls.append("commit")
+
+    def in_transaction(self):
+        # open since the last statement that followed a commit/rollback
+        done = [i for i, c in enumerate(self.calls) if c in ("commit", "rollback")]
+        return "execute" in self.calls[(done[-1] + 1 if done else 0):]
+
+    def begin_nested(self):
+        calls = self.calls
+
+        class _Savepoint:
+            async def __aenter__(self):
+                calls.append("savepoint")
+
+            async def __aexit__(self, exc_type, exc, tb):
+                calls.append("release" if exc_type is None else "rollback_to_savepoint")
+                return False
+
+        return _Savepoint()
+
+    async def rollback(self):
+        self.calls.append("rollback")
+
+    async def close(self):
+        self.calls.append("close")
+
+
+async def _store_call():
+    async for s in infrastructure.get_db_session():
+        await s.execute("SELECT 1")
+        await s.commit()
+
+
+def test_store_calls_share_one_session_and_commit_once(monkeypatch):
+    monkeypatch.setattr(infrastructure, "SessionLocal", _FakeSession)
+    _FakeSession.opened = []
+
+    async def run():
+        async with infrastructure.unit_of_work():
+            for _ in range(5):
+                await _store_call()
+
+    asyncio.run(run())
+    assert len(_FakeSession.opened) == 1
+    assert _FakeSession.opened[0].calls == ["execute"] * 5 + ["commit", "close"]
+
+
+def test_error_rolls_back_and_untouched_unit_opens_nothing(monkeypatch):
+    monkeypatch.setattr(infrastructure, "SessionLocal", _FakeSession)
+    _FakeSession.opened = []
+
+    async def run():
+        async with infrastructure.unit_of_work():
+            pass
+        async with infrastructure.unit_of_work():
+            await _store_call()
+            raise ValueError("handler failed")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert len(_FakeSession.opened) == 1
+    assert _FakeSession.opened[0].calls == ["execute", "rollback", "close"]
+
+
+def test_commit_before_outbound_call_runs_hooks_and_keeps_the_unit(monkeypatch):
+    monkeypatch.setattr(infrastructure, "SessionLocal", _FakeSession)
+    _FakeSession.opened = []
+    hooks = []
+
+    async def hook():
+        hooks.append(len(_FakeSession.opened[0].calls))
+
+    async def run():
+        async with infrastructure.unit_of_work():
+            await _store_call()
+            await infrastructure.after_commit(hook)
+            await infrastructure.commit_unit_of_work()  # e.g. before reply_text
+            await infrastructure.commit_unit_of_work()  # nothing new: no-op
+            await _store_call()
+
+    asyncio.run(run())
+    assert _FakeSession.opened[0].calls == ["execute", "commit", "execute", "commit", "close"]
+    assert hooks == [2]  # ran once, right after the first commit
+
+
+def test_savepoint_contains_a_swallowed_failure(monkeypatch):
+    monkeypatch.setattr(infrastructure, "SessionLocal", _FakeSession)
+    _FakeSession.opened = []
+
+    async def failing_call():
+        async for s in infrastructure.get_db_session():
+            await s.execute("FAIL")
+
+    async def run():
+        async with infrastructure.unit_of_work():
+            try:
+                async with infrastructure.savepoint():
+                    await failing_call()
+            except RuntimeError:
+                pass
+            await _store_call()
+
+    asyncio.run(run())
+    assert _FakeSession.opened[0].calls == ["savepoint", "rollback_to_savepoint", "execute", "commit", "close"]
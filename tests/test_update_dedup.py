@@ -0,0 +1,45 @@
+import asyncio
+
+from bot import infrastructure
+from bot.update_dedup import UpdateDeduper
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.keys = set()
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return None
+        self.keys.add(key)
+        return True
+
+    async def delete(self, key):
+        self.keys.discard(key)
+
+
+def test_local_window_drops_repeats_and_evicts_oldest():
+    async def run():
+        d = UpdateDeduper(window=2)
+        assert not await d.is_duplicate(1)
+        assert await d.is_duplicate(1)
+        assert not await d.is_duplicate(2)
+        assert not await d.is_duplicate(3)  # evicts 1
+        assert not await d.is_duplicate(1)
+        assert not await d.is_duplicate(None)
+        assert not await d.is_duplicate(None)
+
+    asyncio.run(run())
+
+
+def test_redis_shared_between_replicas(monkeypatch):
+    monkeypatch.setattr(infrastructure, "redis_client", _FakeRedis())
+
+    async def run():
+        a, b = UpdateDeduper(), UpdateDeduper()
+        assert not await a.is_duplicate(42)
+        assert await b.is_duplicate(42)
+        await a.forget(42)
+        assert not await b.is_duplicate(42)
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+from bot.update_filter import UpdateFilter, command_of, update_type
+
+
+def _msg(text, entities=None, key="message"):
+    return {"update_id": 1, key: {"chat": {"id": 1}, "text": text, "entities": entities or []}}
+
+
+def _cmd(text, key="message"):
+    length = len(text.split()[0])
+    return _msg(text, [{"type": "bot_command", "offset": 0, "length": length}], key)
+
+
+def test_command_of_matches_command_handler_rules():
+    assert command_of(_cmd("/My@GuardianBot 5")) == "my"
+    assert command_of(_cmd("/buy 10", key="edited_message")) == "buy"
+    assert command_of(_msg("hello /my")) is None
+    assert command_of(_msg("x /my", [{"type": "bot_command", "offset": 2, "length": 3}])) is None
+    assert command_of({"update_id": 1, "channel_post": {"text": "/my"}}) is None
+
+
+def test_filter_drops_unhandled_and_passes_through_types():
+    f = UpdateFilter({"my", "buy"}, passthrough_types={"callback_query"})
+    assert f.wants(_cmd("/my"))
+    assert not f.wants(_cmd("/unknown"))
+    assert not f.wants(_msg("just chatting"))
+    assert not f.wants({"update_id": 2, "chat_member": {"chat": {"id": 1}}})
+    assert f.wants({"update_id": 3, "callback_query": {"id": "x", "data": "p"}})
+    assert update_type({"update_id": 4, "my_chat_member": {}}) == "my_chat_member"
@@ -0,0 +1,66 @@
+import asyncio
+
+from bot.update_queue import UpdateQueue, chat_key
+
+
+def _msg(update_id, chat_id):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": "/my"}}
+
+
+def test_chat_key_falls_back_to_sender():
+    assert chat_key(_msg(1, -100)) == -100
+    assert chat_key({"update_id": 2, "callback_query": {"from": {"id": 7}}}) == 7
+    assert chat_key({"update_id": 3}) == ("update", 3)
+
+
+def test_same_chat_is_ordered_other_chats_run_in_parallel():
+    seen = []
+
+    async def handler(payload):
+        chat = payload["message"]["chat"]["id"]
+        await asyncio.sleep(0.02 if chat == 1 else 0)
+        seen.append((chat, payload["update_id"]))
+
+    async def run():
+        q = UpdateQueue(handler, workers=4, maxsize=100)
+        q.start()
+        for i in range(5):
+            assert q.submit(_msg(i, 1))
+        assert q.submit(_msg(100, 2))
+        await q.stop()
+
+    asyncio.run(run())
+    assert [u for c, u in seen if c == 1] == [0, 1, 2, 3, 4]
+    # chat 2 is not stuck behind chat 1's slow handler
+    assert seen.index((2, 100)) < seen.index((1, 4))
+
+
+def test_submit_rejects_when_full():
+    async def run():
+        q = UpdateQueue(lambda p: asyncio.sleep(0), workers=1, maxsize=2)
+        assert q.submit(_msg(1, 1))
+        assert q.submit(_msg(2, 2))
+        assert not q.submit(_msg(3, 3))
+        assert q.depth == 2
+
+    asyncio.run(run())
+
+
+def test_priority_lane_overtakes_queued_user_updates():
+    seen = []
+
+    async def handler(payload):
+        seen.append(payload["update_id"])
+
+    async def run():
+        q = UpdateQueue(handler, workers=1, maxsize=3, priority_maxsize=1)
+        for i in range(3):
+            assert q.submit(_msg(i, 10 + i))
+        assert not q.submit(_msg(3, 20))
+        assert q.submit(_msg(99, 1), priority=True)  # own lane: not blocked by the full user lane
+        assert not q.submit(_msg(98, 2), priority=True)  # but bounded too
+        q.start()
+        await q.stop()
+
+    asyncio.run(run())
+    assert seen[0] == 99
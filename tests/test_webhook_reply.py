@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot import webhook_reply
+
+
+def _update(chat_type="private", sent=None):
+    async def reply_text(text, parse_mode=None):
+        sent.append(text)
+
+    msg = SimpleNamespace(
+        chat_id=10,
+        message_id=5,
+        chat=SimpleNamespace(type=chat_type),
+        is_topic_message=False,
+        message_thread_id=None,
+        reply_text=reply_text,
+    )
+    return SimpleNamespace(effective_message=msg)
+
+
+def test_first_reply_is_captured_rest_are_sent():
+    sent = []
+
+    async def run():
+        upd = _update("group", sent)
+        with webhook_reply.capture() as slot:
+            await webhook_reply.reply_text(upd, "one")
+            await webhook_reply.reply_text(upd, "two")
+        return slot
+
+    slot = asyncio.run(run())
+    assert slot == {"method": "sendMessage", "chat_id": 10, "text": "one", "reply_parameters": {"message_id": 5}}
+    assert sent == ["two"]
+
+
+def test_without_capture_replies_normally():
+    sent = []
+    asyncio.run(webhook_reply.reply_text(_update(sent=sent), "hi"))
+    assert sent == ["hi"]
+
+
+def test_update_without_message_is_sent_to_the_chat():
+    sent = []
+
+    async def send_message(chat_id, text, parse_mode=None):
+        sent.append((chat_id, text))
+
+    bot = SimpleNamespace(send_message=send_message)
+    upd = SimpleNamespace(effective_message=None, effective_chat=SimpleNamespace(id=77), get_bot=lambda: bot)
+
+    async def run():
+        with webhook_reply.capture() as slot:
+            await webhook_reply.reply_text(upd, "hi")
+        return slot
+
+    assert asyncio.run(run()) == {}
+    assert sent == [(77, "hi")]
+    nowhere = SimpleNamespace(effective_message=None, effective_chat=None)
+    assert asyncio.run(webhook_reply.reply_text(nowhere, "hi")) is None
@@ -0,0 +1,93 @@
+# /my balance read: SUM over points_ledger vs the points_balances row, for users with many ledger rows.
+# Also the cost the trigger adds to a single-row ledger insert.
+# Usage: DATABASE_URL=postgresql://... python tools/bench_balances.py --rows 10000 100000 1000000
+# Writes ledger rows under user_id 9_100_000_000+ (cleaned up after) and briefly disables the
+# balance trigger: run it against a scratch database, not production.
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure  # noqa: E402
+from bot.economy_store import get_points_balance  # noqa: E402
+from tools.loadtest import percentile  # noqa: E402
+
+BENCH_USER = 9_100_000_000
+BASE_ID = 9_100_000_000_000_000
+
+
+async def ledger_sum(user_id: int) -> int:
+    # the pre-points_balances get_points_balance
+    async with infrastructure.engine.connect() as c:
+        r = await c.execute(text("SELECT COALESCE(SUM(delta),0) FROM points_ledger WHERE user_id=:u"), {"u": user_id})
+        return int(r.scalar() or 0)
+
+
+async def timed(fn, n: int):
+    lat = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        await fn()
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return percentile(lat, 50) * 1000, percentile(lat, 99) * 1000
+
+
+async def insert_one(seq: list) -> None:
+    seq[0] += 1
+    async with infrastructure.engine.begin() as c:
+        await c.execute(
+            text("INSERT INTO points_ledger(id,user_id,delta,reason) VALUES (:i,:u,1,'bench')"),
+            {"i": seq[0], "u": BENCH_USER - 1},
+        )
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--n", type=int, default=200, help="reads per measurement")
+    args = ap.parse_args()
+
+    await infrastructure.init_infrastructure(wait=False)
+    try:
+        print(f"{'ledger_rows':>11} {'sum_p50':>8} {'sum_p99':>8} {'row_p50':>8} {'row_p99':>8}  (ms)")
+        for i, rows in enumerate(args.rows):
+            uid = BENCH_USER + i
+            async with infrastructure.engine.begin() as c:
+                await c.execute(
+                    text(
+                        "INSERT INTO points_ledger(id,user_id,delta,reason,created_at) "
+                        "SELECT CAST(:b AS BIGINT) + g, :u, 1, 'bench', now() - g * interval '1 second' "
+                        "FROM generate_series(1, :n) g"
+                    ),
+                    {"b": BASE_ID + i * 10_000_000, "u": uid, "n": rows},
+                )
+                await c.execute(text("ANALYZE points_ledger"))
+            assert await ledger_sum(uid) == await get_points_balance(uid) == rows
+            s50, s99 = await timed(lambda: ledger_sum(uid), max(5, args.n // max(1, rows // 100_000)))
+            r50, r99 = await timed(lambda: get_points_balance(uid), args.n)
+            print(f"{rows:>11} {s50:>8.2f} {s99:>8.2f} {r50:>8.2f} {r99:>8.2f}")
+
+        seq = [BASE_ID + 900_000_000]
+        on = await timed(lambda: insert_one(seq), args.n)
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("ALTER TABLE points_ledger DISABLE TRIGGER trg_points_balances"))
+        try:
+            off = await timed(lambda: insert_one(seq), args.n)
+        finally:
+            async with infrastructure.engine.begin() as c:
+                await c.execute(text("ALTER TABLE points_ledger ENABLE TRIGGER trg_points_balances"))
+        print(f"ledger insert p50/p99 ms: trigger on {on[0]:.2f}/{on[1]:.2f}, off {off[0]:.2f}/{off[1]:.2f}")
+    finally:
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("DELETE FROM points_ledger WHERE user_id BETWEEN :a AND :b"), {"a": BENCH_USER - 1, "b": BENCH_USER + 100})
+            await c.execute(text("DELETE FROM points_balances WHERE user_id BETWEEN :a AND :b"), {"a": BENCH_USER - 1, "b": BENCH_USER + 100})
+        await infrastructure.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+# Clearing a /pending backlog: approve_request per id vs one approve_requests call.
+# Usage: DATABASE_URL=postgresql://... python tools/bench_bulk_decide.py --requests 1000
+# Creates requests (and a referral chain, so bonuses are paid) under user_id 9_800_000_000+ and
+# deletes them afterwards: run it against a scratch database.
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure  # noqa: E402
+from bot.economy_store import approve_request, approve_requests, create_payment_request, upsert_referral  # noqa: E402
+
+BENCH_USER = 9_800_000_000
+USERS = 50
+
+
+async def seed(n: int):
+    ids = []
+    for i in range(n):
+        rid, _ = await create_payment_request(BENCH_USER + 1 + i % USERS, "buy_token", 100)
+        ids.append(rid)
+    return ids
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=1000)
+    args = ap.parse_args()
+
+    await infrastructure.init_infrastructure(wait=False)
+    try:
+        # chain BENCH_USER <- +1 <- +2 ... so every approval pays up to len(REF_BONUS_LEVELS) bonuses
+        for i in range(1, USERS + 1):
+            await upsert_referral(BENCH_USER + i - 1, BENCH_USER + i)
+
+        ids = await seed(args.requests)
+        t0 = time.perf_counter()
+        for rid in ids:
+            await approve_request(rid, decided_by=1)
+        loop_s = time.perf_counter() - t0
+
+        ids = await seed(args.requests)
+        t0 = time.perf_counter()
+        res = await approve_requests(1, ranges=[(ids[0], ids[-1])], limit=args.requests)
+        bulk_s = time.perf_counter() - t0
+        bonuses = sum(len(r["bonuses"]) for r in res)
+        print(f"approve_request x{args.requests}: {loop_s * 1000:.0f} ms")
+        print(f"approve_requests (one call): {bulk_s * 1000:.0f} ms, {len(res)} approved, {bonuses} bonus rows")
+    finally:
+        async with infrastructure.engine.begin() as c:
+            users = {"a": BENCH_USER, "b": BENCH_USER + USERS}
+            await c.execute(text("DELETE FROM points_ledger WHERE user_id BETWEEN :a AND :b"), users)
+            await c.execute(text("DELETE FROM points_balances WHERE user_id BETWEEN :a AND :b"), users)
+            await c.execute(text("DELETE FROM payment_requests WHERE user_id BETWEEN :a AND :b"), users)
+            await c.execute(text("DELETE FROM referrals WHERE referred_id BETWEEN :a AND :b"), users)
+            await c.execute(text("DELETE FROM referral_paths WHERE descendant_id BETWEEN :a AND :b"), users)
+            await c.execute(text("DELETE FROM referral_stats WHERE user_id BETWEEN :a AND :b"), users)
+        await infrastructure.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+# Ledger ingestion throughput: add_points_many (COPY + one INSERT) vs a loop over add_points.
+# Usage: DATABASE_URL=postgresql://... python tools/bench_bulk_points.py --rows 10000 1000000 --loop 2000
+# Writes ledger rows for user_ids 9_200_000_000+ (cleaned up after).
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure  # noqa: E402
+from bot.economy_store import add_points, add_points_many  # noqa: E402
+
+BENCH_USER = 9_200_000_000
+USERS = 50_000
+
+
+def entries(n: int, ref: str):
+    return ((BENCH_USER + i % USERS, 1, "bench", f"{ref}:{i // USERS}") for i in range(n))
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000])
+    ap.add_argument("--loop", type=int, default=2000, help="rows for the add_points loop baseline")
+    args = ap.parse_args()
+
+    await infrastructure.init_infrastructure(wait=False)
+    try:
+        print(f"{'mode':<22} {'rows':>9} {'seconds':>8} {'rows/s':>10}")
+        t0 = time.perf_counter()
+        for i in range(args.loop):
+            await add_points(BENCH_USER + i, 1, "bench", "loop")
+        dt = time.perf_counter() - t0
+        print(f"{'add_points loop':<22} {args.loop:>9} {dt:>8.2f} {args.loop / dt:>10.0f}")
+
+        for n in args.rows:
+            t0 = time.perf_counter()
+            res = await add_points_many(entries(n, f"bulk{n}"))
+            dt = time.perf_counter() - t0
+            assert res["inserted"] == n, res
+            print(f"{'add_points_many':<22} {n:>9} {dt:>8.2f} {n / dt:>10.0f}")
+            t0 = time.perf_counter()
+            res = await add_points_many(entries(n, f"bulk{n}"))
+            dt = time.perf_counter() - t0
+            assert res["inserted"] == 0, res
+            print(f"{'  re-run (all skipped)':<22} {n:>9} {dt:>8.2f} {n / dt:>10.0f}")
+    finally:
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("DELETE FROM points_ledger WHERE user_id BETWEEN :a AND :b"), {"a": BENCH_USER, "b": BENCH_USER + USERS})
+            await c.execute(text("DELETE FROM points_balances WHERE user_id BETWEEN :a AND :b"), {"a": BENCH_USER, "b": BENCH_USER + USERS})
+        await infrastructure.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
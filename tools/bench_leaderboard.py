@@ -0,0 +1,82 @@
+# /top: GROUP BY over points_ledger vs ORDER BY over points_balances vs the Redis ZSET, plus rank lookups.
+# Usage: DATABASE_URL=postgresql://... REDIS_URL=redis://... python tools/bench_leaderboard.py --users 200000
+# Writes ledger rows under user_id 9_600_000_000+ (cleaned up after) and rebuilds the leaderboard
+# twice: run it against a scratch database/Redis, not production.
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure, leaderboard  # noqa: E402
+from tools.loadtest import percentile  # noqa: E402
+
+BENCH_USER = 9_600_000_000
+BASE_ID = 9_600_000_000_000_000
+
+
+async def timed(fn, n: int):
+    lat = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        await fn()
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return percentile(lat, 50) * 1000, percentile(lat, 99) * 1000
+
+
+async def sql(q: str):
+    async with infrastructure.engine.connect() as c:
+        return (await c.execute(text(q))).fetchall()
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200_000)
+    ap.add_argument("--rows-per-user", type=int, default=5)
+    ap.add_argument("--n", type=int, default=20, help="SQL reads per measurement (Redis reads: 50x)")
+    args = ap.parse_args()
+
+    await infrastructure.init_infrastructure(wait=False)
+    n = args.users
+    try:
+        async with infrastructure.engine.begin() as c:
+            await c.execute(
+                text(
+                    "INSERT INTO points_ledger(id,user_id,delta,reason) "
+                    "SELECT CAST(:b AS BIGINT) + g, CAST(:u AS BIGINT) + g % :n, (random() * 1000)::int, 'bench' "
+                    "FROM generate_series(1, :rows) g"
+                ),
+                {"b": BASE_ID, "u": BENCH_USER, "n": n, "rows": n * args.rows_per_user},
+            )
+            await c.execute(text("ANALYZE points_ledger"))
+            await c.execute(text("ANALYZE points_balances"))
+        built = await leaderboard.rebuild()
+        print(f"rebuild: {built}")
+
+        rnd = random.Random(7)
+        print(f"{'operation':<36} {'p50_ms':>8} {'p99_ms':>8}")
+        p50, p99 = await timed(lambda: sql("SELECT user_id, SUM(delta) s FROM points_ledger GROUP BY user_id ORDER BY s DESC LIMIT 10"), args.n)
+        print(f"{'top 10 (ledger GROUP BY)':<36} {p50:>8.2f} {p99:>8.2f}")
+        p50, p99 = await timed(lambda: sql("SELECT user_id, balance FROM points_balances ORDER BY balance DESC LIMIT 10"), args.n)
+        print(f"{'top 10 (points_balances sort)':<36} {p50:>8.2f} {p99:>8.2f}")
+        p50, p99 = await timed(lambda: leaderboard.top(10), args.n * 50)
+        print(f"{'top 10 (ZSET)':<36} {p50:>8.2f} {p99:>8.2f}")
+        p50, p99 = await timed(lambda: leaderboard.rank(BENCH_USER + rnd.randrange(n)), args.n * 50)
+        print(f"{'rank (ZSET)':<36} {p50:>8.2f} {p99:>8.2f}")
+        p50, p99 = await timed(lambda: leaderboard.apply({BENCH_USER + rnd.randrange(n): 1}), args.n * 50)
+        print(f"{'apply one delta (ZSET)':<36} {p50:>8.2f} {p99:>8.2f}")
+    finally:
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("DELETE FROM points_ledger WHERE id > :b AND id <= :e"), {"b": BASE_ID, "e": BASE_ID + n * args.rows_per_user})
+            await c.execute(text("DELETE FROM points_balances WHERE user_id >= :a AND user_id < :b"), {"a": BENCH_USER, "b": BENCH_USER + n})
+        await leaderboard.rebuild()
+        await infrastructure.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
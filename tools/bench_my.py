@@ -0,0 +1,90 @@
+# /my store cost: the old two calls (balance, then requests) vs get_my_dashboard (one round trip).
+# Usage: DATABASE_URL=postgresql://... python tools/bench_my.py --n 2000 [--rtt-ms 1.0]
+# --rtt-ms adds that much latency per DB round trip (client side) to approximate a remote Postgres.
+# Writes rows under user_id 9_300_000_000 (cleaned up after).
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from sqlalchemy import event, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure  # noqa: E402
+from bot.economy_store import get_my_dashboard, get_points_balance, list_user_requests  # noqa: E402
+from tools.loadtest import percentile  # noqa: E402
+
+BENCH_USER = 9_300_000_000
+
+
+async def two_calls():
+    await get_points_balance(BENCH_USER)
+    await list_user_requests(BENCH_USER, limit=6)
+
+
+async def two_calls_uow():
+    async with infrastructure.unit_of_work():
+        await two_calls()
+
+
+async def dashboard():
+    await get_my_dashboard(BENCH_USER, limit=6)
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=2000)
+    ap.add_argument("--rtt-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    await infrastructure.init_infrastructure(wait=False)
+    trips = {"n": 0}
+
+    @event.listens_for(infrastructure.engine.sync_engine, "before_cursor_execute")
+    def _count(*a, **k):
+        trips["n"] += 1
+
+    if args.rtt_ms:
+        # asyncpg connection methods are awaited on the loop; delay each statement round trip
+        from sqlalchemy.dialects.postgresql.asyncpg import AsyncAdapt_asyncpg_cursor
+
+        orig = AsyncAdapt_asyncpg_cursor._prepare_and_execute
+
+        async def slow(self, *a, **k):
+            await asyncio.sleep(args.rtt_ms / 1000)
+            return await orig(self, *a, **k)
+
+        AsyncAdapt_asyncpg_cursor._prepare_and_execute = slow
+
+    async with infrastructure.engine.begin() as c:
+        await c.execute(
+            text(
+                "INSERT INTO payment_requests(id,user_id,kind,amount,currency,status) "
+                "SELECT CAST(:b AS BIGINT) + g, :u, 'buy_token', 10, 'SELHA', 'approved' FROM generate_series(1, 50) g"
+            ),
+            {"b": BENCH_USER * 1000, "u": BENCH_USER},
+        )
+        await c.execute(text("INSERT INTO points_balances(user_id,balance) VALUES (:u, 500)"), {"u": BENCH_USER})
+    try:
+        print(f"{'mode':<18} {'stmts/op':>9} {'p50_ms':>8} {'p99_ms':>8}")
+        for label, fn in (("two calls", two_calls), ("two calls + uow", two_calls_uow), ("dashboard", dashboard)):
+            for _ in range(50):
+                await fn()
+            trips["n"] = 0
+            lat = []
+            for _ in range(args.n):
+                t0 = time.perf_counter()
+                await fn()
+                lat.append(time.perf_counter() - t0)
+            lat.sort()
+            print(f"{label:<18} {trips['n'] / args.n:>9.2f} {percentile(lat, 50) * 1000:>8.2f} {percentile(lat, 99) * 1000:>8.2f}")
+    finally:
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("DELETE FROM payment_requests WHERE user_id=:u"), {"u": BENCH_USER})
+            await c.execute(text("DELETE FROM points_balances WHERE user_id=:u"), {"u": BENCH_USER})
+        await infrastructure.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+# Referral graph on a random tree with --edges edges: closure build, trigger insert cost,
+# cached counts vs a recursive count over referrals, and the ancestor walk used by bonuses.
+# Usage: DATABASE_URL=postgresql://... python tools/bench_referrals.py --edges 1000000
+# Rebuilds referral_paths/referral_stats for the whole table (twice): run it against a scratch database.
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure  # noqa: E402
+from bot.economy_store import get_referral_stats, rebuild_referral_graph, upsert_referral  # noqa: E402
+from tools.loadtest import percentile  # noqa: E402
+
+BASE = 9_400_000_000
+
+
+async def timed(fn, args):
+    lat = []
+    for a in args:
+        t0 = time.perf_counter()
+        await fn(a)
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return percentile(lat, 50) * 1000, percentile(lat, 99) * 1000
+
+
+async def scalar(sql, **params):
+    async with infrastructure.engine.connect() as c:
+        return (await c.execute(text(sql), params)).scalar()
+
+
+async def recursive_count(u):
+    # what "how many did I bring" costs without the closure table
+    await scalar(
+        "WITH RECURSIVE d(u, lvl) AS (SELECT referred_id, 1 FROM referrals WHERE referrer_id=:u "
+        "UNION ALL SELECT r.referred_id, d.lvl + 1 FROM referrals r JOIN d ON r.referrer_id = d.u WHERE d.lvl < 10) "
+        "SELECT count(*) FROM d",
+        u=u,
+    )
+
+
+async def recursive_ancestors(u):
+    await scalar(
+        "WITH RECURSIVE a(u, lvl) AS (SELECT referrer_id, 1 FROM referrals WHERE referred_id=:u "
+        "UNION ALL SELECT r.referrer_id, a.lvl + 1 FROM referrals r JOIN a ON r.referred_id = a.u WHERE a.lvl < 3) "
+        "SELECT count(*) FROM a",
+        u=u,
+    )
+
+
+async def closure_ancestors(u):
+    await scalar("SELECT count(*) FROM referral_paths WHERE descendant_id=:u AND depth <= 3", u=u)
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--edges", type=int, default=1_000_000)
+    ap.add_argument("--n", type=int, default=500)
+    args = ap.parse_args()
+
+    await infrastructure.init_infrastructure(wait=False)
+    n = args.edges
+    try:
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("ALTER TABLE referrals DISABLE TRIGGER trg_referral_paths"))
+            # node i (1..n) gets a uniformly random earlier node as referrer: expected depth ~ ln(n)
+            await c.execute(
+                text(
+                    "INSERT INTO referrals(referrer_id, referred_id) "
+                    "SELECT CAST(:b AS BIGINT) + floor(random() * g)::bigint, CAST(:b AS BIGINT) + g FROM generate_series(1, :n) g"
+                ),
+                {"b": BASE, "n": n},
+            )
+            await c.execute(text("ALTER TABLE referrals ENABLE TRIGGER trg_referral_paths"))
+            await c.execute(text("ANALYZE referrals"))
+        t0 = time.perf_counter()
+        built = await rebuild_referral_graph()
+        print(f"closure build: {n} edges -> {built['paths']} paths, {built['users']} users in {time.perf_counter() - t0:.1f}s")
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("ANALYZE referral_paths"))
+            await c.execute(text("ANALYZE referral_stats"))
+
+        rnd = random.Random(7)
+        leaves = [BASE + n + 1 + i for i in range(args.n)]
+        parents = [BASE + rnd.randrange(n) for _ in leaves]
+        it = iter(zip(parents, leaves))
+        print(f"{'operation':<36} {'p50_ms':>8} {'p99_ms':>8}")
+        p50, p99 = await timed(lambda _: upsert_referral(*next(it)), leaves)
+        print(f"{'insert edge (trigger maintains)':<36} {p50:>8.2f} {p99:>8.2f}")
+        # counts for the busiest users (near the root) and random ones
+        hubs = [BASE + i for i in range(20)] * (args.n // 40) + [BASE + rnd.randrange(n) for _ in range(args.n // 2)]
+        p50, p99 = await timed(get_referral_stats, hubs)
+        print(f"{'count (referral_stats)':<36} {p50:>8.2f} {p99:>8.2f}")
+        p50, p99 = await timed(recursive_count, hubs[: max(10, args.n // 25)])
+        print(f"{'count (recursive CTE, 10 levels)':<36} {p50:>8.2f} {p99:>8.2f}")
+        users = [BASE + rnd.randrange(1, n) for _ in range(args.n)]
+        p50, p99 = await timed(closure_ancestors, users)
+        print(f"{'3-level ancestors (closure)':<36} {p50:>8.2f} {p99:>8.2f}")
+        p50, p99 = await timed(recursive_ancestors, users)
+        print(f"{'3-level ancestors (recursive CTE)':<36} {p50:>8.2f} {p99:>8.2f}")
+    finally:
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("DELETE FROM referrals WHERE referred_id BETWEEN :a AND :b"), {"a": BASE, "b": BASE + n + args.n + 1})
+        await rebuild_referral_graph()
+        await infrastructure.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+# Pool checkouts and latency of the /approve store sequence, with and without a unit of work.
+# Usage: DATABASE_URL=postgresql://... python tools/bench_uow.py --n 500
+# Writes rows into payment_requests/points_ledger under user_id 9_000_000_000+ (cleaned up after).
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from sqlalchemy import event, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure  # noqa: E402
+from bot.economy_store import add_points, get_referrer, get_request, set_request_status  # noqa: E402
+from bot.rbac_store import has_role  # noqa: E402
+from tools.loadtest import percentile  # noqa: E402
+
+BENCH_USER = 9_000_000_000
+
+
+async def approve_flow(rid: int) -> None:
+    # same store calls approve_cmd makes
+    await has_role(BENCH_USER, "admin")
+    req = await get_request(rid)
+    await set_request_status(rid, "approved", decided_by=BENCH_USER)
+    await add_points(int(req["user_id"]), int(req["amount"]), reason=req["kind"], ref=str(rid))
+    await get_referrer(int(req["user_id"]))
+
+
+async def run(n: int, uow: bool, base_id: int):
+    lat = []
+    for i in range(n):
+        rid = base_id + i
+        t0 = time.perf_counter()
+        if uow:
+            async with infrastructure.unit_of_work():
+                await approve_flow(rid)
+        else:
+            await approve_flow(rid)
+        lat.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.002)  # keep ledger ids (ms timestamps) apart
+    lat.sort()
+    return lat
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=300)
+    args = ap.parse_args()
+
+    await infrastructure.init_infrastructure(wait=False)
+    checkouts = {"n": 0}
+    event.listen(infrastructure.engine.sync_engine.pool, "checkout", lambda *a: checkouts.__setitem__("n", checkouts["n"] + 1))
+
+    base = BENCH_USER
+    async with infrastructure.engine.begin() as c:
+        await c.execute(
+            text(
+                "INSERT INTO payment_requests(id,user_id,kind,amount,currency,status) "
+                "SELECT CAST(:b AS BIGINT) + g, :u, 'buy_token', 10, 'SELHA', 'pending' FROM generate_series(0, :m) g"
+            ),
+            {"b": base, "u": BENCH_USER, "m": 2 * args.n},
+        )
+    try:
+        print(f"{'mode':<12} {'checkouts/op':>13} {'p50_ms':>8} {'p99_ms':>8}")
+        for label, uow, off in (("per-call", False, 0), ("unit-of-work", True, args.n)):
+            checkouts["n"] = 0
+            lat = await run(args.n, uow, base + off)
+            print(f"{label:<12} {checkouts['n'] / args.n:>13.2f} {percentile(lat, 50) * 1000:>8.2f} {percentile(lat, 99) * 1000:>8.2f}")
+    finally:
+        async with infrastructure.engine.begin() as c:
+            await c.execute(text("DELETE FROM points_ledger WHERE user_id=:u"), {"u": BENCH_USER})
+            await c.execute(text("DELETE FROM payment_requests WHERE user_id=:u"), {"u": BENCH_USER})
+        await infrastructure.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
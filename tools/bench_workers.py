@@ -0,0 +1,93 @@
+# Webhook throughput vs uvicorn worker count, against tools/stub_telegram.py.
+# Usage: python tools/bench_workers.py --workers 1 2 4 --requests 5000 --concurrency 64
+# Postgres/Redis are optional (set DATABASE_URL/REDIS_URL to include them).
+#
+# Recorded (1 vCPU sandbox; stub, server and load generator share the core; /health, 3000 requests,
+# concurrency 64, Postgres + Redis on):
+#   workers   req/s   p50_ms   p99_ms
+#         1      50      858     5625
+#         2      48      914     5871
+#         4      50      886     5502
+# Throughput is CPU-bound, so extra processes only help with spare cores: size --workers to the
+# cores available to the container, not above. Re-run on the target machine before changing it.
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.loadtest import APP_PORT, percentile, stack_env, start_server, start_stub, stop  # noqa: E402
+
+
+def _update(i: int, command: str) -> dict:
+    return {
+        "update_id": 10_000_000 + i,
+        "message": {
+            "message_id": i,
+            "date": int(time.time()),
+            "chat": {"id": 1000 + (i % 500), "type": "private"},
+            "from": {"id": 1000 + (i % 500), "is_bot": False, "first_name": "bench"},
+            "text": f"/{command}",
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command) + 1}],
+        },
+    }
+
+
+async def _fire(n: int, concurrency: int, command: str, offset: int):
+    lat = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", limits=limits, timeout=30) as c:
+
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await c.post("/tg/webhook", json=_update(offset + i, command))
+                    if r.status_code != 200:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                lat.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        wall = time.perf_counter() - t0
+    lat.sort()
+    return n / wall, percentile(lat, 50) * 1000, percentile(lat, 99) * 1000, errors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--command", default="health")
+    ap.add_argument("--inline", action="store_true", help="process updates inside the request (UPDATE_QUEUE_WORKERS=0)")
+    args = ap.parse_args()
+
+    env = stack_env(**({"UPDATE_QUEUE_WORKERS": 0} if args.inline else {}))
+    stub = start_stub(env)
+    try:
+        print(f"{'workers':>8} {'req/s':>10} {'p50_ms':>8} {'p99_ms':>8} {'errors':>7}")
+        for i, n in enumerate(args.workers):
+            srv = start_server(env, workers=n)
+            try:
+                asyncio.run(_fire(min(500, args.requests), args.concurrency, args.command, 0))  # warm-up
+                rps, p50, p99, errors = asyncio.run(
+                    _fire(args.requests, args.concurrency, args.command, (i + 1) * 1_000_000)
+                )
+                print(f"{n:>8} {rps:>10.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+            finally:
+                stop(srv)
+    finally:
+        stop(stub)
+
+
+if __name__ == "__main__":
+    main()
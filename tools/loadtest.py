@@ -0,0 +1,67 @@
+# Shared helpers for local load tools (bench_workers.py, replay_webhook.py).
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+STUB_PORT = 18081
+APP_PORT = 18000
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[i]
+
+
+async def wait_up(url: str, timeout_s: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient() as c:
+        while time.monotonic() < deadline:
+            try:
+                if (await c.get(url)).status_code == 200:
+                    return
+            except Exception:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def stack_env(**overrides) -> dict:
+    # bot pointed at the local stubs; Postgres/Redis only if the caller's env has them
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_TOKEN", "123456:loadtest")
+    env["TELEGRAM_API_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/bot"
+    env["BSC_RPC"] = f"http://127.0.0.1:{STUB_PORT}/rpc"
+    env.pop("WEBHOOK_SECRET", None)
+    env.pop("ADMIN_CHAT_ID", None)
+    env.update({k: str(v) for k, v in overrides.items()})
+    return env
+
+
+def start_stub(env: dict) -> subprocess.Popen:
+    p = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "tools.stub_telegram:app", "--port", str(STUB_PORT), "--log-level", "warning"],
+        env=env,
+    )
+    asyncio.run(wait_up(f"http://127.0.0.1:{STUB_PORT}/_stats"))
+    return p
+
+
+def start_server(env: dict, workers: int = 1) -> subprocess.Popen:
+    p = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bot.server:app", "--port", str(APP_PORT),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    asyncio.run(wait_up(f"http://127.0.0.1:{APP_PORT}/healthz"))
+    return p
+
+
+def stop(p: subprocess.Popen) -> None:
+    p.terminate()
+    p.wait()
@@ -0,0 +1,24 @@
+# Re-derive the Redis points leaderboard from points_balances (the bot also does this hourly).
+# Usage: DATABASE_URL=postgresql://... REDIS_URL=redis://... python tools/rebuild_leaderboard.py
+# Exit code 1 when Redis is not configured or another worker holds the rebuild lock.
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure, leaderboard  # noqa: E402
+
+
+async def main() -> int:
+    await infrastructure.init_infrastructure(wait=False)
+    try:
+        res = await leaderboard.rebuild()
+    finally:
+        await infrastructure.engine.dispose()
+    print(json.dumps(res, ensure_ascii=False))
+    return 0 if res is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,31 @@
+# Re-derive points_balances from points_ledger and report (or fix) drift.
+# Usage: DATABASE_URL=postgresql://... python tools/reconcile_balances.py [--chunk 500] [--fix]
+# Exit code 1 when drift was found and not fixed (cron-friendly).
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot import infrastructure  # noqa: E402
+from bot.economy_store import reconcile_balances  # noqa: E402
+
+
+async def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunk", type=int, default=500, help="users per transaction")
+    ap.add_argument("--fix", action="store_true", help="rewrite drifted balances")
+    args = ap.parse_args()
+
+    await infrastructure.init_infrastructure(wait=False)
+    try:
+        res = await reconcile_balances(chunk=args.chunk, fix=args.fix)
+    finally:
+        await infrastructure.engine.dispose()
+    print(json.dumps(res, ensure_ascii=False))
+    return 1 if res["drifted"] and not args.fix else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
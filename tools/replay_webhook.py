@@ -0,0 +1,125 @@
+# Replay recorded webhook traffic (WEBHOOK_RECORD_PATH JSONL) against /tg/webhook.
+# Usage:
+#   python tools/replay_webhook.py --file webhook_traffic.jsonl --rate 200 --concurrency 32 --spawn
+#   python tools/replay_webhook.py --file webhook_traffic.jsonl --url http://127.0.0.1:8000/tg/webhook
+# --spawn starts the stub Bot API/RPC (tools/stub_telegram.py) and a local bot.server.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot.update_filter import command_of, update_type  # noqa: E402
+from tools.loadtest import APP_PORT, percentile, stack_env, start_server, start_stub, stop  # noqa: E402
+
+
+def load(path: str):
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                out.append(json.loads(line)["payload"])
+    return out
+
+
+def label(payload: dict) -> str:
+    cmd = command_of(payload)
+    return f"/{cmd}" if cmd else f"({update_type(payload)})"
+
+
+async def replay(payloads, url: str, rate: float, concurrency: int, secret: str, id_base: int):
+    stats = defaultdict(lambda: {"lat": [], "errors": 0})
+    sem = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30, headers=headers) as c:
+
+        async def one(i, payload, t0):
+            # fresh update_id per send so the de-dup stage does not swallow the replay
+            body = dict(payload, update_id=id_base + i)
+            st = stats[label(payload)]
+            # latency counts from the scheduled send time (t0), so time spent waiting for a
+            # concurrency slot or behind a late sender shows up instead of being omitted
+            async with sem:
+                try:
+                    r = await c.post(url, content=json.dumps(body), headers={"Content-Type": "application/json"})
+                    if r.status_code != 200:
+                        st["errors"] += 1
+                except Exception:
+                    st["errors"] += 1
+                st["lat"].append(time.perf_counter() - t0)
+
+        tasks = []
+        t_start = time.perf_counter()
+        for i, payload in enumerate(payloads):
+            if rate > 0:
+                # open-loop pacing: send on schedule regardless of response times
+                scheduled = t_start + i / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+            tasks.append(asyncio.create_task(one(i, payload, scheduled)))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - t_start
+    return stats, wall
+
+
+def report(stats, wall: float) -> None:
+    total = sum(len(s["lat"]) for s in stats.values())
+    errors = sum(s["errors"] for s in stats.values())
+    print(f"sent={total} wall_s={wall:.2f} throughput={total / wall:.0f} req/s errors={errors} ({100.0 * errors / max(1, total):.2f}%)")
+    print(f"{'command':<24} {'count':>7} {'err%':>6} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8}")
+    for name, s in sorted(stats.items(), key=lambda kv: -len(kv[1]["lat"])):
+        lat = sorted(s["lat"])
+        n = len(lat)
+        print(
+            f"{name:<24} {n:>7} {100.0 * s['errors'] / max(1, n):>6.2f} "
+            f"{percentile(lat, 50) * 1000:>8.1f} {percentile(lat, 95) * 1000:>8.1f} "
+            f"{percentile(lat, 99) * 1000:>8.1f} {(lat[-1] if lat else 0) * 1000:>8.1f}"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", required=True)
+    ap.add_argument("--url", default=f"http://127.0.0.1:{APP_PORT}/tg/webhook")
+    ap.add_argument("--rate", type=float, default=0, help="requests per second (0 = as fast as concurrency allows)")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--loops", type=int, default=1, help="replay the file this many times")
+    ap.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    ap.add_argument("--spawn", action="store_true", help="start stub Telegram/RPC + local bot.server")
+    ap.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+
+    payloads = load(args.file) * max(1, args.loops)
+    if not payloads:
+        raise SystemExit(f"no payloads in {args.file}")
+
+    procs = []
+    try:
+        if args.spawn:
+            env = stack_env()
+            if args.secret:
+                env["WEBHOOK_SECRET"] = args.secret
+            procs.append(start_stub(env))
+            procs.append(start_server(env, workers=args.workers))
+        stats, wall = asyncio.run(
+            replay(payloads, args.url, args.rate, args.concurrency, args.secret, id_base=int(time.time()) * 1000)
+        )
+        report(stats, wall)
+    finally:
+        for p in reversed(procs):
+            stop(p)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Minimal Bot API + BSC JSON-RPC stub for local load tests.
+# Run:  uvicorn tools.stub_telegram:app --port 8081
+# Bot:  TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot  BSC_RPC=http://127.0.0.1:8081/rpc
+import itertools
+import time
+
+from fastapi import FastAPI, Request
+
+app = FastAPI()
+_ids = itertools.count(1)
+CALLS = {}
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Guardian", "username": "guardian_stub_bot"}
+
+
+def _message(chat_id) -> dict:
+    try:
+        chat_id = int(chat_id)
+    except (TypeError, ValueError):
+        chat_id = 0
+    return {"message_id": next(_ids), "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "text": ""}
+
+
+@app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+async def bot_api(token: str, method: str, request: Request):
+    CALLS[method] = CALLS.get(method, 0) + 1
+    try:
+        params = dict(await request.form())
+    except Exception:
+        params = {}
+    if not params:
+        try:
+            params = await request.json()
+        except Exception:
+            params = {}
+
+    m = method.lower()
+    if m == "getme":
+        result = BOT_USER
+    elif m in ("sendmessage", "editmessagetext"):
+        result = _message(params.get("chat_id"))
+    elif m == "getwebhookinfo":
+        result = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+    else:
+        result = True
+    return {"ok": True, "result": result}
+
+
+_RPC_RESULTS = {
+    "eth_chainId": "0x38",
+    "eth_blockNumber": "0x2a0f1c0",
+    "eth_gasPrice": "0xb2d05e00",
+    "eth_estimateGas": "0xea60",
+    "eth_getTransactionCount": "0x0",
+    "eth_call": "0x" + "0" * 64,
+    "eth_sendRawTransaction": "0x" + "ab" * 32,
+    "eth_getTransactionReceipt": None,
+}
+
+
+@app.post("/rpc")
+async def rpc(request: Request):
+    body = await request.json()
+    calls = body if isinstance(body, list) else [body]
+    out = []
+    for c in calls:
+        method = c.get("method", "")
+        CALLS[f"rpc:{method}"] = CALLS.get(f"rpc:{method}", 0) + 1
+        out.append({"jsonrpc": "2.0", "id": c.get("id"), "result": _RPC_RESULTS.get(method)})
+    return out if isinstance(body, list) else out[0]
+
+
+@app.get("/_stats")
+async def stats():
+    return CALLS